@@ -0,0 +1,124 @@
+"""Measures how adding and removing profiles in the Windows Terminal settings scales
+with the number of profiles.
+
+Usage: python benchmarks/bench_windowsterminal.py [--sizes 100 1000 5000 20000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+from engine.terminal.configuration import (  # noqa: E402
+    Mutation,
+    MutationType,
+    TerminalProfile,
+)
+from engine.terminal.windowsterminal import WindowsTerminalConfigurator  # noqa: E402
+
+_GROUP_NAME = "Benchmark"
+
+
+def _create_configurator(directory: str) -> WindowsTerminalConfigurator:
+    settings_file_path = os.path.join(directory, "settings.json")
+    with open(settings_file_path, "w") as settings_file:
+        json.dump({"profiles": {"list": []}, "newTabMenu": []}, settings_file)
+    return WindowsTerminalConfigurator(settings_file_path=settings_file_path)
+
+
+def _timed(function, *args) -> float:
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def run(size: int) -> dict[str, float]:
+    """Returns the seconds taken by each operation on a settings file with size profiles"""
+    profiles = [
+        TerminalProfile(
+            f"container-{i}",
+            f"docker exec -it container-{i} /bin/sh",
+            source_name=_GROUP_NAME,
+        )
+        for i in range(size)
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        configurator = _create_configurator(directory)
+        results = {}
+        results["add all"] = _timed(
+            configurator.apply_mutations,
+            [Mutation(MutationType.ADD_PROFILES, profiles, group_name=_GROUP_NAME)],
+        )
+        # publishing the same profiles again only looks them up
+        results["add again"] = _timed(
+            configurator.apply_mutations,
+            [Mutation(MutationType.ADD_PROFILES, profiles, group_name=_GROUP_NAME)],
+        )
+        # the index makes the changes O(k); what remains grows with the file is its
+        # serialization, done once per write
+        results["add 10"] = _timed(
+            configurator.apply_mutations,
+            [
+                Mutation(
+                    MutationType.ADD_PROFILES,
+                    [
+                        TerminalProfile(
+                            f"extra-{i}", f"ssh extra-{i}", source_name="SSH"
+                        )
+                        for i in range(10)
+                    ],
+                    group_name="SSH",
+                )
+            ],
+        )
+        results["remove 10"] = _timed(
+            configurator.apply_mutations,
+            [
+                Mutation(
+                    MutationType.REMOVE_PROFILES,
+                    profile_names=[f"extra-{i}" for i in range(10)],
+                    group_name="SSH",
+                )
+            ],
+        )
+        results["remove half"] = _timed(
+            configurator.apply_mutations,
+            [
+                Mutation(
+                    MutationType.REMOVE_PROFILES,
+                    profile_names=[profile.name for profile in profiles[::2]],
+                    group_name=_GROUP_NAME,
+                )
+            ],
+        )
+        results["remove group"] = _timed(
+            configurator.apply_mutations,
+            [Mutation(MutationType.REMOVE_GROUP, group_name=_GROUP_NAME)],
+        )
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 1000, 5000, 20000]
+    )
+    args = parser.parse_args()
+
+    columns = None
+    for size in args.sizes:
+        results = run(size)
+        if columns is None:
+            columns = list(results)
+            print(f"{'profiles':>10}" + "".join(f"{c:>14}" for c in columns))
+        print(f"{size:>10}" + "".join(f"{results[c] * 1000:>12.1f}ms" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
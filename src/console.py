@@ -17,7 +17,7 @@ class App:
         event_text = f"{event.event_type}: {event.source_name} - {event.message}"
         if event.event_type == "HEALTHY":
             print(f"\033[92m{event_text}\033[0m")
-        elif event.event_type == "WARNING":
+        elif event.event_type == "WARNING" or event.event_type == "RECONNECTING":
             print(f"\033[93m{event_text}\033[0m")
         else:
             print(f"{event_text}")
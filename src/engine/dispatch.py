@@ -0,0 +1,166 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+from typing import Callable
+
+from engine.events import Event
+
+_logger: logging.Logger = logging.getLogger(__name__)
+
+
+class DispatchStats:
+    """Statistics about the events dispatched by an event bus."""
+
+    def __init__(self):
+        """Creates a new instance of the DispatchStats class."""
+        self.dispatched = 0
+        """The number of events dispatched"""
+        self.errors = 0
+        """The number of events whose handler raised an exception"""
+        self.max_depth = 0
+        """The largest number of events waiting in the queues"""
+        self.last_latency = 0.0
+        """Seconds between the publication and the end of the dispatch of the last event"""
+        self.max_latency = 0.0
+        """The largest latency of an event, in seconds"""
+        self.total_latency = 0.0
+        """The sum of the latencies of all the events, in seconds"""
+
+    @property
+    def average_latency(self) -> float:
+        """The average latency of an event, in seconds"""
+        return self.total_latency / self.dispatched if self.dispatched else 0.0
+
+    def __str__(self):
+        return (
+            f"DispatchStats(dispatched={self.dispatched}, errors={self.errors}, "
+            + f"max_depth={self.max_depth}, last_latency={self.last_latency:.6f}, "
+            + f"average_latency={self.average_latency:.6f}, max_latency={self.max_latency:.6f})"
+        )
+
+
+class EventBus:
+    """Queue-based dispatcher between the connectors and the orchestrator.
+    Events are handled by worker threads, so publishers (connector threads) don't wait
+    for the handler. Events of the same source are always handled by the same worker,
+    in the order they were published. Each worker has a bounded queue; when it is full,
+    publish blocks until there is room (backpressure).
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        handler: Callable[[Event], None],
+        workers: int = 2,
+        max_queue_size: int = 1000,
+    ):
+        """Creates a new instance of the EventBus class and starts its workers."""
+        self._handler = handler
+        self._queues: list[queue.Queue] = [
+            queue.Queue(maxsize=max_queue_size) for _ in range(workers)
+        ]
+        self._stats_lock = threading.Lock()
+        self.stats = DispatchStats()
+        self._workers = [
+            threading.Thread(
+                target=self._work,
+                args=(event_queue,),
+                name=f"EventBus-{index}",
+                daemon=True,
+            )
+            for index, event_queue in enumerate(self._queues)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._stopped = False
+
+    @property
+    def depth(self) -> int:
+        """The number of events waiting to be dispatched"""
+        return sum(event_queue.qsize() for event_queue in self._queues)
+
+    def publish(self, event: Event) -> None:
+        """Queues an event. Blocks while the queue of its source is full.
+        Events published after stop are dropped."""
+        if self._stopped:
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug(
+                    f"Dropped {event.event_type} event of {event.source_name}, "
+                    + "the event bus is stopped"
+                )
+            return
+        # a stable hash, so a source is always handled by the same worker
+        index = zlib.crc32(event.source_name.encode()) % len(self._queues)
+        self._queues[index].put((event, time.perf_counter()))
+        depth = self.depth
+        if depth > self.stats.max_depth:
+            with self._stats_lock:
+                self.stats.max_depth = max(self.stats.max_depth, depth)
+
+    def _work(self, event_queue: queue.Queue) -> None:
+        while True:
+            item = event_queue.get()
+            try:
+                if item is self._STOP:
+                    return
+                event, published_on = item
+                failed = False
+                try:
+                    self._handler(event)
+                except Exception as e:
+                    failed = True
+                    _logger.error(
+                        f"Error dispatching {event.event_type} event of {event.source_name}",
+                        exc_info=e,
+                    )
+                latency = time.perf_counter() - published_on
+                with self._stats_lock:
+                    self.stats.dispatched += 1
+                    self.stats.errors += failed
+                    self.stats.last_latency = latency
+                    self.stats.max_latency = max(self.stats.max_latency, latency)
+                    self.stats.total_latency += latency
+            finally:
+                event_queue.task_done()
+
+    def drain(self, timeout: float | None = None) -> bool:
+        """Waits until all the queued events have been dispatched.
+        Returns:
+            True if the queues were drained, False if the timeout expired.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for event_queue in self._queues:
+            # queue.join has no timeout, so poll the number of unfinished tasks
+            with event_queue.all_tasks_done:
+                while event_queue.unfinished_tasks:
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    event_queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """Dispatches the queued events and stops the workers.
+        Returns:
+            True if the workers stopped, False if the timeout expired.
+        """
+        self._stopped = True
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining() -> float | None:
+            return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+        try:
+            for event_queue in self._queues:
+                # the stop marker is queued after the pending events
+                event_queue.put(self._STOP, timeout=remaining())
+        except queue.Full:
+            return False
+        for worker in self._workers:
+            worker.join(remaining())
+        return not any(worker.is_alive() for worker in self._workers)
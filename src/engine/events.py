@@ -6,7 +6,18 @@ class EventType(StrEnum):
 
     ADD_PROFILE = "ADD_PROFILE"
     REMOVE_PROFILE = "REMOVE_PROFILE"
+    ADD_PROFILES = "ADD_PROFILES"
+    """A batch of profiles was added. The event data is a list of TerminalProfile."""
+    REMOVE_PROFILES = "REMOVE_PROFILES"
+    """A batch of profiles was removed. The event data is a list of TerminalProfile."""
+    SYNCHRONIZED = "SYNCHRONIZED"
+    """The connector published all its current profiles (e.g. after listing the
+    containers). Profiles it published before (re)connecting and didn't publish
+    again are removed."""
     WARNING = "WARNING"
+    RECONNECTING = "RECONNECTING"
+    """The connector lost its connection and will resume from where it stopped.
+    Its profiles are kept."""
     STARTING = "STARTING"
     STOPPING = "STOPPING"
     HEALTHY = "HEALTHY"
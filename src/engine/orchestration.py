@@ -1,25 +1,75 @@
+import concurrent.futures
 import logging
-from typing import Callable
+import threading
+import time
+from typing import Any, Callable
 
+from engine.dispatch import DispatchStats, EventBus
 from engine.events import Event, EventType
+from engine.registry import ProfileRegistry
 
 from .pod.connection import BaseConnector as PodBaseConnector
 from .pod.docker import DockerConnector
+from .pod.dockerhosts import DockerHostsConnector
+from .pod.kubernetes import KubernetesConnector
+from .pod.podman import PodmanConnector
+from .pod.runtime import AsyncConnector as PodAsyncConnector
 from .pod.ssh import SSHConnector
 from .terminal import iterm2, windowsterminal
 from .terminal.configuration import BaseConfigurator as TerminalBaseConfigurator
+from .terminal.configuration import Mutation, MutationType
+from .terminal.writebehind import FlushScheduler, FlushStats
+
+_logger: logging.Logger = logging.getLogger(__name__)
+
+_STOP_DRAIN_TIMEOUT = 5
+"""Maximum number of seconds to wait for the pending events when stopping"""
+
+_SWEEP_GRACE_PERIOD = 30
+"""Seconds a reconnecting pod connector has to confirm its profiles before
+the unconfirmed ones are removed"""
+
+_START_TIMEOUT = 10
+"""Maximum number of seconds to wait for each component (availability check and backup
+of a terminal configurator, health check of a pod connector) when starting"""
+
+
+def _run_in_thread(
+    name: str, function: Callable[..., Any], *args
+) -> concurrent.futures.Future:
+    """Runs a function on a new daemon thread and returns a future of its result.
+    Unlike an executor, a call that never returns (e.g. a health check blocked on an
+    unreachable host) doesn't prevent the process from exiting."""
+    future: concurrent.futures.Future = concurrent.futures.Future()
+
+    def run():
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            # logged here, as the caller may have stopped waiting for the result
+            _logger.debug(f"{name} failed", exc_info=True)
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
 
 
 class Orchestrator:
     """Represents the orchestrator between the pod connectors and the terminal configurators"""
 
-    _pod_connector_types = [DockerConnector, SSHConnector]
+    _pod_connector_types = [
+        DockerConnector,
+        DockerHostsConnector,
+        PodmanConnector,
+        SSHConnector,
+        KubernetesConnector,
+    ]
     _terminal_configurator_types = [
         windowsterminal.WindowsTerminalConfigurator,
         iterm2.ITerm2Configurator,
     ]
     # a dictionary (key: pod connector name, value: pod connector instance)
-    pod_connectors: dict[str, PodBaseConnector] = {}
+    pod_connectors: dict[str, PodBaseConnector | PodAsyncConnector] = {}
     """A dictionary (key: pod connector name, value: pod connector instance)"""
 
     # a dictionary (key: terminal configurator name, value: terminal configurator instance)
@@ -30,6 +80,28 @@ class Orchestrator:
 
     def __init__(self, event_handler: Callable[[Event], None]):
         self._event_handler = event_handler
+        # terminal configurators are written through the flush scheduler,
+        # so bursts of connector events are merged into a single write
+        self._flush_scheduler = FlushScheduler()
+        # connector events are queued and handled by the event bus workers,
+        # so connector threads never wait for the terminal configurators
+        self._event_bus = EventBus(self._handle_connector_event)
+        # the profiles currently published by each pod connector, reconciled when a
+        # connector reconnects and replayed to a terminal configurator when it is enabled
+        self._registry = ProfileRegistry()
+        # held while the registry is updated and the matching mutations are submitted,
+        # so a replay or a sweep is never interleaved with the mutations of an event
+        self._registry_lock = threading.Lock()
+        # the sources that sent a STARTING event. The first time, the group of the
+        # source is reset: it may hold profiles left by a previous run that didn't
+        # remove them (e.g. a crash), which are not in the registry and never swept
+        self._started_sources: set[str] = set()
+        # a dictionary (key: source name, value: timer sweeping the source if it
+        # doesn't confirm its profiles in time)
+        self._sweep_timers: dict[str, threading.Timer] = {}
+        self.startup_times: dict[str, float] = {}
+        """A dictionary (key: component name, value: seconds between the start of the
+        orchestrator and the component being ready, or giving up on it)"""
         self._init_terminal_configurators()
         self._init_pod_connectors()
 
@@ -44,15 +116,15 @@ class Orchestrator:
             )
 
             # add  the terminal connector to the dict of available connectors
-            self.terminal_configurators[
-                terminal_configurator.name
-            ] = terminal_configurator
+            self.terminal_configurators[terminal_configurator.name] = (
+                terminal_configurator
+            )
 
     def _init_pod_connectors(self):
         """Inits the pod connectors list"""
         for pod_connector_type in self._pod_connector_types:
-            pod_connector: PodBaseConnector = pod_connector_type(
-                event_handler=self._handle_connector_event
+            pod_connector: PodBaseConnector | PodAsyncConnector = pod_connector_type(
+                event_handler=self._event_bus.publish
             )
 
             self._logger.debug(
@@ -78,17 +150,16 @@ class Orchestrator:
             )
         )
 
-        self.terminal_configurators[terminal_configurator_name].enabled = enable
+        terminal_configurator = self.terminal_configurators[terminal_configurator_name]
         if enable:
-            # since a new terminal connector has been enabled, we need to restart the pod connectors
-            # otherwise the new terminal connector won't show the connections to the pods
-            self._restart_alive_pod_connectors()
+            # the new terminal connector gets the profiles currently published by the pod
+            # connectors; the connectors and the other terminal connectors are untouched
+            self._replay_registry(terminal_configurator)
         else:
+            terminal_configurator.enabled = False
             # if the terminal connector is disabled, we need to remove the groups from the terminal connector
             # otherwise the terminal connector will show the connections to the pods
-            self._remove_alive_pod_connectors_from_terminal_configurator(
-                self.terminal_configurators[terminal_configurator_name]
-            )
+            self._remove_sources_from_terminal_configurator(terminal_configurator)
 
         self._send_healthy_event(terminal_configurator_name)
 
@@ -120,27 +191,50 @@ class Orchestrator:
         if pod_connector.terminated:
             # create a new instance of the same type of the pod connector
             pod_connector = pod_connector.__class__(
-                event_handler=self._handle_connector_event
+                event_handler=self._event_bus.publish
             )
             self.pod_connectors[pod_connector_name] = pod_connector
         pod_connector.start()
 
-    def _restart_alive_pod_connectors(self):
-        for pod_connector in self.pod_connectors.values():
-            if pod_connector.is_alive() and not pod_connector.terminated:
-                pod_connector.stop()
-                pod_connector = pod_connector.__class__(
-                    event_handler=self._handle_connector_event
+    def _replay_registry(self, terminal_configurator: TerminalBaseConfigurator):
+        """Enables a terminal configurator and writes the published profiles to it
+        with a single write"""
+        with self._registry_lock:
+            terminal_configurator.enabled = True
+            for source_name in sorted(
+                self._started_sources.union(self._registry.sources())
+            ):
+                # the group may hold stale profiles from before the terminal was disabled,
+                # or from a previous run
+                self._flush_scheduler.submit(
+                    terminal_configurator,
+                    Mutation(MutationType.REMOVE_GROUP, group_name=source_name),
                 )
-                self.pod_connectors[pod_connector.name] = pod_connector
-                pod_connector.start()
+                profiles = self._registry.profiles(source_name)
+                if not profiles:
+                    continue
+                self._flush_scheduler.submit(
+                    terminal_configurator,
+                    Mutation(
+                        MutationType.ADD_PROFILES,
+                        profiles=profiles,
+                        group_name=source_name,
+                    ),
+                )
+        self._flush_scheduler.flush(terminal_configurator)
 
-    def _remove_alive_pod_connectors_from_terminal_configurator(
+    def _remove_sources_from_terminal_configurator(
         self, terminal_configurator: TerminalBaseConfigurator
     ):
-        for pod_connector in self.pod_connectors.values():
-            if pod_connector.is_alive():
-                terminal_configurator.remove_group(pod_connector.name)
+        """Removes the groups of all the sources with published profiles,
+        including connectors that stopped without removing them"""
+        with self._registry_lock:
+            for source_name in self._registry.sources():
+                self._flush_scheduler.submit(
+                    terminal_configurator,
+                    Mutation(MutationType.REMOVE_GROUP, group_name=source_name),
+                )
+        self._flush_scheduler.flush(terminal_configurator)
 
     def _get_enabled_terminal_configurator(self) -> list[TerminalBaseConfigurator]:
         return [
@@ -149,6 +243,24 @@ class Orchestrator:
             if terminal_configurator.enabled
         ]
 
+    def get_flush_stats(self, terminal_configurator_name: str) -> FlushStats:
+        """Returns the write statistics of a terminal configurator,
+        including how many mutations were merged into each write"""
+        return self._flush_scheduler.stats(terminal_configurator_name)
+
+    def get_dispatch_stats(self) -> DispatchStats:
+        """Returns the statistics of the connector events dispatch, including latencies"""
+        return self._event_bus.stats
+
+    @property
+    def event_queue_depth(self) -> int:
+        """The number of connector events waiting to be dispatched"""
+        return self._event_bus.depth
+
+    def _submit_to_enabled_terminal_configurators(self, mutation: Mutation):
+        for terminal_configurator in self._get_enabled_terminal_configurator():
+            self._flush_scheduler.submit(terminal_configurator, mutation)
+
     def _handle_connector_event(self, event: Event):
         # notify event subscribers
         self._event_handler(event)
@@ -157,45 +269,260 @@ class Orchestrator:
 
         if (
             event.event_type == EventType.STARTING
-            or event.event_type == EventType.STOPPING
             or event.event_type == EventType.WARNING
         ):
-            for terminal_configurator in self._get_enabled_terminal_configurator():
-                terminal_configurator.remove_group(event.source_name)
+            # the profiles are kept while the connector (re)connects. It confirms the
+            # profiles that still exist and the others are swept once it is synchronized
+            with self._registry_lock:
+                if (
+                    event.event_type == EventType.STARTING
+                    and event.source_name not in self._started_sources
+                ):
+                    self._started_sources.add(event.source_name)
+                    if not self._registry.profiles(event.source_name):
+                        # nothing to reconcile: the profiles in the group are stale
+                        self._submit_to_enabled_terminal_configurators(
+                            Mutation(
+                                MutationType.REMOVE_GROUP, group_name=event.source_name
+                            )
+                        )
+                if self._registry.mark(event.source_name):
+                    self._start_sweep_timer(event.source_name)
+
+        elif event.event_type == EventType.STOPPING:
+            with self._registry_lock:
+                self._cancel_sweep_timer(event.source_name)
+                self._registry.clear(event.source_name)
+                self._submit_to_enabled_terminal_configurators(
+                    Mutation(MutationType.REMOVE_GROUP, group_name=event.source_name)
+                )
 
-        elif event.event_type == EventType.ADD_PROFILE:
-            # add profile to the configuration
+        elif event.event_type == EventType.SYNCHRONIZED:
+            self._sweep(event.source_name)
+            self._send_healthy_event(event.source_name)
+
+        elif (
+            event.event_type == EventType.ADD_PROFILE
+            or event.event_type == EventType.ADD_PROFILES
+        ):
+            # add profiles to the configuration with a single mutation
             # update terminal connectors with the new configuration
-            for terminal_configurator in self._get_enabled_terminal_configurator():
-                terminal_configurator.add_profile(
-                    event.data,
-                    event.source_name,
+            profiles = (
+                [event.data]
+                if event.event_type == EventType.ADD_PROFILE
+                else event.data
+            )
+            with self._registry_lock:
+                # only the new and changed profiles are written; confirmed profiles
+                # are already in the terminals
+                added_profiles, changed_profiles = self._registry.add(
+                    event.source_name, profiles
                 )
+                if changed_profiles:
+                    # a changed profile is removed and added again with the new command line
+                    self._submit_to_enabled_terminal_configurators(
+                        Mutation(
+                            MutationType.REMOVE_PROFILES,
+                            profile_names=[
+                                profile.name for profile in changed_profiles
+                            ],
+                            group_name=event.source_name,
+                        )
+                    )
+                if added_profiles or changed_profiles:
+                    self._submit_to_enabled_terminal_configurators(
+                        Mutation(
+                            MutationType.ADD_PROFILES,
+                            profiles=added_profiles + changed_profiles,
+                            group_name=event.source_name,
+                        )
+                    )
             # signaled that we're done (healthy)
             self._send_healthy_event(event.source_name)
 
-        elif event.event_type == EventType.REMOVE_PROFILE:
-            # remove profile from the configuration
-            for terminal_configurator in self._get_enabled_terminal_configurator():
-                terminal_configurator.remove_profile(event.data.name)
+        elif (
+            event.event_type == EventType.REMOVE_PROFILE
+            or event.event_type == EventType.REMOVE_PROFILES
+        ):
+            # remove profiles from the configuration with a single mutation
+            profiles = (
+                [event.data]
+                if event.event_type == EventType.REMOVE_PROFILE
+                else event.data
+            )
+            with self._registry_lock:
+                self._registry.remove(
+                    event.source_name, [profile.name for profile in profiles]
+                )
+                self._submit_to_enabled_terminal_configurators(
+                    Mutation(
+                        MutationType.REMOVE_PROFILES,
+                        profile_names=[profile.name for profile in profiles],
+                        group_name=event.source_name,
+                    )
+                )
             self._send_healthy_event(event.source_name)
 
+    def _sweep(self, source_name: str):
+        """Removes the profiles of a source that were not confirmed since it was marked"""
+        with self._registry_lock:
+            self._cancel_sweep_timer(source_name)
+            removed_names = self._registry.sweep(source_name)
+            if removed_names:
+                self._submit_to_enabled_terminal_configurators(
+                    Mutation(
+                        MutationType.REMOVE_PROFILES,
+                        profile_names=removed_names,
+                        group_name=source_name,
+                    )
+                )
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(
+                f"Swept {len(removed_names)} unconfirmed profiles of {source_name}"
+            )
+
+    def _start_sweep_timer(self, source_name: str):
+        # a connector that stays disconnected must not keep its profiles forever
+        timer = threading.Timer(_SWEEP_GRACE_PERIOD, self._sweep, args=(source_name,))
+        timer.daemon = True
+        self._sweep_timers[source_name] = timer
+        timer.start()
+
+    def _cancel_sweep_timer(self, source_name: str):
+        timer = self._sweep_timers.pop(source_name, None)
+        if timer is not None:
+            timer.cancel()
+
     def stop(self):
         """Stops all the pod connectors and terminal configurators"""
+        with self._registry_lock:
+            for source_name in list(self._sweep_timers):
+                self._cancel_sweep_timer(source_name)
         for pod_connector in self.pod_connectors.values():
             if pod_connector.is_alive():
                 pod_connector.stop()
+        # dispatch the queued events (e.g. STOPPING), stop the event bus workers and
+        # write any pending mutations before the terminal configurators are disabled
+        if not self._event_bus.stop(_STOP_DRAIN_TIMEOUT):
+            self._logger.warning("Timeout dispatching the pending connector events")
+        self._flush_scheduler.flush_all()
         for terminal_configurator in self.terminal_configurators.values():
             terminal_configurator.enabled = False
 
-    def start(self):
+    def start(self, timeout: float = _START_TIMEOUT):
         """Starts all the pod connectors and terminal configurators.
         It also backs up the terminal configurators.
+        The availability checks, backups and health checks run concurrently, each with
+        its own timeout, so a slow component (e.g. an unreachable Docker host) doesn't
+        delay the others. A healthy pod connector is started as soon as its health check
+        completes, and a terminal configurator is enabled as soon as it is backed up,
+        getting the profiles already published by the pod connectors.
+        Returns when every component is started, unavailable or timed out.
         """
+        started = time.perf_counter()
+        self.startup_times = {}
+        # a dictionary (key: future of the component, value: name of the component,
+        # time it was started and function starting it once it is ready)
+        components: dict[
+            concurrent.futures.Future, tuple[str, float, Callable[[str], None]]
+        ] = {}
         for terminal_configurator in self.terminal_configurators.values():
-            if terminal_configurator.is_available():
-                terminal_configurator.backup()
-                terminal_configurator.enabled = True
+            components[
+                _run_in_thread(
+                    f"Start-{terminal_configurator.name}",
+                    self._prepare_terminal_configurator,
+                    terminal_configurator,
+                )
+            ] = (
+                terminal_configurator.name,
+                time.perf_counter(),
+                self._enable_terminal_configurator,
+            )
         for pod_connector in self.pod_connectors.values():
-            if pod_connector.health_check():
-                self._start_pod_connector(pod_connector.name)
+            components[
+                _run_in_thread(
+                    f"HealthCheck-{pod_connector.name}", pod_connector.health_check
+                )
+            ] = (pod_connector.name, time.perf_counter(), self._start_pod_connector)
+
+        self._wait_for_components(components, timeout)
+
+        self._logger.info(
+            "Started in %.3f seconds (%s)",
+            time.perf_counter() - started,
+            ", ".join(
+                f"{name}: {seconds:.3f}" for name, seconds in self.startup_times.items()
+            ),
+        )
+
+    def _enable_terminal_configurator(self, terminal_configurator_name: str):
+        # the pod connectors may already have published profiles
+        self._replay_registry(self.terminal_configurators[terminal_configurator_name])
+
+    @staticmethod
+    def _prepare_terminal_configurator(
+        terminal_configurator: TerminalBaseConfigurator,
+    ) -> bool:
+        """Backs up a terminal configurator if it is available.
+        Returns true if the terminal configurator is available."""
+        if not terminal_configurator.is_available():
+            return False
+        terminal_configurator.backup()
+        return True
+
+    def _wait_for_components(
+        self,
+        components: dict[
+            concurrent.futures.Future, tuple[str, float, Callable[[str], None]]
+        ],
+        timeout: float,
+    ):
+        """Starts each component whose future returned true, as soon as it completes.
+        Components that fail or don't complete within the timeout (counted from the
+        time each one was started) are reported with a WARNING event."""
+        pending = dict(components)
+        while pending:
+            next_deadline = min(started for _, started, _ in pending.values()) + timeout
+            done, _ = concurrent.futures.wait(
+                pending,
+                timeout=max(next_deadline - time.perf_counter(), 0),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                name, started, start_component = pending.pop(future)
+                self.startup_times[name] = time.perf_counter() - started
+                if self._component_ready(name, future):
+                    try:
+                        start_component(name)
+                    except Exception as e:
+                        self._logger.error(f"Error starting {name}", exc_info=e)
+
+            now = time.perf_counter()
+            for future, (name, started, _) in list(pending.items()):
+                if now - started < timeout:
+                    continue
+                del pending[future]
+                self.startup_times[name] = now - started
+                self._logger.warning(f"{name} did not start within {timeout:g} seconds")
+                self._event_handler(
+                    Event(
+                        source_name=name,
+                        event_type=EventType.WARNING,
+                        event_message=f"{name} did not start within "
+                        + f"{timeout:g} seconds",
+                    )
+                )
+
+    def _component_ready(self, name: str, future: concurrent.futures.Future) -> bool:
+        try:
+            return bool(future.result())
+        except Exception as e:
+            self._logger.error(f"Error starting {name}", exc_info=e)
+            self._event_handler(
+                Event(
+                    source_name=name,
+                    event_type=EventType.WARNING,
+                    event_message=f"Error starting {name}: {e}",
+                )
+            )
+            return False
@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import random
 import threading
 import time
 from typing import Callable
@@ -6,6 +8,103 @@ from typing import Callable
 from engine.events import Event, EventType
 
 
+class RetryPolicy:
+    """Exponential backoff with jitter between the retries of a connector.
+    The delay is multiplied after each retry, up to max_delay, and goes back to
+    initial_delay once the connector stayed healthy for min_healthy_time seconds
+    (see healthy) or after reset. Waits can be cancelled from any thread.
+    """
+
+    def __init__(
+        self,
+        initial_delay: float = 1,
+        max_delay: float = 60,
+        multiplier: float = 2,
+        jitter: float = 0.2,
+        min_healthy_time: float = 30,
+    ):
+        """Creates a new instance of the RetryPolicy class.
+        Args:
+            initial_delay: Seconds to wait before the first retry.
+            max_delay: Maximum number of seconds to wait between two retries.
+            multiplier: Factor applied to the delay after each retry.
+            jitter: Fraction of the delay randomly added or removed, so connectors
+                that failed together don't retry together.
+            min_healthy_time: Seconds a connector must stay healthy before the delay
+                goes back to initial_delay. A connector that passes its health check
+                but fails right after keeps backing off.
+        """
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.min_healthy_time = min_healthy_time
+        self._attempt = 0
+        # the monotonic time at which the connector was last found healthy
+        self._healthy_since: float | None = None
+        self._cancelled = threading.Event()
+        self.retries = 0
+        """The number of retries since the policy was created"""
+        self.backoff_time = 0.0
+        """The number of seconds spent waiting between retries"""
+
+    def next_delay(self) -> float:
+        """Returns the delay before the next retry, in seconds, and moves to the next attempt"""
+        if (
+            self._healthy_since is not None
+            and time.monotonic() - self._healthy_since >= self.min_healthy_time
+        ):
+            self._attempt = 0
+        self._healthy_since = None
+        # the exponent is bounded, so the delay can't overflow after many retries
+        delay = self.initial_delay * self.multiplier ** min(self._attempt, 64)
+        delay = min(delay, self.max_delay)
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        self._attempt += 1
+        return min(delay, self.max_delay)
+
+    def wait(self, delay: float) -> bool:
+        """Waits before retrying.
+        Returns:
+            True if the delay elapsed, False if the policy was cancelled.
+        """
+        self.retries += 1
+        started = time.monotonic()
+        cancelled = self._cancelled.wait(delay)
+        self.backoff_time += time.monotonic() - started
+        return not cancelled
+
+    async def wait_async(self, delay: float) -> bool:
+        """Waits before retrying, as a timer of the running event loop rather than
+        a sleeping thread. Cancelling the task interrupts the wait.
+        Returns:
+            True if the delay elapsed, False if the policy was cancelled.
+        """
+        if self._cancelled.is_set():
+            return False
+        self.retries += 1
+        started = time.monotonic()
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.backoff_time += time.monotonic() - started
+        return not self._cancelled.is_set()
+
+    def healthy(self) -> None:
+        """Records that the connector is healthy. The delay goes back to initial_delay
+        if it is still healthy min_healthy_time seconds later (i.e. no retry before)."""
+        self._healthy_since = time.monotonic()
+
+    def reset(self) -> None:
+        """Goes back to the initial delay"""
+        self._attempt = 0
+        self._healthy_since = None
+
+    def cancel(self) -> None:
+        """Interrupts the current and future waits. This method can be called from any thread."""
+        self._cancelled.set()
+
+
 class BaseConnector(threading.Thread):
     """Base class for all connectors.
     A connector is a thread that runs in the background and communicates with
@@ -23,16 +122,29 @@ class BaseConnector(threading.Thread):
     A terminated connector should not be restarted.
     """
 
-    def __init__(self, event_handler: Callable[[Event], None], name: str = ""):
+    def __init__(
+        self,
+        event_handler: Callable[[Event], None],
+        name: str = "",
+        retry_policy: RetryPolicy | None = None,
+    ):
         """Creates a new instance of the BaseConnector class."""
         super().__init__(daemon=True)
         self.terminated = False
         self.name = name
         self._event_handler = event_handler
+        self.retry_policy = retry_policy or RetryPolicy()
+        """The backoff between the retries of the connector, with its retry count
+        and the time spent waiting"""
 
     def _run(self):
         raise NotImplementedError()
 
+    def _can_resume(self) -> bool:
+        """Returns true if the next _run can resume from where the last one stopped,
+        without publishing all the profiles again."""
+        return False
+
     def health_check(self) -> bool:
         """Checks if the connector is healthy."""
         raise NotImplementedError()
@@ -48,32 +160,30 @@ class BaseConnector(threading.Thread):
                 event_message=f"{self.name} connector",
             )
         )
-        retry_count = 0
-
-        def retry(retry_count, error_message=None):
-            retry_count += 1
-            sleep_time = 5
-            if retry_count > 12:
-                event = f"{self.name} {error_message}, too many retries, waiting 30 seconds..."
-                sleep_time = 30
-            else:
-                event = f"{self.name} {error_message}, waiting 5 seconds..."
 
+        def retry(error_message: str) -> bool:
+            delay = self.retry_policy.next_delay()
             # call the event handler signaling that the connector is unhealthy and waiting to retry
+            # connectors that can resume keep their profiles while reconnecting
             self._event_handler(
                 Event(
                     source_name=self.name,
-                    event_type=EventType.WARNING,
-                    event_message=event,
+                    event_type=(
+                        EventType.RECONNECTING
+                        if self._can_resume()
+                        else EventType.WARNING
+                    ),
+                    event_message=f"{self.name} {error_message}, waiting {delay:.1f} seconds...",
                 )
             )
-            time.sleep(sleep_time)
-            return retry_count
+            # stop cancels the wait, so the thread ends right away
+            return self.retry_policy.wait(delay)
 
         while not self.terminated:
             try:
                 if self.health_check():
-                    retry_count = 0
+                    # the backoff is reset only if _run then works for a while
+                    self.retry_policy.healthy()
                     # call the event handler signaling that the connector is healthy
                     self._event_handler(
                         Event(
@@ -85,15 +195,21 @@ class BaseConnector(threading.Thread):
                     self._run()
                 else:
                     self._logger.debug(f"{self.name} connector unhealthy")
-                    retry_count = retry(retry_count, "connector unhealthy")
+                    if not retry("connector unhealthy"):
+                        break
             except Exception as e:
+                if self.terminated:
+                    # stopping the connector may interrupt _run (e.g. closing its connection)
+                    break
                 self._logger.warning(f"{self.name} connector exception", exc_info=e)
-                retry_count = retry(retry_count, "connector exception")
+                if not retry("connector exception"):
+                    break
 
     def stop(self, timeout: float = 1):
         """Stops the connector."""
 
         self.terminated = True
+        self.retry_policy.cancel()
 
         # call the event handler signaling that the connector is stopping
         self._event_handler(
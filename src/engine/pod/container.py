@@ -0,0 +1,354 @@
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Callable
+
+import utils
+from engine.events import Event, EventType
+from engine.terminal import configuration
+
+from .connection import BaseConnector
+from .filters import ContainerFilter
+
+if TYPE_CHECKING:
+    import docker  # type: ignore
+
+_CHECKPOINT_CLOCK_SKEW = 5
+"""Seconds subtracted from the local clock when the checkpoint is taken from it,
+to tolerate a small clock difference with the container engine"""
+
+_CONTAINER_ACTIONS = ("start", "stop", "die")
+"""The container events that add (start) or remove a profile"""
+
+# region events and checkpoints, shared with the Docker hosts connector
+
+
+def _get_event_filters(container_filter: ContainerFilter) -> dict[str, list[str]]:
+    """Returns the filters of the event stream. The filters Docker supports are applied
+    by the daemon, so the events of the other containers are not even sent."""
+    return {
+        "type": ["container"],
+        "event": list(_CONTAINER_ACTIONS),
+        **container_filter.event_filters(),
+    }
+
+
+def _get_container_names(
+    containers: list[dict], container_filter: ContainerFilter
+) -> list[str]:
+    """Returns the names of the listed containers selected by the filter"""
+    return [
+        # container names are reported with a leading slash
+        container["Names"][0].lstrip("/")
+        for container in containers
+        if container.get("Names") and container_filter.matches_container(container)
+    ]
+
+
+def _get_container_action(
+    event: dict, container_filter: ContainerFilter
+) -> tuple[str, str] | None:
+    """Returns the action (start, stop or die) and the container name of an event,
+    or None if the event doesn't add or remove a profile"""
+    action = event.get("Action") or event.get("status")
+    container_name = (event.get("Actor") or {}).get("Attributes", {}).get("name")
+    if (
+        not container_name
+        or action not in _CONTAINER_ACTIONS
+        or not container_filter.matches_event(event)
+    ):
+        return None
+    return action, container_name
+
+
+def _get_event_time(event: dict, default: int | None) -> int | None:
+    """Returns the daemon time of an event, in seconds"""
+    if "timeNano" in event:
+        return int(event["timeNano"]) // 1_000_000_000
+    return int(event["time"]) if "time" in event else default
+
+
+def _new_checkpoint() -> int:
+    """Returns the checkpoint taken before listing the containers, so the events that
+    happen while listing are replayed by the stream (adding or removing a profile
+    twice is harmless)"""
+    return int(time.time()) - _CHECKPOINT_CLOCK_SKEW
+
+
+def _can_resume_events(
+    checkpoint: int | None, disconnected_on: float | None, max_resume_gap: float
+) -> bool:
+    """Returns true if the event stream was lost recently enough to be resumed from
+    the checkpoint, replaying only the missed events."""
+    return (
+        checkpoint is not None
+        and disconnected_on is not None
+        and time.monotonic() - disconnected_on <= max_resume_gap
+    )
+
+
+# endregion
+
+
+class ContainerEngineConnector(BaseConnector):
+    """Base class for connectors to container engines with a Docker compatible API
+    (e.g. Docker and Podman). It lists the running containers, then follows the
+    container events, resuming the event stream from a checkpoint after short
+    disconnections. The same client is reused for pings, listing and events.
+    When inheriting from this class, the _create_docker_client method should be overridden.
+    """
+
+    def __init__(
+        self,
+        event_handler: Callable[[Event], None],
+        name: str,
+        engine_command: str,
+        docker_client: "docker.DockerClient | None" = None,
+        shell_command: str = "/bin/sh",
+        command: str | None = None,
+        max_resume_gap: float = 300,
+        container_filter: ContainerFilter | None = None,
+    ):
+        """Initializes the ContainerEngineConnector.
+        Args:
+            name: The name of the connector, also the group of its profiles.
+            engine_command: The name of the engine executable (e.g. "docker"),
+                looked up on first use if command is None.
+            command: The path of the engine executable used in the profiles.
+            container_filter: The containers that get a profile. If None, the filter
+                given by the environment variables is used.
+        """
+        super().__init__(
+            name=name,
+            event_handler=event_handler,
+        )
+        self._docker_client = docker_client
+        # a client given by the caller is reused but never closed by the connector
+        self._owns_docker_client = docker_client is None
+        self._docker_client_lock = threading.Lock()
+        self._shell_command = shell_command
+        self._engine_command = engine_command
+        self._command = command
+        self._container_filter = container_filter or ContainerFilter.from_environment()
+        self.client_creations = 0
+        """The number of clients created by this connector"""
+        self._max_resume_gap = max_resume_gap
+        # daemon time (in seconds) up to which events have been processed
+        self._checkpoint: int | None = None
+        # local (monotonic) time at which the event stream was lost
+        self._disconnected_on: float | None = None
+        # the event stream being read, closed by stop to unblock the thread
+        self._event_stream = None
+        self._event_stream_lock = threading.Lock()
+
+    def health_check(self) -> bool:
+        """Checks if the container engine is running.
+        It encapsulates the call to the engine in a try/except block.
+        Returns:
+            True if the container engine is running, False otherwise.
+        """
+        import docker  # type: ignore
+
+        try:
+            return self._get_docker_client().ping()
+        except docker.errors.APIError:
+            # the daemon answered, so the connection can be reused
+            return False
+        except Exception:
+            self._reset_docker_client()
+            return False
+
+    def _get_command(self, container_name):
+        if self._command is None:
+            self._command = utils.which(self._engine_command, self._engine_command)
+        return f"{self._command} exec -it {container_name} {self._shell_command}"
+
+    def _get_docker_client(self):
+        """Returns the client of the connector, creating it on first use.
+        The same client (and its connection pool) is used for pings, listing and the event stream.
+        """
+        with self._docker_client_lock:
+            if self._docker_client is None:
+                self._docker_client = self._create_docker_client()
+                self.client_creations += 1
+                if self._logger.isEnabledFor(logging.DEBUG):
+                    self._logger.debug(
+                        f"Created client #{self.client_creations} for {self.name}"
+                    )
+            return self._docker_client
+
+    def _reset_docker_client(self):
+        """Closes the client after a transport error, so the next call reconnects."""
+        with self._docker_client_lock:
+            if self._docker_client is not None and self._owns_docker_client:
+                try:
+                    self._docker_client.close()
+                except Exception as e:
+                    self._logger.debug(f"Error closing {self.name} client", exc_info=e)
+                self._docker_client = None
+
+    def _create_docker_client(self) -> "docker.DockerClient":
+        """Creates a client connected to the container engine.
+        Raises an exception if the engine can't be found."""
+        raise NotImplementedError()
+
+    def _handle_container_event(self, event):
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("%s event: %s", self.name, str(event))
+
+        container_action = _get_container_action(event, self._container_filter)
+        if container_action is not None:
+            # Add or remove container. Create a terminal profile for the container.
+            action, container_name = container_action
+            terminal_profile = configuration.TerminalProfile(
+                container_name,
+                self._get_command(container_name),
+                source_name=self.name,
+            )
+
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug(
+                    "%s event: %s, %s",
+                    self.name,
+                    action,
+                    terminal_profile.commandline,
+                )
+
+            # call the event handler signaling that a container has been added or removed
+            self._event_handler(
+                Event(
+                    source_name=self.name,
+                    event_type=(
+                        EventType.ADD_PROFILE
+                        if action == "start"
+                        else EventType.REMOVE_PROFILE
+                    ),
+                    event_data=terminal_profile,
+                    event_message=container_name,
+                )
+            )
+
+    def _list_container_names(self, docker_client) -> list[str]:
+        """Returns the names of the running containers selected by the filter"""
+        return _get_container_names(
+            docker_client.api.containers(filters=self._container_filter.list_filters()),
+            self._container_filter,
+        )
+
+    def _can_resume(self) -> bool:
+        """Returns true if the event stream was lost recently enough to be resumed
+        from the last checkpoint, replaying only the missed events."""
+        return _can_resume_events(
+            self._checkpoint, self._disconnected_on, self._max_resume_gap
+        )
+
+    def _run(self):
+        import docker  # type: ignore
+
+        try:
+            docker_client = self._get_docker_client()
+
+            if self._can_resume():
+                self._logger.info(
+                    "Resuming %s events since %s, missed events will be replayed",
+                    self.name,
+                    self._checkpoint,
+                )
+            else:
+                if self._checkpoint is not None:
+                    # the gap is too large to be replayed: signal a restart, so the
+                    # profiles published before the disconnection are removed
+                    self._event_handler(
+                        Event(
+                            source_name=self.name,
+                            event_type=EventType.STARTING,
+                            event_message=f"{self.name} connector resync",
+                        )
+                    )
+                checkpoint = _new_checkpoint()
+
+                # Add existing containers with a single batch event.
+                # The low level API returns the container summaries of the list call,
+                # so no extra request is made per container to build Container objects
+                terminal_profiles = [
+                    configuration.TerminalProfile(
+                        container_name,
+                        self._get_command(container_name),
+                        source_name=self.name,
+                    )
+                    for container_name in self._list_container_names(docker_client)
+                ]
+                self._event_handler(
+                    Event(
+                        source_name=self.name,
+                        event_type=EventType.ADD_PROFILES,
+                        event_data=terminal_profiles,
+                        event_message=f"{len(terminal_profiles)} containers",
+                    )
+                )
+                # the containers listed are all the running containers, so the profiles
+                # of containers that stopped while disconnected can be removed
+                self._event_handler(
+                    Event(
+                        source_name=self.name,
+                        event_type=EventType.SYNCHRONIZED,
+                        event_message=f"{self.name} containers listed",
+                    )
+                )
+                self._checkpoint = checkpoint
+
+            self._disconnected_on = None
+            event_stream = docker_client.events(
+                decode=True,
+                since=self._checkpoint,
+                filters=_get_event_filters(self._container_filter),
+            )
+            with self._event_stream_lock:
+                self._event_stream = event_stream
+            try:
+                # stop may have been called before the stream was stored
+                if self.terminated:
+                    return
+                # Loop over container events until terminated
+                for event in event_stream:
+                    if self.terminated:
+                        break
+                    self._handle_container_event(event)
+                    self._checkpoint = _get_event_time(event, self._checkpoint)
+            finally:
+                self._disconnected_on = time.monotonic()
+                self._close_event_stream()
+
+        except Exception as e:
+            if self.terminated:
+                # closing the stream on stop interrupts the loop with an error
+                return
+            if not isinstance(e, docker.errors.APIError):
+                # the stream or the connection failed, reconnect on the next run
+                self._reset_docker_client()
+            if not isinstance(e, docker.errors.DockerException) and not isinstance(
+                e, docker.errors.APIError
+            ):
+                self._logger.error(f"{self.name} connector error", exc_info=e)
+            raise
+
+    def _close_event_stream(self):
+        """Closes the event stream, which unblocks the thread waiting for the next event."""
+        with self._event_stream_lock:
+            event_stream = self._event_stream
+            self._event_stream = None
+        if event_stream is not None:
+            try:
+                event_stream.close()
+            except Exception as e:
+                self._logger.debug(
+                    f"Error closing {self.name} event stream", exc_info=e
+                )
+
+    def stop(self, timeout: float = 1):
+        """Stops the connector and closes its event stream and client."""
+        self.terminated = True
+        # the thread may be blocked waiting for an event on a quiet host
+        self._close_event_stream()
+        super().stop(timeout)
+        self._reset_docker_client()
@@ -0,0 +1,857 @@
+import concurrent.futures
+import errno
+import http.client
+import ipaddress
+import json
+import logging
+import os
+import selectors
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+from typing import Callable
+
+import utils
+from engine.events import Event, EventType
+from engine.terminal import configuration
+
+from .connection import BaseConnector, RetryPolicy
+from .container import (
+    _can_resume_events,
+    _get_container_action,
+    _get_container_names,
+    _get_event_filters,
+    _get_event_time,
+    _new_checkpoint,
+)
+from .docker import DOCKER_COMMAND
+from .filters import ContainerFilter
+
+_CONNECT_TIMEOUT = 10
+"""Seconds allowed to connect to an endpoint and list its containers"""
+
+_DISCOVERY_INTERVAL = 60
+"""Seconds between two discoveries of the Docker contexts"""
+
+_RESOLVER_THREADS = 2
+"""The number of threads resolving the host names of the endpoints"""
+
+_logger: logging.Logger = logging.getLogger(__name__)
+
+
+class DockerEndpoint:
+    """A Docker daemon, given by a Docker context or by its host URL."""
+
+    def __init__(
+        self,
+        name: str,
+        host: str,
+        context: str | None = None,
+        tls_directory: str | None = None,
+        skip_tls_verify: bool = False,
+    ):
+        """Creates a new instance of the DockerEndpoint class.
+        Args:
+            name: The name of the endpoint, used in the names of its group and profiles.
+            host: The URL of the daemon (unix:// or tcp://).
+            context: The Docker context of the endpoint, used by the profiles.
+            tls_directory: The directory with the ca.pem, cert.pem and key.pem files.
+            skip_tls_verify: True to accept any certificate of the daemon.
+        """
+        self.name = name
+        self.host = host
+        self.context = context
+        self.tls_directory = tls_directory
+        self.skip_tls_verify = skip_tls_verify
+
+    def key(self) -> tuple:
+        return (
+            self.name,
+            self.host,
+            self.context,
+            self.tls_directory,
+            self.skip_tls_verify,
+        )
+
+
+def discover_docker_endpoints(
+    docker_config_dir: str | None = None,
+) -> list[DockerEndpoint]:
+    """Returns the endpoints of the Docker contexts (~/.docker/contexts/meta).
+    Contexts with an ssh:// host are skipped, since they need the ssh client."""
+    if docker_config_dir is None:
+        docker_config_dir = os.environ.get("DOCKER_CONFIG") or os.path.join(
+            os.path.expanduser("~"), ".docker"
+        )
+    meta_directory = os.path.join(docker_config_dir, "contexts", "meta")
+    try:
+        context_ids = sorted(os.listdir(meta_directory))
+    except OSError:
+        return []
+
+    endpoints = []
+    for context_id in context_ids:
+        try:
+            with open(
+                os.path.join(meta_directory, context_id, "meta.json"), "r"
+            ) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            continue
+        docker_endpoint = (meta.get("Endpoints") or {}).get("docker") or {}
+        host = docker_endpoint.get("Host")
+        if not host or not meta.get("Name"):
+            continue
+        if not host.startswith(("unix://", "tcp://")):
+            _logger.info(f"Docker context {meta['Name']} ({host}) is not supported")
+            continue
+        tls_directory = os.path.join(
+            docker_config_dir, "contexts", "tls", context_id, "docker"
+        )
+        endpoints.append(
+            DockerEndpoint(
+                meta["Name"],
+                host,
+                context=meta["Name"],
+                tls_directory=tls_directory if os.path.isdir(tls_directory) else None,
+                skip_tls_verify=bool(docker_endpoint.get("SkipTLSVerify")),
+            )
+        )
+    return endpoints
+
+
+class EndpointStats:
+    """Health and latency statistics of a Docker endpoint."""
+
+    def __init__(self):
+        """Creates a new instance of the EndpointStats class."""
+        self.healthy = False
+        """True while the events of the endpoint are streamed"""
+        self.connections = 0
+        """The number of successful connections"""
+        self.failures = 0
+        """The number of failed connections or lost streams"""
+        self.events = 0
+        """The number of container events received"""
+        self.last_connect_latency = 0.0
+        """Seconds to connect and list the containers (or resume the events), last time"""
+        self.last_event_delay = 0.0
+        """Seconds between the daemon time of the last event and its reception"""
+        self.last_error: str | None = None
+        """The last error of the endpoint"""
+        self.retries = 0
+        """The number of reconnection attempts"""
+        self.backoff_time = 0.0
+        """The number of seconds spent waiting before reconnecting"""
+
+    def __str__(self):
+        return (
+            f"EndpointStats(healthy={self.healthy}, connections={self.connections}, "
+            + f"failures={self.failures}, events={self.events}, "
+            + f"last_connect_latency={self.last_connect_latency:.3f}, "
+            + f"last_event_delay={self.last_event_delay:.3f}, retries={self.retries}, "
+            + f"backoff_time={self.backoff_time:.1f}, last_error={self.last_error})"
+        )
+
+
+class DockerAPIError(Exception):
+    """An error status answered by the API of a Docker endpoint."""
+
+
+_CONNECTION_ERRORS = (OSError, ValueError, http.client.HTTPException, DockerAPIError)
+"""The errors of the connection to an endpoint. OSError includes the socket, name
+resolution and TLS errors, ValueError the invalid JSON documents and HTTP numbers."""
+
+
+class _HttpResponseReader:
+    """Incremental reader of an HTTP/1.1 response: the headers, then a body
+    delimited by Content-Length, chunked, or by the end of the connection."""
+
+    def __init__(self):
+        self.status: int | None = None
+        self.headers: dict[str, str] = {}
+        self.complete = False
+        self._buffer = bytearray()
+        self._state = "headers"
+        self._remaining: int | None = None
+
+    def feed(self, data: bytes) -> bytes:
+        """Adds received data and returns the body bytes it completes"""
+        self._buffer += data
+        body = bytearray()
+        while not self.complete:
+            if self._state == "headers":
+                index = self._buffer.find(b"\r\n\r\n")
+                if index < 0:
+                    break
+                lines = bytes(self._buffer[:index]).decode("latin-1").split("\r\n")
+                del self._buffer[: index + 4]
+                try:
+                    self.status = int(lines[0].split(" ", 2)[1])
+                except (IndexError, ValueError):
+                    raise http.client.BadStatusLine(lines[0]) from None
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    self.headers[name.strip().lower()] = value.strip()
+                if self.headers.get("transfer-encoding", "").lower() == "chunked":
+                    self._state = "chunk_size"
+                else:
+                    self._state = "body"
+                    if "content-length" in self.headers:
+                        self._remaining = int(self.headers["content-length"])
+                        self.complete = self._remaining == 0
+            elif self._state == "body":
+                length = len(self._buffer)
+                if self._remaining is not None:
+                    length = min(length, self._remaining)
+                    self._remaining -= length
+                    self.complete = self._remaining == 0
+                body += self._buffer[:length]
+                del self._buffer[:length]
+                break
+            elif self._state == "chunk_size":
+                index = self._buffer.find(b"\r\n")
+                if index < 0:
+                    break
+                size = int(bytes(self._buffer[:index]).split(b";")[0], 16)
+                del self._buffer[: index + 2]
+                self._remaining = size
+                self._state = "chunk_data" if size else "trailer"
+            elif self._state == "chunk_data":
+                length = min(len(self._buffer), self._remaining or 0)
+                body += self._buffer[:length]
+                del self._buffer[:length]
+                self._remaining = (self._remaining or 0) - length
+                if self._remaining:
+                    break
+                self._state = "chunk_end"
+            elif self._state == "chunk_end":
+                if len(self._buffer) < 2:
+                    break
+                del self._buffer[:2]
+                self._state = "chunk_size"
+            elif self._state == "trailer":
+                index = self._buffer.find(b"\r\n")
+                if index < 0:
+                    break
+                line = self._buffer[:index]
+                del self._buffer[: index + 2]
+                self.complete = not line
+        return bytes(body)
+
+
+class _EndpointConnection:
+    """The connection to an endpoint and its state in the event loop."""
+
+    IDLE = "IDLE"
+    RESOLVING = "RESOLVING"
+    CONNECTING = "CONNECTING"
+    HANDSHAKE = "HANDSHAKE"
+    LISTING = "LISTING"
+    STREAMING = "STREAMING"
+
+    def __init__(
+        self, endpoint: DockerEndpoint, source_name: str, retry_policy: RetryPolicy
+    ):
+        self.endpoint = endpoint
+        self.source_name = source_name
+        self.retry_policy = retry_policy
+        self.stats = EndpointStats()
+        self.state = self.IDLE
+        self.sock: socket.socket | None = None
+        # the resolution of the host name, running on a resolver thread
+        self.resolution: concurrent.futures.Future | None = None
+        self.response = _HttpResponseReader()
+        self.body = bytearray()
+        self.output = bytearray()
+        self.next_attempt = 0.0
+        # local (monotonic) time at which the backoff before the next attempt started
+        self.backoff_started: float | None = None
+        self.deadline = 0.0
+        self.connect_started = 0.0
+        # daemon time (in seconds) up to which events have been processed
+        self.checkpoint: int | None = None
+        # local (monotonic) time at which the event stream was lost
+        self.disconnected_on: float | None = None
+        self.warned = False
+        # a dictionary (key: container name, value: profile) of the published containers
+        self.published_profiles: dict[str, configuration.TerminalProfile] = {}
+
+
+class DockerHostsConnector(BaseConnector):
+    """A connector that follows the container events of several Docker daemons
+    (the Docker contexts, or given endpoints) on a single non-blocking I/O loop.
+    Each endpoint has its own group of profiles, backoff and statistics.
+    """
+
+    def __init__(
+        self,
+        event_handler: Callable[[Event], None],
+        endpoints: list[DockerEndpoint] | None = None,
+        shell_command: str = "/bin/sh",
+        docker_command: str | None = None,
+        max_resume_gap: float = 300,
+        container_filter: ContainerFilter | None = None,
+    ):
+        """Initializes the DockerHostsConnector.
+        If endpoints is None, the Docker contexts are discovered, and discovered
+        again every minute.
+        If docker_command is None, the docker executable is looked up on first use.
+        If container_filter is None, the filter given by the environment variables is used.
+        """
+        super().__init__(
+            name="Docker Hosts",
+            event_handler=event_handler,
+        )
+        self._endpoints = endpoints
+        self._shell_command = shell_command
+        self._docker_command = docker_command
+        self._max_resume_gap = max_resume_gap
+        self._container_filter = container_filter or ContainerFilter.from_environment()
+        # the filters Docker supports are applied by the daemons
+        self._list_query = ""
+        list_filters = self._container_filter.list_filters()
+        if list_filters:
+            self._list_query = "?" + urllib.parse.urlencode(
+                {"filters": json.dumps(list_filters)}
+            )
+        self._event_filters = json.dumps(_get_event_filters(self._container_filter))
+        # a dictionary (key: endpoint name, value: connection). The connections are
+        # only used by the event loop thread; the lock guards adding and removing them
+        self._connections: dict[str, _EndpointConnection] = {}
+        self._connections_lock = threading.Lock()
+        self._selector: selectors.BaseSelector | None = None
+        # a socket pair used by stop and the resolver threads to wake up the event
+        # loop, open while it runs
+        self._wakeup_write: socket.socket | None = None
+        self._wakeup_lock = threading.Lock()
+        # the threads resolving the host names of the endpoints, while the loop runs
+        self._resolver: concurrent.futures.ThreadPoolExecutor | None = None
+        self._next_discovery = 0.0
+
+    @property
+    def endpoint_stats(self) -> dict[str, EndpointStats]:
+        """A dictionary (key: endpoint name, value: statistics of the endpoint)"""
+        with self._connections_lock:
+            return {
+                name: connection.stats for name, connection in self._connections.items()
+            }
+
+    def _get_endpoints(self) -> list[DockerEndpoint]:
+        if self._endpoints is not None:
+            return self._endpoints
+        return discover_docker_endpoints()
+
+    def health_check(self) -> bool:
+        """Checks if there is at least one endpoint. The health of each endpoint is
+        handled by the event loop."""
+        return len(self._get_endpoints()) > 0
+
+    def _get_command(self, connection: _EndpointConnection, container_name: str) -> str:
+        if self._docker_command is None:
+            self._docker_command = utils.which(DOCKER_COMMAND, DOCKER_COMMAND)
+        endpoint = connection.endpoint
+        target = (
+            f"--context {endpoint.context}"
+            if endpoint.context
+            else f"-H {endpoint.host}"
+        )
+        return f"{self._docker_command} {target} exec -it {container_name} {self._shell_command}"
+
+    def _get_profile(
+        self, connection: _EndpointConnection, container_name: str
+    ) -> configuration.TerminalProfile:
+        return configuration.TerminalProfile(
+            f"{connection.endpoint.name}/{container_name}",
+            self._get_command(connection, container_name),
+            source_name=connection.source_name,
+        )
+
+    def _emit(
+        self,
+        connection: _EndpointConnection,
+        event_type: EventType,
+        message: str,
+        data=None,
+    ):
+        self._event_handler(
+            Event(
+                source_name=connection.source_name,
+                event_type=event_type,
+                event_message=message,
+                event_data=data,
+            )
+        )
+
+    # region event loop
+
+    def _run(self):
+        wakeup_read, wakeup_write = socket.socketpair()
+        wakeup_read.setblocking(False)
+        with self._wakeup_lock:
+            self._wakeup_write = wakeup_write
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(wakeup_read, selectors.EVENT_READ, None)
+        self._resolver = concurrent.futures.ThreadPoolExecutor(
+            max_workers=_RESOLVER_THREADS, thread_name_prefix=f"{self.name}-resolver"
+        )
+        try:
+            while not self.terminated:
+                now = time.monotonic()
+                if now >= self._next_discovery:
+                    self._update_connections()
+                    self._next_discovery = now + _DISCOVERY_INTERVAL
+                for connection in list(self._connections.values()):
+                    self._check_timers(connection, now)
+
+                for key, mask in self._selector.select(self._get_select_timeout()):
+                    if key.data is None:
+                        # woken up by stop, or by a resolved host name
+                        self._drain_wakeup(wakeup_read)
+                        continue
+                    connection = key.data
+                    try:
+                        if mask & selectors.EVENT_WRITE:
+                            self._on_writable(connection)
+                        if mask & selectors.EVENT_READ and connection.sock is not None:
+                            self._on_readable(connection)
+                    except _CONNECTION_ERRORS as e:
+                        self._disconnect(connection, e)
+        finally:
+            for connection in self._connections.values():
+                self._close(connection)
+            if self.terminated:
+                self._remove_connections()
+            self._selector.close()
+            self._selector = None
+            # a resolution blocked on a slow DNS server is abandoned
+            self._resolver.shutdown(wait=False, cancel_futures=True)
+            self._resolver = None
+            with self._wakeup_lock:
+                self._wakeup_write = None
+            wakeup_read.close()
+            wakeup_write.close()
+
+    def _remove_connections(self):
+        """Removes all the connections, with the groups of their endpoints"""
+        with self._connections_lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            self._end_backoff(connection)
+            self._emit(
+                connection, EventType.STOPPING, f"{connection.endpoint.name} endpoint"
+            )
+
+    def _wakeup(self):
+        """Wakes up the event loop. This method can be called from any thread."""
+        with self._wakeup_lock:
+            if self._wakeup_write is not None:
+                try:
+                    self._wakeup_write.send(b"\0")
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _drain_wakeup(wakeup_read: socket.socket):
+        try:
+            while wakeup_read.recv(1024):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _get_select_timeout(self) -> float:
+        now = time.monotonic()
+        timeout = self._next_discovery - now
+        for connection in self._connections.values():
+            if connection.state == _EndpointConnection.IDLE:
+                timeout = min(timeout, connection.next_attempt - now)
+            elif connection.state != _EndpointConnection.STREAMING:
+                timeout = min(timeout, connection.deadline - now)
+            elif connection.disconnected_on is not None:
+                timeout = min(timeout, 1)
+        return max(timeout, 0)
+
+    def _update_connections(self):
+        """Adds the new endpoints and removes the endpoints that are gone"""
+        endpoints = {endpoint.name: endpoint for endpoint in self._get_endpoints()}
+        for name in list(self._connections):
+            connection = self._connections[name]
+            endpoint = endpoints.get(name)
+            if endpoint is None or endpoint.key() != connection.endpoint.key():
+                self._close(connection)
+                with self._connections_lock:
+                    del self._connections[name]
+                # the group of the endpoint is removed
+                self._emit(connection, EventType.STOPPING, f"{name} endpoint removed")
+        for name, endpoint in endpoints.items():
+            if name not in self._connections:
+                with self._connections_lock:
+                    self._connections[name] = _EndpointConnection(
+                        endpoint, f"Docker ({name})", RetryPolicy()
+                    )
+
+    def _check_timers(self, connection: _EndpointConnection, now: float):
+        if connection.state == _EndpointConnection.IDLE:
+            if (
+                not connection.warned
+                and connection.disconnected_on is not None
+                and now - connection.disconnected_on > self._max_resume_gap
+            ):
+                # the missed events can't be replayed anymore; the profiles are marked
+                # and removed if the endpoint doesn't come back soon
+                connection.warned = True
+                self._emit(
+                    connection,
+                    EventType.WARNING,
+                    f"{connection.endpoint.name} unreachable: {connection.stats.last_error}",
+                )
+            if now >= connection.next_attempt:
+                try:
+                    self._connect(connection)
+                except _CONNECTION_ERRORS as e:
+                    self._disconnect(connection, e)
+        elif (
+            connection.state == _EndpointConnection.RESOLVING
+            and connection.resolution is not None
+            and connection.resolution.done()
+        ):
+            resolution = connection.resolution
+            connection.resolution = None
+            try:
+                family, _, _, _, address = resolution.result()[0]
+                self._open(connection, family, address)
+            except _CONNECTION_ERRORS as e:
+                self._disconnect(connection, e)
+        elif (
+            connection.state != _EndpointConnection.STREAMING
+            and now > connection.deadline
+        ):
+            self._disconnect(connection, TimeoutError("timeout connecting"))
+
+    def _watch(self, connection: _EndpointConnection, events: int):
+        if self._selector is None or connection.sock is None:
+            return
+        try:
+            self._selector.modify(connection.sock, events, connection)
+        except KeyError:
+            self._selector.register(connection.sock, events, connection)
+
+    # endregion
+
+    # region connection
+
+    def _create_ssl_context(self, endpoint: DockerEndpoint) -> ssl.SSLContext:
+        tls_directory = endpoint.tls_directory
+        ca_file = None
+        if tls_directory and os.path.exists(os.path.join(tls_directory, "ca.pem")):
+            ca_file = os.path.join(tls_directory, "ca.pem")
+        ssl_context = ssl.create_default_context(cafile=ca_file)
+        if endpoint.skip_tls_verify:
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+        if tls_directory and os.path.exists(os.path.join(tls_directory, "cert.pem")):
+            ssl_context.load_cert_chain(
+                os.path.join(tls_directory, "cert.pem"),
+                os.path.join(tls_directory, "key.pem"),
+            )
+        return ssl_context
+
+    def _connect(self, connection: _EndpointConnection):
+        """Starts a non-blocking connection to the endpoint, resolving its host name first"""
+        self._end_backoff(connection)
+        connection.connect_started = time.monotonic()
+        connection.deadline = connection.connect_started + _CONNECT_TIMEOUT
+        url = urllib.parse.urlsplit(connection.endpoint.host)
+        if url.scheme == "unix":
+            self._open(connection, socket.AF_UNIX, url.path)
+            return
+        hostname = url.hostname or "localhost"
+        port = url.port or (2376 if connection.endpoint.tls_directory else 2375)
+        try:
+            ip_address = ipaddress.ip_address(hostname)
+        except ValueError:
+            ip_address = None
+        if ip_address is not None:
+            family = socket.AF_INET6 if ip_address.version == 6 else socket.AF_INET
+            self._open(connection, family, (hostname, port))
+            return
+        if self._resolver is None:
+            return
+        # getaddrinfo blocks (e.g. on a slow DNS server), so it runs on the resolver
+        # threads, which wake up the event loop once the name is resolved
+        connection.state = _EndpointConnection.RESOLVING
+        connection.resolution = self._resolver.submit(
+            socket.getaddrinfo, hostname, port, type=socket.SOCK_STREAM
+        )
+        connection.resolution.add_done_callback(lambda _: self._wakeup())
+
+    def _open(self, connection: _EndpointConnection, family: int, address: tuple | str):
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        if family != socket.AF_UNIX:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sock.setblocking(False)
+        connection.sock = sock
+        connection.state = _EndpointConnection.CONNECTING
+        error = sock.connect_ex(address)
+        if error not in (0, errno.EINPROGRESS, errno.EAGAIN, errno.EWOULDBLOCK):
+            raise OSError(error, os.strerror(error))
+        self._watch(connection, selectors.EVENT_WRITE)
+
+    def _on_connected(self, connection: _EndpointConnection):
+        endpoint = connection.endpoint
+        uses_tls = endpoint.host.startswith("tcp://") and (
+            endpoint.tls_directory is not None or endpoint.skip_tls_verify
+        )
+        if uses_tls and connection.sock is not None:
+            hostname = urllib.parse.urlsplit(endpoint.host).hostname
+            connection.sock = self._create_ssl_context(endpoint).wrap_socket(
+                connection.sock,
+                server_hostname=hostname,
+                do_handshake_on_connect=False,
+            )
+            connection.state = _EndpointConnection.HANDSHAKE
+            # the wrapped socket is a new object for the selector
+            self._unregister(connection.sock)
+            self._handshake(connection)
+        else:
+            self._start_session(connection)
+
+    def _handshake(self, connection: _EndpointConnection):
+        sock = connection.sock
+        if not isinstance(sock, ssl.SSLSocket):
+            return
+        try:
+            sock.do_handshake()
+        except ssl.SSLWantReadError:
+            self._watch(connection, selectors.EVENT_READ)
+            return
+        except ssl.SSLWantWriteError:
+            self._watch(connection, selectors.EVENT_WRITE)
+            return
+        self._start_session(connection)
+
+    def _start_session(self, connection: _EndpointConnection):
+        """Lists the containers, or resumes the events if the stream was lost recently"""
+        if _can_resume_events(
+            connection.checkpoint, connection.disconnected_on, self._max_resume_gap
+        ):
+            self._request_events(connection, resumed=True)
+        else:
+            connection.state = _EndpointConnection.LISTING
+            connection.checkpoint = _new_checkpoint()
+            self._send_request(connection, f"/containers/json{self._list_query}")
+
+    def _request_events(self, connection: _EndpointConnection, resumed: bool):
+        query = urllib.parse.urlencode(
+            {"since": str(connection.checkpoint), "filters": self._event_filters}
+        )
+        connection.state = _EndpointConnection.STREAMING
+        self._send_request(connection, f"/events?{query}")
+        self._on_streaming(connection, resumed)
+
+    def _send_request(self, connection: _EndpointConnection, path: str):
+        host = urllib.parse.urlsplit(connection.endpoint.host).hostname or "docker"
+        connection.response = _HttpResponseReader()
+        connection.body = bytearray()
+        connection.output += (
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n"
+        ).encode()
+        self._on_writable(connection)
+
+    def _on_writable(self, connection: _EndpointConnection):
+        sock = connection.sock
+        if sock is None:
+            return
+        if connection.state == _EndpointConnection.CONNECTING:
+            error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if error:
+                raise OSError(error, os.strerror(error))
+            self._on_connected(connection)
+            return
+        if connection.state == _EndpointConnection.HANDSHAKE:
+            self._handshake(connection)
+            return
+        while connection.output:
+            try:
+                sent = sock.send(connection.output)
+            except (BlockingIOError, ssl.SSLWantWriteError, ssl.SSLWantReadError):
+                break
+            del connection.output[:sent]
+        self._watch(
+            connection,
+            selectors.EVENT_READ | (selectors.EVENT_WRITE if connection.output else 0),
+        )
+
+    def _on_readable(self, connection: _EndpointConnection):
+        if connection.state == _EndpointConnection.HANDSHAKE:
+            self._handshake(connection)
+            return
+        sock = connection.sock
+        while sock is not None and connection.sock is sock:
+            try:
+                data = sock.recv(65536)
+            except (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError):
+                return
+            if not data:
+                raise ConnectionError("connection closed by the daemon")
+            self._on_data(connection, connection.response.feed(data))
+            if not isinstance(sock, ssl.SSLSocket) or not sock.pending():
+                return
+
+    def _on_data(self, connection: _EndpointConnection, body: bytes):
+        response = connection.response
+        if response.status is not None and response.status != 200:
+            raise DockerAPIError(f"Docker API error {response.status}")
+        connection.body += body
+        if connection.state == _EndpointConnection.LISTING:
+            if response.complete:
+                self._on_listed(connection, json.loads(bytes(connection.body)))
+        elif connection.state == _EndpointConnection.STREAMING:
+            # each event is a JSON document followed by a new line
+            while True:
+                index = connection.body.find(b"\n")
+                if index < 0:
+                    break
+                line = bytes(connection.body[:index])
+                del connection.body[: index + 1]
+                if line.strip():
+                    self._on_container_event(connection, json.loads(line))
+            if response.complete:
+                raise ConnectionError("event stream ended")
+
+    def _on_listed(self, connection: _EndpointConnection, containers: list[dict]):
+        # signal a (re)start, so the profiles published before are reconciled
+        self._emit(
+            connection, EventType.STARTING, f"{connection.endpoint.name} endpoint"
+        )
+        terminal_profiles = {
+            container_name: self._get_profile(connection, container_name)
+            for container_name in _get_container_names(
+                containers, self._container_filter
+            )
+        }
+        connection.published_profiles = terminal_profiles
+        self._emit(
+            connection,
+            EventType.ADD_PROFILES,
+            f"{len(terminal_profiles)} containers",
+            list(terminal_profiles.values()),
+        )
+        self._emit(
+            connection,
+            EventType.SYNCHRONIZED,
+            f"{connection.endpoint.name} containers listed",
+        )
+        self._request_events(connection, resumed=False)
+
+    def _on_streaming(self, connection: _EndpointConnection, resumed: bool):
+        stats = connection.stats
+        stats.healthy = True
+        stats.connections += 1
+        stats.last_connect_latency = time.monotonic() - connection.connect_started
+        connection.retry_policy.healthy()
+        connection.disconnected_on = None
+        connection.warned = False
+        if resumed:
+            self._emit(
+                connection,
+                EventType.HEALTHY,
+                f"{connection.endpoint.name} events resumed",
+            )
+
+    def _on_container_event(self, connection: _EndpointConnection, event: dict):
+        stats = connection.stats
+        stats.events += 1
+        if "timeNano" in event:
+            stats.last_event_delay = max(
+                time.time() - int(event["timeNano"]) / 1_000_000_000, 0
+            )
+        connection.checkpoint = _get_event_time(event, connection.checkpoint)
+
+        container_action = _get_container_action(event, self._container_filter)
+        if container_action is None:
+            return
+        action, container_name = container_action
+        if action == "start":
+            if container_name in connection.published_profiles:
+                return
+            profile = self._get_profile(connection, container_name)
+            connection.published_profiles[container_name] = profile
+            self._emit(connection, EventType.ADD_PROFILE, profile.name, profile)
+        elif container_name in connection.published_profiles:
+            profile = connection.published_profiles.pop(container_name)
+            self._emit(connection, EventType.REMOVE_PROFILE, profile.name, profile)
+
+    def _unregister(self, sock: socket.socket | None):
+        if self._selector is None or sock is None:
+            return
+        try:
+            self._selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+
+    def _close(self, connection: _EndpointConnection):
+        # the result of a resolution in progress is ignored
+        connection.resolution = None
+        sock = connection.sock
+        connection.sock = None
+        connection.output = bytearray()
+        if sock is not None:
+            self._unregister(sock)
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _disconnect(self, connection: _EndpointConnection, error: Exception):
+        """Closes the connection and schedules the next attempt with the backoff of the endpoint"""
+        was_streaming = connection.state == _EndpointConnection.STREAMING
+        self._close(connection)
+        connection.state = _EndpointConnection.IDLE
+        stats = connection.stats
+        stats.healthy = False
+        stats.failures += 1
+        stats.last_error = str(error) or error.__class__.__name__
+        delay = connection.retry_policy.next_delay()
+        stats.retries += 1
+        connection.backoff_started = time.monotonic()
+        connection.next_attempt = connection.backoff_started + delay
+        if was_streaming:
+            connection.disconnected_on = time.monotonic()
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(
+                f"{connection.endpoint.name} endpoint error: {stats.last_error}, "
+                + f"retrying in {delay:.1f} seconds"
+            )
+        if was_streaming or connection.published_profiles:
+            # the profiles are kept while the endpoint reconnects
+            self._emit(
+                connection,
+                EventType.RECONNECTING,
+                f"{connection.endpoint.name} {stats.last_error}, "
+                + f"waiting {delay:.1f} seconds...",
+            )
+
+    def _end_backoff(self, connection: _EndpointConnection):
+        """Adds the time spent waiting since the last failure to the statistics"""
+        if connection.backoff_started is not None:
+            connection.stats.backoff_time += (
+                time.monotonic() - connection.backoff_started
+            )
+            connection.backoff_started = None
+
+    # endregion
+
+    def stop(self, timeout: float = 1):
+        """Stops the connector. The event loop closes the connections to all the
+        endpoints and removes their groups."""
+        self.terminated = True
+        self._wakeup()
+        super().stop(timeout)
+        if not self.is_alive():
+            # the event loop wasn't running (e.g. waiting to retry), so the
+            # connections left are removed here
+            self._remove_connections()
@@ -0,0 +1,219 @@
+import fnmatch
+import logging
+import os
+import re
+
+INCLUDE_ENVIRONMENT_VARIABLE = "PODSHELL_INCLUDE_CONTAINERS"
+"""Comma separated include terms of the container filter used by default"""
+
+EXCLUDE_ENVIRONMENT_VARIABLE = "PODSHELL_EXCLUDE_CONTAINERS"
+"""Comma separated exclude terms of the container filter used by default"""
+
+COMPOSE_PROJECT_LABEL = "com.docker.compose.project"
+
+_KINDS = ("label", "compose", "image", "name")
+_WILDCARDS = re.compile(r"[*?\[]")
+
+_logger: logging.Logger = logging.getLogger(__name__)
+
+
+class ContainerFilterError(ValueError):
+    """Raised when a term of a container filter is not valid"""
+
+
+def _compile_patterns(patterns: list[str]) -> re.Pattern | None:
+    """Compiles shell-style patterns into a single regular expression"""
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+
+
+def _parse_label(term: str) -> tuple[str, str | None]:
+    key, separator, value = term.partition("=")
+    return key, value if separator else None
+
+
+def _image_names(image: str) -> tuple[str, str]:
+    """Returns the image, and the image without its tag or digest"""
+    repository = image.split("@", 1)[0]
+    # a colon after the last slash starts the tag (a colon before it is a registry port)
+    if repository.rfind(":") > repository.rfind("/"):
+        repository = repository[: repository.rfind(":")]
+    return image, repository
+
+
+class ContainerFilter:
+    """Selects the containers that get a profile, by label, compose project, image
+    and name. Terms are written kind:value, e.g. label:tier=web, compose:shop,
+    image:nginx*, name:web-*. Image and name values are shell-style patterns.
+    A container is included if it matches a term of each kind of include terms,
+    and no exclude term. The filters Docker supports are pushed down to the list
+    and events requests; the other terms are checked by a matcher compiled once.
+    """
+
+    def __init__(
+        self, include: list[str] | None = None, exclude: list[str] | None = None
+    ):
+        """Creates a new instance of the ContainerFilter class.
+        Raises ContainerFilterError if a term is not valid.
+        """
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        included = self._group_terms(self.include)
+        excluded = self._group_terms(self.exclude)
+
+        self._include_labels = [_parse_label(term) for term in included["label"]]
+        self._include_projects = set(included["compose"])
+        self._include_images = _compile_patterns(included["image"])
+        self._include_names = _compile_patterns(included["name"])
+        self._exclude_labels = [_parse_label(term) for term in excluded["label"]]
+        self._exclude_projects = set(excluded["compose"])
+        self._exclude_images = _compile_patterns(excluded["image"])
+        self._exclude_names = _compile_patterns(excluded["name"])
+
+        # Docker requires all the label filters, so a kind is only pushed down when a
+        # single label can express it: its only term, or the key shared by its terms
+        server_labels = []
+        for labels in (
+            self._include_labels,
+            [(COMPOSE_PROJECT_LABEL, project) for project in self._include_projects],
+        ):
+            if len(labels) == 1:
+                key, value = labels[0]
+                server_labels.append(key if value is None else f"{key}={value}")
+            elif labels and len({key for key, _ in labels}) == 1:
+                server_labels.append(labels[0][0])
+        self._server_labels = server_labels
+        # the ancestor filter matches any of the images (and the images built on them),
+        # so it is only pushed down when there are no patterns
+        self._server_images = (
+            list(included["image"])
+            if included["image"]
+            and not any(_WILDCARDS.search(i) for i in included["image"])
+            else []
+        )
+        # the name filter of the list matches names containing the value and the
+        # container filter of the events matches a name or an ID, so names are only
+        # pushed down when there are no patterns; they are still checked by the matcher
+        self._server_names = (
+            list(included["name"])
+            if included["name"]
+            and not any(_WILDCARDS.search(n) for n in included["name"])
+            else []
+        )
+
+    @staticmethod
+    def _group_terms(terms: list[str]) -> dict[str, list[str]]:
+        grouped: dict[str, list[str]] = {kind: [] for kind in _KINDS}
+        for term in terms:
+            kind, separator, value = term.strip().partition(":")
+            if not separator or kind not in grouped or not value:
+                raise ContainerFilterError(
+                    f"Invalid container filter term '{term}', expected "
+                    + f"{', '.join(f'{kind}:value' for kind in _KINDS)}"
+                )
+            grouped[kind].append(value)
+        return grouped
+
+    @classmethod
+    def from_environment(cls) -> "ContainerFilter":
+        """Creates the filter given by the PODSHELL_INCLUDE_CONTAINERS and
+        PODSHELL_EXCLUDE_CONTAINERS environment variables. An invalid filter is
+        logged and ignored."""
+
+        def terms(variable: str) -> list[str]:
+            return [
+                term for term in os.environ.get(variable, "").split(",") if term.strip()
+            ]
+
+        try:
+            return cls(
+                terms(INCLUDE_ENVIRONMENT_VARIABLE), terms(EXCLUDE_ENVIRONMENT_VARIABLE)
+            )
+        except ContainerFilterError as e:
+            _logger.error(f"Container filter ignored: {e}")
+            return cls()
+
+    def is_empty(self) -> bool:
+        """Returns true if the filter selects all the containers"""
+        return not self.include and not self.exclude
+
+    def list_filters(self) -> dict[str, list[str]]:
+        """Returns the filters of the containers list request"""
+        filters: dict[str, list[str]] = {}
+        if self._server_labels:
+            filters["label"] = list(self._server_labels)
+        if self._server_images:
+            filters["ancestor"] = list(self._server_images)
+        if self._server_names:
+            filters["name"] = list(self._server_names)
+        return filters
+
+    def event_filters(self) -> dict[str, list[str]]:
+        """Returns the filters of the events request, besides the type and event filters.
+        Images are not pushed down, since events only match the image name as written
+        when the container was created."""
+        filters: dict[str, list[str]] = {}
+        if self._server_labels:
+            filters["label"] = list(self._server_labels)
+        if self._server_names:
+            filters["container"] = list(self._server_names)
+        return filters
+
+    @staticmethod
+    def _matches_labels(
+        terms: list[tuple[str, str | None]], labels: dict[str, str]
+    ) -> bool:
+        return any(
+            key in labels and (value is None or labels[key] == value)
+            for key, value in terms
+        )
+
+    @staticmethod
+    def _matches_image(pattern: re.Pattern, image: str) -> bool:
+        return any(pattern.match(name) for name in _image_names(image))
+
+    def matches(self, name: str, image: str, labels: dict[str, str]) -> bool:
+        """Returns true if a container is selected by the filter"""
+        if self._include_labels and not self._matches_labels(
+            self._include_labels, labels
+        ):
+            return False
+        project = labels.get(COMPOSE_PROJECT_LABEL)
+        if self._include_projects and project not in self._include_projects:
+            return False
+        if self._include_images and not self._matches_image(
+            self._include_images, image
+        ):
+            return False
+        if self._include_names and not self._include_names.match(name):
+            return False
+        if self._exclude_labels and self._matches_labels(self._exclude_labels, labels):
+            return False
+        if project is not None and project in self._exclude_projects:
+            return False
+        if self._exclude_images and self._matches_image(self._exclude_images, image):
+            return False
+        return not (self._exclude_names and self._exclude_names.match(name))
+
+    def matches_container(self, container: dict) -> bool:
+        """Returns true if a container summary (of the containers list) is selected"""
+        if self.is_empty():
+            return True
+        names = container.get("Names") or [""]
+        return self.matches(
+            # container names are reported with a leading slash
+            names[0].lstrip("/"),
+            container.get("Image") or "",
+            container.get("Labels") or {},
+        )
+
+    def matches_event(self, event: dict) -> bool:
+        """Returns true if the container of an event is selected.
+        The attributes of a container event hold its name, image and labels."""
+        if self.is_empty():
+            return True
+        attributes = (event.get("Actor") or {}).get("Attributes") or {}
+        return self.matches(
+            attributes.get("name", ""), attributes.get("image", ""), attributes
+        )
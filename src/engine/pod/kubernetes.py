@@ -0,0 +1,524 @@
+import base64
+import http.client
+import json
+import logging
+import os
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import urllib.parse
+from sys import platform
+from typing import Callable, Iterator
+
+import utils
+from engine.events import Event, EventType
+from engine.terminal import configuration
+
+from .connection import BaseConnector
+
+KUBECTL_COMMAND = "kubectl" if platform != "win32" else "kubectl.exe"
+
+_REQUEST_TIMEOUT = 30
+"""Seconds to wait for the API server to answer a request (other than a watch)"""
+
+_LIST_PAGE_SIZE = 500
+"""The number of pods requested per page when listing"""
+
+_RUNNING_PODS_SELECTOR = "status.phase=Running"
+"""The field selector of the pods listed and watched. A pod leaving the Running
+phase no longer matches, so the watch reports it as DELETED."""
+
+
+class KubernetesAPIError(Exception):
+    """An error answered by the API server, or a kubeconfig that doesn't allow to reach it."""
+
+
+class _ResourceVersionExpired(KubernetesAPIError):
+    """The resource version of the watch is too old (410 Gone); the pods must be listed again."""
+
+
+_API_ERRORS = (
+    KubernetesAPIError,
+    OSError,
+    http.client.HTTPException,
+    subprocess.SubprocessError,
+    ValueError,
+)
+"""The errors of reading the kubeconfig (with kubectl) and of the requests to the API
+server. OSError includes the connection and TLS errors, ValueError the JSON errors."""
+
+
+class _Cluster:
+    """The API server of a kubeconfig context and the credentials to connect to it."""
+
+    def __init__(
+        self,
+        server: str,
+        context: str,
+        namespace: str,
+        headers: dict[str, str],
+        ssl_context: ssl.SSLContext | None,
+    ):
+        url = urllib.parse.urlsplit(server)
+        self.https = url.scheme == "https"
+        self.host = url.hostname or "localhost"
+        self.port = url.port or (443 if self.https else 80)
+        self.base_path = url.path.rstrip("/")
+        self.context = context
+        """The name of the kubeconfig context"""
+        self.namespace = namespace
+        """The namespace of the context, used if the pods of all the namespaces can't be listed"""
+        self.headers = headers
+        self.ssl_context = ssl_context
+
+    def connect(self, timeout: float) -> http.client.HTTPConnection:
+        if self.https:
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=timeout, context=self.ssl_context
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+
+class KubernetesConnector(BaseConnector):
+    """A connector that watches the running pods of a Kubernetes cluster.
+    The pods are listed once, then followed with the watch API from the resource
+    version of the list. Bookmarks keep the resource version current on quiet
+    clusters, so a lost watch is resumed without listing the pods again.
+    """
+
+    def __init__(
+        self,
+        event_handler: Callable[[Event], None],
+        api_server: str | None = None,
+        context: str | None = None,
+        namespace: str | None = None,
+        kubectl_command: str | None = None,
+        shell_command: str = "/bin/sh",
+        watch_timeout: int = 300,
+    ):
+        """Initializes the KubernetesConnector.
+        Args:
+            api_server: The URL of the API server. If None, the server and the
+                credentials of the context are read with kubectl config view.
+            context: The kubeconfig context. If None, the current context is used.
+            namespace: The namespace to watch. If None, the pods of all the namespaces
+                are watched, or those of the namespace of the context if the user
+                can't list all the pods.
+            kubectl_command: The kubectl executable, looked up on first use if None.
+            watch_timeout: Seconds after which the API server ends a watch; the
+                connector then resumes it from the last resource version.
+        """
+        super().__init__(
+            name="Kubernetes",
+            event_handler=event_handler,
+        )
+        self._api_server = api_server
+        self._context = context
+        self._namespace = namespace
+        self._kubectl_command = kubectl_command
+        self._shell_command = shell_command
+        self._watch_timeout = watch_timeout
+        self._cluster: _Cluster | None = None
+        # the resource version up to which the pods have been processed
+        self._resource_version: str | None = None
+        # a dictionary (key: profile name, value: profile) of the published pods
+        self._published_profiles: dict[str, configuration.TerminalProfile] = {}
+        # the connection of the request in progress, closed by stop to unblock the thread
+        self._connection: http.client.HTTPConnection | None = None
+        self._connection_lock = threading.Lock()
+        self.lists = 0
+        """The number of times the pods were listed"""
+        self.watches = 0
+        """The number of watch requests"""
+
+    # region cluster configuration
+
+    def _get_kubectl_command(self) -> str:
+        if self._kubectl_command is None:
+            self._kubectl_command = utils.which(KUBECTL_COMMAND, KUBECTL_COMMAND)
+        return self._kubectl_command or KUBECTL_COMMAND
+
+    def _get_cluster(self) -> _Cluster:
+        """Returns the cluster of the connector, reading the kubeconfig on first use."""
+        if self._cluster is None:
+            if self._api_server is not None:
+                self._cluster = _Cluster(
+                    self._api_server,
+                    self._context or "",
+                    self._namespace or "default",
+                    {},
+                    None,
+                )
+            else:
+                self._cluster = self._load_cluster()
+        return self._cluster
+
+    def _load_cluster(self) -> _Cluster:
+        """Reads the server and the credentials of the context with kubectl, so the
+        kubeconfig files and the KUBECONFIG environment variable are handled as kubectl does.
+        """
+        command = [
+            self._get_kubectl_command(),
+            "config",
+            "view",
+            "-o",
+            "json",
+            "--minify",
+            "--raw",
+        ]
+        if self._context is not None:
+            command += ["--context", self._context]
+        kubeconfig = json.loads(
+            subprocess.check_output(
+                command, stderr=subprocess.DEVNULL, timeout=_REQUEST_TIMEOUT
+            )
+        )
+        if not kubeconfig.get("clusters") or not kubeconfig.get("contexts"):
+            raise KubernetesAPIError("No Kubernetes context configured")
+        cluster = kubeconfig["clusters"][0].get("cluster", {})
+        if not cluster.get("server"):
+            raise KubernetesAPIError("No server configured for the Kubernetes context")
+        context = kubeconfig["contexts"][0]
+        users = kubeconfig.get("users") or [{}]
+        user = users[0].get("user") or {}
+
+        headers = {}
+        token = self._get_token(user)
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        elif user.get("username") is not None:
+            credentials = f"{user['username']}:{user.get('password', '')}"
+            headers["Authorization"] = (
+                f"Basic {base64.b64encode(credentials.encode()).decode()}"
+            )
+
+        ssl_context = None
+        if cluster["server"].startswith("https"):
+            ssl_context = self._create_ssl_context(cluster, user)
+        return _Cluster(
+            cluster["server"],
+            context.get("name", ""),
+            context.get("context", {}).get("namespace") or "default",
+            headers,
+            ssl_context,
+        )
+
+    @staticmethod
+    def _get_token(user: dict) -> str | None:
+        if user.get("token"):
+            return user["token"]
+        if user.get("tokenFile"):
+            with open(user["tokenFile"], "r") as token_file:
+                return token_file.read().strip()
+        if user.get("exec"):
+            # credential plugins (e.g. for managed clusters) print an ExecCredential
+            exec_config = user["exec"]
+            env = dict(os.environ)
+            for variable in exec_config.get("env") or []:
+                env[variable["name"]] = variable["value"]
+            output = subprocess.check_output(
+                [exec_config["command"]] + (exec_config.get("args") or []),
+                env=env,
+                timeout=_REQUEST_TIMEOUT,
+            )
+            return json.loads(output).get("status", {}).get("token")
+        return None
+
+    @staticmethod
+    def _create_ssl_context(cluster: dict, user: dict) -> ssl.SSLContext:
+        ssl_context = ssl.create_default_context(
+            cafile=cluster.get("certificate-authority")
+        )
+        if cluster.get("certificate-authority-data"):
+            ssl_context.load_verify_locations(
+                cadata=base64.b64decode(cluster["certificate-authority-data"]).decode()
+            )
+        if cluster.get("insecure-skip-tls-verify"):
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+
+        certificate = user.get("client-certificate")
+        key = user.get("client-key")
+        if user.get("client-certificate-data") and user.get("client-key-data"):
+            # the ssl module only loads client certificates from files
+            with tempfile.TemporaryDirectory() as directory:
+                certificate = os.path.join(directory, "client.crt")
+                key = os.path.join(directory, "client.key")
+                with open(certificate, "wb") as certificate_file:
+                    certificate_file.write(
+                        base64.b64decode(user["client-certificate-data"])
+                    )
+                with open(key, "wb") as key_file:
+                    key_file.write(base64.b64decode(user["client-key-data"]))
+                ssl_context.load_cert_chain(certificate, key)
+        elif certificate and key:
+            ssl_context.load_cert_chain(certificate, key)
+        return ssl_context
+
+    # endregion
+
+    # region requests
+
+    def _request(self, path: str, query: dict[str, str], timeout: float):
+        """Sends a GET request to the API server and returns the response.
+        The connection is kept until the next request, so stop can close it."""
+        self._close_connection()
+        cluster = self._get_cluster()
+        connection = cluster.connect(timeout)
+        with self._connection_lock:
+            if self.terminated:
+                connection.close()
+                raise ConnectionAbortedError(f"{self.name} connector stopped")
+            self._connection = connection
+        url = cluster.base_path + path
+        if query:
+            url += "?" + urllib.parse.urlencode(query)
+        connection.request(
+            "GET", url, headers={"Accept": "application/json", **cluster.headers}
+        )
+        response = connection.getresponse()
+        if response.status == 401:
+            # the token may have expired, read the credentials again next time
+            self._cluster = None
+        return response
+
+    def _close_connection(self):
+        """Closes the connection in progress, which unblocks the thread reading it."""
+        with self._connection_lock:
+            connection = self._connection
+            self._connection = None
+        if connection is not None:
+            sock = connection.sock
+            if sock is not None:
+                try:
+                    # closing the socket alone doesn't wake up a blocked read
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            connection.close()
+
+    def _get_pods_path(self) -> str:
+        if self._namespace is None:
+            return "/api/v1/pods"
+        return f"/api/v1/namespaces/{urllib.parse.quote(self._namespace)}/pods"
+
+    # endregion
+
+    def health_check(self) -> bool:
+        """Checks if the API server of the cluster answers.
+        Returns:
+            True if the API server is reachable, False otherwise.
+        """
+        try:
+            response = self._request("/version", {}, _REQUEST_TIMEOUT)
+            response.read()
+            return response.status == 200
+        except _API_ERRORS as e:
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug(f"{self.name} health check failed: {e}")
+            # the configuration (e.g. the current context) may have changed
+            self._cluster = None
+            return False
+        finally:
+            self._close_connection()
+
+    def _can_resume(self) -> bool:
+        """Returns true if the watch can resume from the last resource version,
+        without listing the pods again."""
+        return self._resource_version is not None
+
+    # region profiles
+
+    def _get_profile(self, pod: dict) -> configuration.TerminalProfile:
+        metadata = pod["metadata"]
+        namespace = metadata.get("namespace") or self._get_cluster().namespace
+        pod_name = metadata["name"]
+        cluster = self._get_cluster()
+        # the profiles are grouped by context and namespace through their name
+        profile_name = f"{namespace}/{pod_name}"
+        command = (
+            f"{self._get_kubectl_command()} exec -it -n {namespace} {pod_name}"
+            + (f" --context {cluster.context}" if cluster.context else "")
+            + f" -- {self._shell_command}"
+        )
+        if cluster.context:
+            profile_name = f"{cluster.context}/{profile_name}"
+        return configuration.TerminalProfile(
+            profile_name, command, source_name=self.name
+        )
+
+    @staticmethod
+    def _is_running(pod: dict) -> bool:
+        return (
+            pod.get("status", {}).get("phase") == "Running"
+            and pod["metadata"].get("deletionTimestamp") is None
+        )
+
+    def _publish(self, event_type: EventType, profile: configuration.TerminalProfile):
+        if event_type == EventType.ADD_PROFILE:
+            if profile.name in self._published_profiles:
+                return
+            self._published_profiles[profile.name] = profile
+        elif self._published_profiles.pop(profile.name, None) is None:
+            return
+        self._event_handler(
+            Event(
+                source_name=self.name,
+                event_type=event_type,
+                event_data=profile,
+                event_message=profile.name,
+            )
+        )
+
+    # endregion
+
+    # region list and watch
+
+    def _list_pods(self) -> Iterator[dict]:
+        """Yields the running pods, a page at a time, and sets the resource version
+        of the list"""
+        query = {"fieldSelector": _RUNNING_PODS_SELECTOR, "limit": str(_LIST_PAGE_SIZE)}
+        while True:
+            response = self._request(self._get_pods_path(), query, _REQUEST_TIMEOUT)
+            body = response.read()
+            if response.status == 403 and self._namespace is None:
+                # the user can't list the pods of all the namespaces
+                self._namespace = self._get_cluster().namespace
+                self._logger.info(
+                    "Cannot list the pods of all the namespaces, "
+                    + f"watching namespace {self._namespace}"
+                )
+                continue
+            if response.status != 200:
+                raise KubernetesAPIError(
+                    f"Listing pods failed: {response.status} {response.reason}"
+                )
+            pod_list = json.loads(body)
+            yield from pod_list.get("items") or []
+            metadata = pod_list.get("metadata", {})
+            if not metadata.get("continue"):
+                self._resource_version = metadata.get("resourceVersion")
+                return
+            query["continue"] = metadata["continue"]
+
+    def _synchronize(self):
+        """Lists the running pods and publishes them with a single batch event"""
+        if self._published_profiles:
+            # signal a restart, so the profiles published before are reconciled
+            self._event_handler(
+                Event(
+                    source_name=self.name,
+                    event_type=EventType.STARTING,
+                    event_message=f"{self.name} connector resync",
+                )
+            )
+        self.lists += 1
+        terminal_profiles = {}
+        for pod in self._list_pods():
+            if self._is_running(pod):
+                profile = self._get_profile(pod)
+                terminal_profiles[profile.name] = profile
+        self._published_profiles = terminal_profiles
+        self._event_handler(
+            Event(
+                source_name=self.name,
+                event_type=EventType.ADD_PROFILES,
+                event_data=list(terminal_profiles.values()),
+                event_message=f"{len(terminal_profiles)} pods",
+            )
+        )
+        self._event_handler(
+            Event(
+                source_name=self.name,
+                event_type=EventType.SYNCHRONIZED,
+                event_message=f"{self.name} pods listed",
+            )
+        )
+
+    def _watch(self):
+        """Watches the pods from the last resource version until the API server ends
+        the watch. Raises _ResourceVersionExpired if the resource version is too old."""
+        self.watches += 1
+        query = {
+            "watch": "1",
+            "allowWatchBookmarks": "true",
+            "fieldSelector": _RUNNING_PODS_SELECTOR,
+            "resourceVersion": self._resource_version or "",
+            "timeoutSeconds": str(self._watch_timeout),
+        }
+        # the read timeout is longer than the watch, which the server ends itself
+        response = self._request(
+            self._get_pods_path(), query, self._watch_timeout + _REQUEST_TIMEOUT
+        )
+        if response.status == 410:
+            raise _ResourceVersionExpired()
+        if response.status != 200:
+            response.read()
+            raise KubernetesAPIError(
+                f"Watching pods failed: {response.status} {response.reason}"
+            )
+
+        # each line is a JSON watch event
+        for line in response:
+            if self.terminated:
+                return
+            if not line.strip():
+                continue
+            watch_event = json.loads(line)
+            event_type = watch_event.get("type")
+            pod = watch_event.get("object") or {}
+            if event_type == "ERROR":
+                if pod.get("code") == 410:
+                    raise _ResourceVersionExpired()
+                raise KubernetesAPIError(f"Watch error: {pod.get('message')}")
+
+            if event_type in ("ADDED", "MODIFIED"):
+                self._publish(
+                    (
+                        EventType.ADD_PROFILE
+                        if self._is_running(pod)
+                        else EventType.REMOVE_PROFILE
+                    ),
+                    self._get_profile(pod),
+                )
+            elif event_type == "DELETED":
+                self._publish(EventType.REMOVE_PROFILE, self._get_profile(pod))
+            # every event, including bookmarks, moves the resource version forward
+            resource_version = pod.get("metadata", {}).get("resourceVersion")
+            if resource_version:
+                self._resource_version = resource_version
+
+    def _run(self):
+        try:
+            while not self.terminated:
+                if self._resource_version is None:
+                    self._synchronize()
+                else:
+                    self._logger.debug(
+                        f"Watching pods from resource version {self._resource_version}"
+                    )
+                try:
+                    self._watch()
+                except _ResourceVersionExpired:
+                    self._logger.info(
+                        f"Resource version {self._resource_version} expired, listing pods again"
+                    )
+                    self._resource_version = None
+        except _API_ERRORS:
+            if self.terminated:
+                # closing the connection on stop interrupts the read with an error
+                return
+            raise
+        finally:
+            self._close_connection()
+
+    # endregion
+
+    def stop(self, timeout: float = 1):
+        """Stops the connector and closes its connection to the API server."""
+        self.terminated = True
+        # the thread may be blocked reading the watch of a quiet cluster
+        self._close_connection()
+        super().stop(timeout)
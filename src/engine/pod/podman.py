@@ -0,0 +1,70 @@
+import os
+from sys import platform
+from typing import TYPE_CHECKING, Callable
+
+from engine.events import Event
+
+from .container import ContainerEngineConnector
+from .filters import ContainerFilter
+
+if TYPE_CHECKING:
+    import docker  # type: ignore
+
+PODMAN_COMMAND = "podman" if platform != "win32" else "podman.exe"
+
+
+class PodmanConnector(ContainerEngineConnector):
+    """A connector that subscribes to Podman events, through the Docker compatible
+    API of the Podman service (podman system service, or the podman.socket unit)."""
+
+    def __init__(
+        self,
+        event_handler: Callable[[Event], None],
+        docker_client: "docker.DockerClient | None" = None,
+        shell_command: str = "/bin/sh",
+        podman_command: str | None = None,
+        max_resume_gap: float = 300,
+        container_filter: ContainerFilter | None = None,
+    ):
+        """Initializes the PodmanConnector.
+        If podman_command is None, the podman executable is looked up on first use.
+        """
+        super().__init__(
+            event_handler=event_handler,
+            name="Podman",
+            engine_command=PODMAN_COMMAND,
+            docker_client=docker_client,
+            shell_command=shell_command,
+            command=podman_command,
+            max_resume_gap=max_resume_gap,
+            container_filter=container_filter,
+        )
+
+    @staticmethod
+    def _get_base_url() -> str | None:
+        """Returns the URL of the Podman service, or None if it can't be found.
+        CONTAINER_HOST is used if set, then the rootless socket of the user
+        and the rootful socket."""
+        container_host = os.environ.get("CONTAINER_HOST")
+        if container_host:
+            return container_host
+        socket_paths = []
+        if "XDG_RUNTIME_DIR" in os.environ:
+            socket_paths.append(
+                os.path.join(os.environ["XDG_RUNTIME_DIR"], "podman", "podman.sock")
+            )
+        socket_paths.append("/run/podman/podman.sock")
+        for socket_path in socket_paths:
+            if os.path.exists(socket_path):
+                return f"unix://{socket_path}"
+        return None
+
+    def _create_docker_client(self):
+        # the docker SDK is slow to import, so it is only imported when a client is needed
+        import docker  # type: ignore
+
+        base_url = self._get_base_url()
+        if base_url is None:
+            raise docker.errors.DockerException("Podman socket not found")
+        self._logger.debug("Using Podman service at %s", base_url)
+        return docker.DockerClient(base_url=base_url)
@@ -0,0 +1,246 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Callable, Coroutine
+
+from engine.events import Event, EventType
+
+from .connection import RetryPolicy
+
+_BLOCKING_WORKERS = 4
+"""Number of threads running the blocking calls of the asynchronous connectors"""
+
+
+class ConnectorRuntime:
+    """An asyncio event loop, running on a single daemon thread, shared by the
+    asynchronous connectors. Connectors are tasks of the loop: their waits are
+    timers rather than sleeping threads, and stopping a connector cancels its task.
+    Blocking calls (e.g. reading a file) run on a small pool of threads shared by
+    all the connectors, so the number of threads doesn't grow with the connectors.
+    """
+
+    _logger = logging.getLogger(__name__)
+
+    _default: "ConnectorRuntime | None" = None
+    _default_lock = threading.Lock()
+
+    def __init__(
+        self, name: str = "ConnectorRuntime", blocking_workers: int = _BLOCKING_WORKERS
+    ):
+        """Creates a new instance of the ConnectorRuntime class."""
+        self.name = name
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name=name, daemon=True)
+        self._thread_lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=blocking_workers, thread_name_prefix=f"{name}-blocking"
+        )
+
+    @classmethod
+    def default(cls) -> "ConnectorRuntime":
+        """Returns the runtime shared by the process, started on first use"""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = ConnectorRuntime()
+            return cls._default
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        finally:
+            # the tasks still running are cancelled, so their finally blocks
+            # release their resources
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(
+                asyncio.gather(*tasks, return_exceptions=True)
+            )
+            self._loop.close()
+
+    def start(self):
+        """Starts the event loop thread, if it is not started yet."""
+        with self._thread_lock:
+            if not self._thread.is_alive() and not self._loop.is_closed():
+                self._thread.start()
+
+    def stop(self, timeout: float = 1):
+        """Stops the event loop, cancelling the tasks still running."""
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+
+    def is_runtime_thread(self) -> bool:
+        """Returns true if the current thread runs the event loop"""
+        return threading.current_thread() is self._thread
+
+    def create_task(self, coroutine: Coroutine) -> concurrent.futures.Future:
+        """Schedules a coroutine on the event loop. This method can be called from any thread.
+        Returns:
+            A future of the result of the coroutine.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def call_soon(self, callback: Callable[..., Any], *args):
+        """Calls a function on the event loop thread. This method can be called from any thread."""
+        self._loop.call_soon_threadsafe(callback, *args)
+
+    async def run_blocking(self, function: Callable[..., Any], *args) -> Any:
+        """Runs a blocking function on the shared threads and waits for its result"""
+        return await self._loop.run_in_executor(self._executor, function, *args)
+
+
+class AsyncConnector:
+    """Base class for connectors running as tasks of a ConnectorRuntime.
+    It has the interface of BaseConnector (start, stop, join, is_alive, health_check
+    and terminated), so the orchestrator handles both kinds of connectors alike and
+    the thread-based connectors keep running unchanged.
+    When inheriting from this class, the _run coroutine should be overridden.
+    """
+
+    _logger = logging.getLogger(__name__)
+
+    terminated: bool = False
+    """Indicates if the connector has terminated.
+    This property is set to True when the stop method is called.
+    A terminated connector should not be restarted.
+    """
+
+    def __init__(
+        self,
+        event_handler: Callable[[Event], None],
+        name: str = "",
+        retry_policy: RetryPolicy | None = None,
+        runtime: ConnectorRuntime | None = None,
+    ):
+        """Creates a new instance of the AsyncConnector class.
+        If runtime is None, the runtime shared by the process is used.
+        """
+        self.terminated = False
+        self.name = name
+        self._event_handler = event_handler
+        self.retry_policy = retry_policy or RetryPolicy()
+        """The backoff between the retries of the connector, with its retry count
+        and the time spent waiting"""
+        self._runtime = runtime
+        # the future of the run coroutine, set by start
+        self._future: concurrent.futures.Future | None = None
+        # the task of the run coroutine, only used on the event loop thread
+        self._task: asyncio.Task | None = None
+
+    @property
+    def runtime(self) -> ConnectorRuntime:
+        """The runtime running the connector"""
+        if self._runtime is None:
+            self._runtime = ConnectorRuntime.default()
+        return self._runtime
+
+    async def _run(self):
+        raise NotImplementedError()
+
+    def _can_resume(self) -> bool:
+        """Returns true if the next _run can resume from where the last one stopped,
+        without publishing all the profiles again."""
+        return False
+
+    def health_check(self) -> bool:
+        """Checks if the connector is healthy.
+        This method may block; the runtime calls it on its blocking threads."""
+        raise NotImplementedError()
+
+    async def _publish(self, event: Event):
+        """Calls the event handler on the blocking threads. The handler may block
+        (e.g. an event bus with a full queue), which would stall every connector
+        of the runtime if it ran on the event loop thread."""
+        await self.runtime.run_blocking(self._event_handler, event)
+
+    async def _emit(self, event_type: EventType, message: str):
+        await self._publish(
+            Event(
+                source_name=self.name,
+                event_type=event_type,
+                event_message=message,
+            )
+        )
+
+    async def _retry(self, error_message: str) -> bool:
+        """Waits before retrying. Returns false if the connector was stopped."""
+        delay = self.retry_policy.next_delay()
+        # connectors that can resume keep their profiles while reconnecting
+        await self._emit(
+            EventType.RECONNECTING if self._can_resume() else EventType.WARNING,
+            f"{self.name} {error_message}, waiting {delay:.1f} seconds...",
+        )
+        # a timer rather than a sleeping thread; stop cancels it
+        return await self.retry_policy.wait_async(delay)
+
+    async def run(self):
+        """Runs the connector. This coroutine should not be awaited directly. Use the start method instead."""
+        self._task = asyncio.current_task()
+        # call the event handler signaling that the connector is starting
+        await self._emit(EventType.STARTING, f"{self.name} connector")
+        while not self.terminated:
+            try:
+                if await self.runtime.run_blocking(self.health_check):
+                    # the backoff is reset only if _run then works for a while
+                    self.retry_policy.healthy()
+                    await self._emit(EventType.HEALTHY, f"{self.name} connector")
+                    await self._run()
+                else:
+                    self._logger.debug(f"{self.name} connector unhealthy")
+                    if not await self._retry("connector unhealthy"):
+                        break
+            except Exception as e:
+                if self.terminated:
+                    break
+                self._logger.warning(f"{self.name} connector exception", exc_info=e)
+                if not await self._retry("connector exception"):
+                    break
+
+    def start(self):
+        """Starts the connector on its runtime."""
+        if self._future is not None:
+            raise RuntimeError("connectors can only be started once")
+        self._future = self.runtime.create_task(self.run())
+
+    def is_alive(self) -> bool:
+        """Returns true if the connector was started and is still running"""
+        return self._future is not None and not self._future.done()
+
+    def join(self, timeout: float | None = None):
+        """Waits until the connector ends, or the timeout expires."""
+        if self._future is None or self.runtime.is_runtime_thread():
+            # the event loop can't wait for one of its own tasks
+            return
+        try:
+            self._future.result(timeout)
+        except (concurrent.futures.CancelledError, concurrent.futures.TimeoutError):
+            pass
+        except Exception as e:
+            self._logger.debug(f"{self.name} connector ended with an error", exc_info=e)
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def stop(self, timeout: float = 1):
+        """Stops the connector, cancelling its task."""
+        self.terminated = True
+        self.retry_policy.cancel()
+        if self._future is not None:
+            # a task that didn't run yet ends on its own, since terminated is set
+            self.runtime.call_soon(self._cancel)
+
+        # call the event handler signaling that the connector is stopping
+        self._event_handler(
+            Event(
+                source_name=self.name,
+                event_type=EventType.STOPPING,
+                event_message=f"{self.name} connector",
+            )
+        )
+        self.join(timeout)
@@ -1,21 +1,26 @@
 import logging
 import os
 from sys import platform
-import time
 from typing import Callable
 
 import utils
 from engine.events import Event, EventType
 from engine.terminal import configuration
 
-from .connection import BaseConnector
+from .runtime import AsyncConnector, ConnectorRuntime
+from .sshconfig import SSHConfig, SSHConfigParser
+from .watcher import create_file_watcher
 
 SSH_COMMAND = "ssh" if platform != "win32" else "ssh.exe"
 
+_WATCH_TIMEOUT = 60
+"""Maximum number of seconds between two checks of the ssh config file"""
 
-class SSHConnector(BaseConnector):
+
+class SSHConnector(AsyncConnector):
     """A connector that subscribes changes to the ssh config file and
     adds/removes profiles based on the changes.
+    It runs as a task of the connector runtime, so waiting for changes doesn't hold a thread.
     """
 
     _logger = logging.getLogger(__name__)
@@ -34,107 +39,189 @@ class SSHConnector(BaseConnector):
     def __init__(
         self,
         event_handler: Callable[[Event], None],
-        ssh_config_file: str = os.path.expanduser(os.path.join("~", ".ssh", "config")),
-        poll_interval: int = 5,
-        ssh_command: str | None = utils.which(SSH_COMMAND, SSH_COMMAND),
+        ssh_config_file: str | None = None,
+        poll_interval: float = 5,
+        min_poll_interval: float = 0.5,
+        ssh_command: str | None = None,
+        runtime: ConnectorRuntime | None = None,
     ):
-        """Initializes the SSHConnector."""
+        """Initializes the SSHConnector.
+        If ssh_config_file is None, the user's ssh config file (~/.ssh/config) is used.
+        If ssh_command is None, the ssh executable is looked up on first use.
+        """
         super().__init__(
             name="SSH",
             event_handler=event_handler,
+            runtime=runtime,
         )
 
         if ssh_config_file is None:
             ssh_config_file = os.path.expanduser(os.path.join("~", ".ssh", "config"))
         self._ssh_config_file = ssh_config_file
         self._poll_interval = poll_interval
+        self._min_poll_interval = min_poll_interval
         self._ssh_command = ssh_command
+        self._config_parser = SSHConfigParser()
+        self._config_hash: str | None = None
+        # a dictionary (key: profile name, value: terminal profile) of the published profiles
+        self._published_profiles: dict[str, configuration.TerminalProfile] = {}
 
-    def _get_ssh_profile_from_config(self) -> list[SSHProfile]:
+    def _get_ssh_profile_from_config(self, ssh_config: SSHConfig) -> list[SSHProfile]:
         profiles = []
-        with open(self._ssh_config_file, "r") as file:
-            lines = file.readlines()
-            current_profile: SSHConnector.SSHProfile | None = None
-            for line in lines:
-                line = line.strip()
-                if line.startswith("Host "):
-                    if current_profile:
-                        profiles.append(current_profile)
-                    parts = line.split()
-                    current_profile = SSHConnector.SSHProfile(name=parts[1])
-                elif current_profile:
-                    if line.startswith("HostName "):
-                        current_profile.hostname = line.split()[1]
-                    elif line.startswith("User "):
-                        current_profile.user = line.split()[1]
-                    elif line.startswith("Port "):
-                        current_profile.port = line.split()[1]
-            if current_profile:
-                profiles.append(current_profile)
+        for host in ssh_config.hosts:
+            profile = SSHConnector.SSHProfile(name=host.name)
+            profile.hostname = host.hostname
+            profile.user = host.user
+            profile.port = host.port
+            profiles.append(profile)
         return profiles
 
-    def _run(self):
-        def trigger_event_handler(
-            ssh_profiles: list[SSHConnector.SSHProfile],
-        ):
-            # create terminal profiles for each ssh profile
-            for profile in ssh_profiles:
-                if profile.hostname:
-                    commandline = f"{self._ssh_command} "
-                    if profile.user:
-                        commandline += f"{profile.user}@"
-                    commandline += profile.hostname
-                    if profile.port:
-                        commandline += f" -p {profile.port}"
-
-                    terminal_profile = configuration.TerminalProfile(
+    def _get_terminal_profiles(
+        self, ssh_profiles: list[SSHProfile]
+    ) -> dict[str, configuration.TerminalProfile]:
+        """Creates a terminal profile for each ssh profile with a hostname.
+        Returns a dictionary (key: profile name, value: terminal profile)
+        """
+        terminal_profiles: dict[str, configuration.TerminalProfile] = {}
+        if self._ssh_command is None:
+            self._ssh_command = utils.which(SSH_COMMAND, SSH_COMMAND)
+        for profile in ssh_profiles:
+            if profile.hostname:
+                commandline = f"{self._ssh_command} "
+                if profile.user:
+                    commandline += f"{profile.user}@"
+                commandline += profile.hostname
+                if profile.port:
+                    commandline += f" -p {profile.port}"
+
+                # like ssh, the first Host block with a given name wins
+                terminal_profiles.setdefault(
+                    profile.name,
+                    configuration.TerminalProfile(
                         name=profile.name,
                         commandline=commandline,
-                    )
-
-                    # call the event handler signaling that a profile has been added
-                    self._event_handler(
-                        Event(
-                            source_name=self.name,
-                            event_type=EventType.ADD_PROFILE,
-                            event_message=str(terminal_profile),
-                            event_data=terminal_profile,
-                        )
-                    )
+                        source_name=self.name,
+                    ),
+                )
+        return terminal_profiles
 
+    async def _publish_changes(
+        self, terminal_profiles: dict[str, configuration.TerminalProfile]
+    ):
+        """Publishes only the hosts added, removed or changed since the last publication"""
+        removed_profiles = []
+        added_profiles = []
+        for name, published_profile in self._published_profiles.items():
+            profile = terminal_profiles.get(name)
+            if profile is None:
+                removed_profiles.append(published_profile)
+            elif profile.guid != published_profile.guid:
+                # a changed host is removed and added again with the new command line
+                removed_profiles.append(published_profile)
+                added_profiles.append(profile)
+        for name, profile in terminal_profiles.items():
+            if name not in self._published_profiles:
+                added_profiles.append(profile)
+
+        self._published_profiles = terminal_profiles
+
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(
+                "SSH config changes: %d profiles to remove, %d profiles to add",
+                len(removed_profiles),
+                len(added_profiles),
+            )
+
+        if removed_profiles:
+            # call the event handler signaling that the profiles have been removed
+            await self._publish(
+                Event(
+                    source_name=self.name,
+                    event_type=EventType.REMOVE_PROFILES,
+                    event_message=f"{len(removed_profiles)} hosts",
+                    event_data=removed_profiles,
+                )
+            )
+        if added_profiles:
+            # call the event handler signaling that the profiles have been added
+            await self._publish(
+                Event(
+                    source_name=self.name,
+                    event_type=EventType.ADD_PROFILES,
+                    event_message=f"{len(added_profiles)} hosts",
+                    event_data=added_profiles,
+                )
+            )
+
+    def _can_resume(self) -> bool:
+        """The published profiles are kept while the config file can't be read,
+        and only the changes are published once it is back."""
+        return self._config_hash is not None
+
+    async def _run(self):
         # start watching the ssh config file
         self._logger.info("Watching ssh config file: %s", self._ssh_config_file)
 
-        modified_on = None
-        while not self.terminated:
-            if (
-                not modified_on
-                or os.path.getmtime(self._ssh_config_file) != modified_on
-            ):
-                if modified_on:
-                    # call the event handler signaling that the connector is starting
-                    # this is actually a restart since the config file has changed
-                    self._event_handler(
-                        Event(
-                            source_name=self.name,
-                            event_type=EventType.STARTING,
-                            event_message=f"{self.name} connector starting",
-                        )
+        # the config files are watched with inotify on Linux. Elsewhere it is polled,
+        # every min_poll_interval seconds after a change, backing off to poll_interval
+        watcher = create_file_watcher(self._min_poll_interval, self._poll_interval)
+        try:
+            watched_files: list[str] = []
+            while not self.terminated:
+                # only the files that changed since the last load are parsed again,
+                # on the blocking threads of the runtime
+                ssh_config = await self.runtime.run_blocking(
+                    self._config_parser.load, self._ssh_config_file
+                )
+                if not ssh_config.files:
+                    raise FileNotFoundError(
+                        f"SSH config file not found: {self._ssh_config_file}"
                     )
 
-                modified_on = os.path.getmtime(self._ssh_config_file)
-                self._logger.debug("SSH config file modified on: %s", modified_on)
-                ssh_profiles = self._get_ssh_profile_from_config()
-                trigger_event_handler(ssh_profiles)
-            else:
-                self._logger.debug("SSH config file not modified")
-
-            time.sleep(self._poll_interval)
-
-    def stop(self, timeout: float = 1):
-        """Stops the connector."""
-        self.terminated = True
-        return super().stop(timeout)
+                # a touch (or a save without changes) doesn't change the fingerprint
+                if ssh_config.fingerprint != self._config_hash:
+                    self._logger.debug(
+                        "SSH config modified, %d files parsed so far",
+                        self._config_parser.parses,
+                    )
+                    ssh_profiles = self._get_ssh_profile_from_config(ssh_config)
+                    await self._publish_changes(
+                        self._get_terminal_profiles(ssh_profiles)
+                    )
+                    if self._config_hash is None:
+                        # the first publication includes all the hosts, so the profiles
+                        # published before (re)starting and not published again can be removed
+                        await self._publish(
+                            Event(
+                                source_name=self.name,
+                                event_type=EventType.SYNCHRONIZED,
+                                event_message=f"{self.name} config loaded",
+                            )
+                        )
+                    self._config_hash = ssh_config.fingerprint
+                else:
+                    self._logger.debug("SSH config not modified")
+
+                # all the included files are watched, as well as the directories
+                # of Include patterns with wildcards
+                if ssh_config.files + ssh_config.directories != watched_files:
+                    watched_files = ssh_config.files + ssh_config.directories
+                    watcher.watch(ssh_config.files, ssh_config.directories)
+
+                # the timeout makes sure the files are checked from time to time,
+                # even if a change notification is lost. Stopping the connector
+                # cancels the wait. Only the path, mtime and size of the files are
+                # checked after the wait; the config is loaded again only if one of
+                # the files (or included directories) changed
+                while not self.terminated:
+                    await watcher.wait_async(_WATCH_TIMEOUT)
+                    if await self.runtime.run_blocking(
+                        self._config_parser.has_changed, self._ssh_config_file
+                    ):
+                        break
+                    self._logger.debug("SSH config files not modified")
+        finally:
+            watcher.close()
 
     def health_check(self) -> bool:
         """Checks if the ssh config file exists."""
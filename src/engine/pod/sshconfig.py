@@ -0,0 +1,403 @@
+import fnmatch
+import glob
+import hashlib
+import heapq
+import logging
+import os
+
+_logger: logging.Logger = logging.getLogger(__name__)
+
+_MAX_INCLUDE_DEPTH = 16
+"""Maximum nesting of Include directives (the same limit as ssh)"""
+
+
+class SSHHost:
+    """A concrete host (a Host pattern without wildcards) and its effective settings."""
+
+    def __init__(
+        self,
+        name: str,
+        hostname: str | None = None,
+        user: str | None = None,
+        port: str | None = None,
+    ):
+        """Creates a new instance of the SSHHost class."""
+        self.name = name
+        self.hostname = hostname
+        self.user = user
+        self.port = port
+
+
+class _Block:
+    """A Host or Match block, or the options at the top of a file."""
+
+    def __init__(
+        self, keyword: str, criteria: list[str], parent: "_Block | None" = None
+    ):
+        self.keyword = keyword
+        self.criteria = criteria
+        # the block containing the Include directive of the file, if any
+        self.parent = parent
+        # a dictionary (key: lower case keyword, value: first value in the block)
+        self.options: dict[str, str] = {}
+
+    def matches(self, host: str) -> bool:
+        if self.parent is not None and not self.parent.matches(host):
+            return False
+        if self.keyword == "host":
+            return _match_host_patterns(host, self.criteria)
+        elif self.keyword == "match":
+            return _match_criteria(host, self.criteria)
+        # options before the first Host or Match line apply to every host
+        return True
+
+
+class _Include:
+    """An Include directive."""
+
+    def __init__(self, patterns: list[str], block: _Block):
+        self.patterns = patterns
+        # the block the directive appears in
+        self.block = block
+
+
+class _ParsedFile:
+    """The result of parsing a single file: its blocks and Include directives, in order."""
+
+    def __init__(self, items: list[_Block | _Include], content_hash: str):
+        self.items = items
+        self.content_hash = content_hash
+
+
+class SSHConfig:
+    """The result of loading an ssh config file and the files it includes."""
+
+    def __init__(
+        self,
+        hosts: list[SSHHost],
+        files: list[str],
+        directories: list[str],
+        fingerprint: str,
+    ):
+        """Creates a new instance of the SSHConfig class."""
+        self.hosts = hosts
+        """The concrete hosts, in order of appearance"""
+        self.files = files
+        """The files that were read"""
+        self.directories = directories
+        """The directories searched by Include patterns with wildcards"""
+        self.fingerprint = fingerprint
+        """A hash of the content of all the files, in include order"""
+
+
+def _split_arguments(text: str) -> list[str]:
+    """Splits the arguments of a line. Arguments may be enclosed in double quotes."""
+    arguments = []
+    current = ""
+    quoted = False
+    in_argument = False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+            in_argument = True
+        elif char.isspace() and not quoted:
+            if in_argument:
+                arguments.append(current)
+                current = ""
+                in_argument = False
+        else:
+            current += char
+            in_argument = True
+    if in_argument:
+        arguments.append(current)
+    return arguments
+
+
+def _split_line(line: str) -> tuple[str, list[str]] | None:
+    """Splits a line into a lower case keyword and its arguments.
+    The keyword is separated from the arguments by whitespace and/or a single '='.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    index = 0
+    while index < len(line) and not line[index].isspace() and line[index] != "=":
+        index += 1
+    keyword = line[:index].lower()
+    rest = line[index:].lstrip()
+    if rest.startswith("="):
+        rest = rest[1:].lstrip()
+    return keyword, _split_arguments(rest)
+
+
+def _match_host_patterns(host: str, patterns: list[str]) -> bool:
+    """Matches a host against a list of patterns. A negated pattern (!pattern) that
+    matches excludes the host, whatever the other patterns."""
+    matched = False
+    for pattern in patterns:
+        for sub_pattern in pattern.split(","):
+            negated = sub_pattern.startswith("!")
+            if negated:
+                sub_pattern = sub_pattern[1:]
+            if fnmatch.fnmatchcase(host.lower(), sub_pattern.lower()):
+                if negated:
+                    return False
+                matched = True
+    return matched
+
+
+def _match_criteria(host: str, criteria: list[str]) -> bool:
+    """Evaluates the criteria of a Match line for a host.
+    Only "all", "host" and "originalhost" can be evaluated without connecting;
+    blocks with other criteria are not applied.
+    """
+    index = 0
+    while index < len(criteria):
+        criterion = criteria[index].lower()
+        negated = criterion.startswith("!")
+        if negated:
+            criterion = criterion[1:]
+        if criterion in ("all", "canonical", "final"):
+            result = criterion == "all"
+            index += 1
+        elif criterion in ("host", "originalhost") and index + 1 < len(criteria):
+            result = _match_host_patterns(host, [criteria[index + 1]])
+            index += 2
+        else:
+            return False
+        if result == negated:
+            return False
+    return True
+
+
+def _bind(block: _Block, parent: _Block | None) -> _Block:
+    """Returns the block, restricted to the hosts of the block of an Include directive.
+    Parsed blocks are cached and shared, so they are copied rather than modified."""
+    if parent is None:
+        return block
+    bound_block = _Block(block.keyword, block.criteria, parent)
+    bound_block.options = block.options
+    return bound_block
+
+
+def _has_wildcards(pattern: str) -> bool:
+    return "*" in pattern or "?" in pattern or "[" in pattern
+
+
+def _get_file_state(path: str) -> tuple[str, int, int]:
+    """Returns the path, mtime and size of a file or directory, or -1 if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return path, -1, -1
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+class SSHConfigParser:
+    """Parser of ssh config files (see man ssh_config).
+    Understands the full keyword grammar (including "keyword=value" and quoted
+    arguments), multiple patterns per Host line, wildcard and negated patterns,
+    Match blocks and Include directives.
+    The parse result of each file is cached, keyed by its mtime and size, and by
+    its content hash; loading again only parses the files that changed. The loaded
+    config is cached too, and returned as is while none of its files (and of the
+    directories of its Include patterns) changed.
+    """
+
+    def __init__(self):
+        """Creates a new instance of the SSHConfigParser class."""
+        # a dictionary (key: file path, value: (mtime, size, parsed file))
+        self._cache: dict[str, tuple[int, int, _ParsedFile]] = {}
+        # a dictionary (key: config file path, value: (states of the files and
+        # directories read, loaded config))
+        self._loaded: dict[str, tuple[list[tuple[str, int, int]], SSHConfig]] = {}
+        self.parses = 0
+        """The number of files parsed"""
+        self.resolves = 0
+        """The number of times the hosts were resolved from the parsed files"""
+
+    def _parse_file(self, file_path: str) -> _ParsedFile | None:
+        """Returns the parse result of a file, parsing it only if it changed"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            # like ssh, files that don't exist are ignored
+            self._cache.pop(file_path, None)
+            return None
+        cached = self._cache.get(file_path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+
+        with open(file_path, "rb") as file:
+            content = file.read()
+        content_hash = hashlib.sha256(content).hexdigest()
+        if cached is not None and cached[2].content_hash == content_hash:
+            parsed_file = cached[2]
+        else:
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug(f"Parsing ssh config file {file_path}")
+            self.parses += 1
+            parsed_file = _ParsedFile(
+                self._parse_content(content.decode("utf-8", errors="replace")),
+                content_hash,
+            )
+        self._cache[file_path] = (stat.st_mtime_ns, stat.st_size, parsed_file)
+        return parsed_file
+
+    @staticmethod
+    def _parse_content(content: str) -> list[_Block | _Include]:
+        block = _Block("", [])
+        items: list[_Block | _Include] = [block]
+        for line in content.splitlines():
+            parts = _split_line(line)
+            if parts is None:
+                continue
+            keyword, arguments = parts
+            if keyword in ("host", "match"):
+                block = _Block(keyword, arguments)
+                items.append(block)
+            elif keyword == "include":
+                items.append(_Include(arguments, block))
+            elif arguments:
+                # for each keyword, the first obtained value is used
+                block.options.setdefault(keyword, " ".join(arguments))
+        return items
+
+    def has_changed(self, file_path: str) -> bool:
+        """Returns true if an ssh config file, or one of the files it includes, changed
+        since it was last loaded. Only the files and directories are checked; nothing is read.
+        """
+        loaded = self._loaded.get(os.path.abspath(file_path))
+        return loaded is None or any(
+            _get_file_state(state[0]) != state for state in loaded[0]
+        )
+
+    def load(self, file_path: str) -> SSHConfig:
+        """Loads an ssh config file and the files it includes"""
+        file_path = os.path.abspath(file_path)
+        if not self.has_changed(file_path):
+            return self._loaded[file_path][1]
+
+        base_directory = os.path.dirname(file_path)
+        blocks: list[_Block] = []
+        files: list[str] = []
+        directories: list[str] = []
+        # the states are taken before reading, so a change made while loading is
+        # detected by the next has_changed
+        states: list[tuple[str, int, int]] = []
+        fingerprint = hashlib.sha256()
+
+        def load_file(path: str, parent: _Block | None, depth: int):
+            states.append(_get_file_state(path))
+            parsed_file = self._parse_file(path)
+            if parsed_file is None:
+                return
+            files.append(path)
+            fingerprint.update(parsed_file.content_hash.encode())
+            for item in parsed_file.items:
+                if isinstance(item, _Include):
+                    if depth >= _MAX_INCLUDE_DEPTH:
+                        _logger.warning(f"Include nested too deeply in {path}")
+                        continue
+                    # an Include in a Host or Match block only applies to the hosts of the block
+                    include_parent = (
+                        _bind(item.block, parent) if item.block.keyword else parent
+                    )
+                    for included_path in self._resolve_include(
+                        item.patterns, base_directory, directories, states
+                    ):
+                        fingerprint.update(included_path.encode())
+                        load_file(included_path, include_parent, depth + 1)
+                elif item.keyword or item.options:
+                    blocks.append(_bind(item, parent))
+
+        load_file(file_path, None, 0)
+
+        loaded = self._loaded.get(file_path)
+        if loaded is not None and loaded[1].fingerprint == fingerprint.hexdigest():
+            # the files were touched or saved without changes
+            config = loaded[1]
+        else:
+            self.resolves += 1
+            config = SSHConfig(
+                self._get_hosts(blocks), files, directories, fingerprint.hexdigest()
+            )
+        self._loaded[file_path] = (states, config)
+        return config
+
+    @staticmethod
+    def _resolve_include(
+        patterns: list[str],
+        base_directory: str,
+        directories: list[str],
+        states: list[tuple[str, int, int]],
+    ) -> list[str]:
+        paths = []
+        for pattern in patterns:
+            pattern = os.path.expanduser(pattern)
+            if not os.path.isabs(pattern):
+                # relative paths are relative to the directory of the user config (~/.ssh)
+                pattern = os.path.join(base_directory, pattern)
+            if _has_wildcards(pattern):
+                # files can be added to the directory later, so it must be watched
+                directories.append(os.path.dirname(pattern))
+                # adding or removing a file changes the mtime of the directory
+                states.append(_get_file_state(os.path.dirname(pattern)))
+                paths.extend(sorted(glob.glob(pattern)))
+            else:
+                paths.append(pattern)
+        return paths
+
+    @staticmethod
+    def _get_hosts(blocks: list[_Block]) -> list[SSHHost]:
+        # the concrete hosts are the patterns without wildcards of the Host lines
+        names: dict[str, None] = {}
+        # Host blocks that only list concrete names match exactly those names, so
+        # they are indexed (key: lower case host name, value: indexes of the blocks).
+        # The other blocks (wildcard or negated patterns, Match blocks, options at the
+        # top of a file, blocks included in a Host or Match block) are evaluated for
+        # each host
+        named_blocks: dict[str, list[int]] = {}
+        other_blocks: list[int] = []
+        named: list[bool] = []
+        for index, block in enumerate(blocks):
+            is_named = block.keyword == "host" and block.parent is None
+            block_names: set[str] = set()
+            if block.keyword == "host":
+                for pattern in block.criteria:
+                    for name in pattern.split(","):
+                        if not name:
+                            continue
+                        if name.startswith("!") or _has_wildcards(name):
+                            is_named = False
+                        else:
+                            names.setdefault(name, None)
+                            block_names.add(name.lower())
+            named.append(is_named)
+            if is_named:
+                for name in block_names:
+                    named_blocks.setdefault(name, []).append(index)
+            else:
+                other_blocks.append(index)
+
+        hosts = []
+        for name in names:
+            options: dict[str, str] = {}
+            # the blocks are applied in order of appearance
+            for index in heapq.merge(named_blocks.get(name.lower(), []), other_blocks):
+                block = blocks[index]
+                if named[index] or block.matches(name):
+                    for keyword, value in block.options.items():
+                        options.setdefault(keyword, value)
+            hostname = options.get("hostname")
+            if hostname is not None:
+                hostname = hostname.replace("%h", name).replace("%%", "%")
+            hosts.append(
+                SSHHost(
+                    name,
+                    hostname=hostname,
+                    user=options.get("user"),
+                    port=options.get("port"),
+                )
+            )
+        return hosts
@@ -0,0 +1,346 @@
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from sys import platform
+
+_logger: logging.Logger = logging.getLogger(__name__)
+
+
+class FileWatcher:
+    """Base class for file watchers.
+    A file watcher waits until one of the watched files may have changed.
+    Files are watched through their directory, so files that are replaced
+    (e.g. editors that save to a temporary file and rename it) or created
+    later are detected too.
+    """
+
+    def watch(
+        self, file_paths: list[str], directories: list[str] | None = None
+    ) -> None:
+        """Sets the files to watch, replacing the previously watched files.
+        A change of any entry of the directories (e.g. a file added) is also reported.
+        """
+        raise NotImplementedError()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Waits until a watched file may have changed, the timeout expires or the
+        watcher is cancelled.
+        Returns:
+            True if a watched file may have changed, False otherwise.
+        """
+        raise NotImplementedError()
+
+    async def wait_async(self, timeout: float | None = None) -> bool:
+        """Waits like wait, on an asyncio event loop. Cancelling the task interrupts
+        the wait."""
+        raise NotImplementedError()
+
+    def cancel(self) -> None:
+        """Unblocks wait. This method can be called from any thread."""
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        """Releases the resources of the watcher."""
+
+
+class PollingWatcher(FileWatcher):
+    """A file watcher that polls the mtime and size of the watched files.
+    The poll interval doubles while the files are idle, up to max_interval,
+    and goes back to min_interval right after a change.
+    """
+
+    def __init__(self, min_interval: float = 0.5, max_interval: float = 5):
+        """Creates a new instance of the PollingWatcher class."""
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._interval = min_interval
+        self._cancelled = threading.Event()
+        # a dictionary (key: file path, value: (mtime, size) or None if the file doesn't exist)
+        self._signatures: dict[str, tuple[int, int] | None] = {}
+
+    @staticmethod
+    def _get_signature(file_path: str) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(file_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def watch(
+        self, file_paths: list[str], directories: list[str] | None = None
+    ) -> None:
+        """Sets the files to watch, replacing the previously watched files."""
+        # the mtime of a directory changes when an entry is added, removed or renamed
+        self._signatures = {
+            path: self._get_signature(path) for path in file_paths + (directories or [])
+        }
+
+    def _changed(self) -> bool:
+        changed = False
+        for file_path, signature in self._signatures.items():
+            current_signature = self._get_signature(file_path)
+            if current_signature != signature:
+                self._signatures[file_path] = current_signature
+                changed = True
+        return changed
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Polls the watched files until one of them changed, the timeout expires
+        or the watcher is cancelled."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._cancelled.is_set():
+            sleep_time = self._interval
+            if deadline is not None:
+                sleep_time = min(sleep_time, deadline - time.monotonic())
+                if sleep_time <= 0:
+                    return False
+            if self._cancelled.wait(sleep_time):
+                return False
+            if self._changed():
+                self._interval = self._min_interval
+                return True
+            self._interval = min(self._interval * 2, self._max_interval)
+        return False
+
+    async def wait_async(self, timeout: float | None = None) -> bool:
+        """Polls the watched files, with timers, until one of them changed or the timeout expires."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._cancelled.is_set():
+            sleep_time = self._interval
+            if deadline is not None:
+                sleep_time = min(sleep_time, deadline - time.monotonic())
+                if sleep_time <= 0:
+                    return False
+            await asyncio.sleep(sleep_time)
+            if self._changed():
+                self._interval = self._min_interval
+                return True
+            self._interval = min(self._interval * 2, self._max_interval)
+        return False
+
+    def cancel(self) -> None:
+        """Unblocks wait. This method can be called from any thread."""
+        self._cancelled.set()
+
+
+class InotifyWatcher(FileWatcher):
+    """A file watcher that uses the Linux inotify API (through ctypes)."""
+
+    _IN_MODIFY = 0x00000002
+    _IN_ATTRIB = 0x00000004
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_FROM = 0x00000040
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_DELETE_SELF = 0x00000400
+    _IN_MOVE_SELF = 0x00000800
+    _IN_Q_OVERFLOW = 0x00004000
+    _IN_IGNORED = 0x00008000
+    _IN_NONBLOCK = 0o4000
+    _IN_CLOEXEC = 0o2000000
+    _WATCH_MASK = (
+        _IN_MODIFY
+        | _IN_ATTRIB
+        | _IN_CLOSE_WRITE
+        | _IN_MOVED_FROM
+        | _IN_MOVED_TO
+        | _IN_CREATE
+        | _IN_DELETE
+        | _IN_DELETE_SELF
+        | _IN_MOVE_SELF
+    )
+    # events that invalidate the watch of a directory
+    _RESET_MASK = _IN_Q_OVERFLOW | _IN_IGNORED | _IN_DELETE_SELF | _IN_MOVE_SELF
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, debounce: float = 0.05):
+        """Creates a new instance of the InotifyWatcher class.
+        Raises OSError if inotify is not available.
+        """
+        self._debounce = debounce
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(self._IN_NONBLOCK | self._IN_CLOEXEC)
+        if self._fd < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number))
+        # a pipe used to unblock wait from another thread
+        self._cancel_read_fd, self._cancel_write_fd = os.pipe()
+        self._cancelled = False
+        # a dictionary (key: watch descriptor, value: names of the watched files in
+        # the directory, or None if all the entries of the directory are watched)
+        self._watched_names: dict[int, set[str] | None] = {}
+        self._file_paths: list[str] = []
+        self._directories: list[str] = []
+
+    def watch(
+        self, file_paths: list[str], directories: list[str] | None = None
+    ) -> None:
+        """Sets the files to watch, replacing the previously watched files."""
+        for watch_descriptor in self._watched_names:
+            self._libc.inotify_rm_watch(self._fd, watch_descriptor)
+        self._watched_names = {}
+        self._file_paths = list(file_paths)
+        self._directories = list(directories or [])
+
+        paths = set()
+        for file_path in file_paths:
+            paths.add(os.path.abspath(file_path))
+            # a link is watched as well as the file it points to
+            paths.add(os.path.realpath(file_path))
+        for path in paths:
+            directory, name = os.path.split(path)
+            watch_descriptor = self._add_watch(directory)
+            if watch_descriptor < 0:
+                continue
+            watched_names = self._watched_names.setdefault(watch_descriptor, set())
+            if watched_names is not None:
+                watched_names.add(name)
+
+        for directory in self._directories:
+            watch_descriptor = self._add_watch(directory)
+            if watch_descriptor >= 0:
+                # any entry of the directory is watched
+                self._watched_names[watch_descriptor] = None
+
+    def _add_watch(self, directory: str) -> int:
+        watch_descriptor = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(directory), self._WATCH_MASK
+        )
+        if watch_descriptor < 0:
+            error_number = ctypes.get_errno()
+            _logger.debug(f"Could not watch {directory}: {os.strerror(error_number)}")
+        return watch_descriptor
+
+    def _read_events(self) -> bool:
+        """Reads the pending events and returns true if a watched file was affected."""
+        changed = False
+        reset = False
+        while True:
+            try:
+                buffer = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            offset = 0
+            while offset < len(buffer):
+                watch_descriptor, mask, _, name_length = self._EVENT_HEADER.unpack_from(
+                    buffer, offset
+                )
+                offset += self._EVENT_HEADER.size
+                name = (
+                    buffer[offset : offset + name_length]
+                    .rstrip(b"\0")
+                    .decode(errors="replace")
+                )
+                offset += name_length
+                if mask & self._IN_Q_OVERFLOW:
+                    reset = True
+                elif watch_descriptor not in self._watched_names:
+                    # e.g. the IN_IGNORED event of a watch removed by watch()
+                    continue
+                elif mask & self._RESET_MASK:
+                    reset = True
+                else:
+                    watched_names = self._watched_names[watch_descriptor]
+                    if watched_names is None or name in watched_names:
+                        changed = True
+
+        if reset:
+            # a watched directory was removed or replaced, or events were lost
+            self.watch(self._file_paths, self._directories)
+            changed = True
+        return changed
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Waits for a change of a watched file, the timeout or the cancellation of the watcher."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._cancelled:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            readable, _, _ = select.select(
+                [self._fd, self._cancel_read_fd], [], [], remaining
+            )
+            if self._cancelled or self._cancel_read_fd in readable:
+                return False
+            if self._fd in readable and self._read_events():
+                # editors may write a file in several steps; let them finish
+                # and merge the events into a single change
+                while select.select([self._fd], [], [], self._debounce)[0]:
+                    self._read_events()
+                return True
+        return False
+
+    async def wait_async(self, timeout: float | None = None) -> bool:
+        """Waits for a change of a watched file or the timeout, reading the inotify
+        instance when the event loop reports it readable."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._cancelled:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            readable = loop.create_future()
+
+            def _wake(readable: asyncio.Future = readable):
+                if not readable.done():
+                    readable.set_result(None)
+
+            loop.add_reader(self._fd, _wake)
+            try:
+                await asyncio.wait_for(readable, remaining)
+            except TimeoutError:
+                return False
+            finally:
+                loop.remove_reader(self._fd)
+            if self._read_events():
+                # editors may write a file in several steps; let them finish
+                # and merge the events into a single change
+                await asyncio.sleep(self._debounce)
+                while select.select([self._fd], [], [], 0)[0]:
+                    self._read_events()
+                    await asyncio.sleep(self._debounce)
+                return True
+        return False
+
+    def cancel(self) -> None:
+        """Unblocks wait. This method can be called from any thread."""
+        self._cancelled = True
+        try:
+            os.write(self._cancel_write_fd, b"\0")
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        """Releases the inotify instance and the cancellation pipe."""
+        for fd in (self._fd, self._cancel_read_fd, self._cancel_write_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def create_file_watcher(
+    min_poll_interval: float = 0.5, max_poll_interval: float = 5
+) -> FileWatcher:
+    """Creates the best file watcher available on this platform.
+    Uses inotify on Linux and falls back to adaptive polling elsewhere.
+    """
+    if platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            _logger.info(f"inotify is not available, polling files instead: {e}")
+    return PollingWatcher(min_poll_interval, max_poll_interval)
@@ -0,0 +1,99 @@
+from engine.terminal.configuration import TerminalProfile
+
+
+class ProfileRegistry:
+    """The profiles published by each source (pod connector), owned by the orchestrator.
+    When a source reconnects, its profiles are marked rather than removed. The source
+    confirms the profiles that still exist by publishing them again, and the sweep
+    then removes only the profiles that were not confirmed.
+    This class is not thread safe; callers should hold their own lock.
+    """
+
+    def __init__(self):
+        """Creates a new instance of the ProfileRegistry class."""
+        # a dictionary (key: source name, value: dictionary (key: profile name, value: profile))
+        self._profiles: dict[str, dict[str, TerminalProfile]] = {}
+        # a dictionary (key: source name, value: names of the profiles not confirmed
+        # since the source was marked)
+        self._marked: dict[str, set[str]] = {}
+
+    def sources(self) -> list[str]:
+        """Returns the names of the sources with published profiles"""
+        return [name for name, profiles in self._profiles.items() if profiles]
+
+    def profiles(self, source_name: str) -> list[TerminalProfile]:
+        """Returns the profiles published by a source"""
+        return list(self._profiles.get(source_name, {}).values())
+
+    def is_marked(self, source_name: str) -> bool:
+        """Returns true if the source is being reconciled (marked and not swept yet)"""
+        return source_name in self._marked
+
+    def add(
+        self, source_name: str, profiles: list[TerminalProfile]
+    ) -> tuple[list[TerminalProfile], list[TerminalProfile]]:
+        """Adds or confirms profiles of a source.
+        Returns:
+            The profiles that are new, and the profiles that changed (a different GUID).
+            Confirmed profiles that didn't change are not returned, since the terminals
+            already have them.
+        """
+        published_profiles = self._profiles.setdefault(source_name, {})
+        marked = self._marked.get(source_name)
+        added_profiles = []
+        changed_profiles = []
+        for profile in profiles:
+            if marked is not None:
+                marked.discard(profile.name)
+            published_profile = published_profiles.get(profile.name)
+            if published_profile is None:
+                added_profiles.append(profile)
+            elif published_profile.guid != profile.guid:
+                changed_profiles.append(profile)
+            else:
+                continue
+            published_profiles[profile.name] = profile
+        return added_profiles, changed_profiles
+
+    def remove(self, source_name: str, profile_names: list[str]) -> list[str]:
+        """Removes profiles of a source.
+        Returns:
+            The names of the profiles that were published.
+        """
+        published_profiles = self._profiles.get(source_name, {})
+        marked = self._marked.get(source_name)
+        removed_names = []
+        for profile_name in profile_names:
+            if marked is not None:
+                marked.discard(profile_name)
+            if published_profiles.pop(profile_name, None) is not None:
+                removed_names.append(profile_name)
+        return removed_names
+
+    def mark(self, source_name: str) -> bool:
+        """Marks the profiles of a source as unconfirmed.
+        Returns:
+            True if the source has just been marked, False if it was already marked.
+        """
+        if source_name in self._marked:
+            return False
+        self._marked[source_name] = set(self._profiles.get(source_name, {}))
+        return True
+
+    def sweep(self, source_name: str) -> list[str]:
+        """Removes the profiles of a source that were not confirmed since it was marked.
+        Returns:
+            The names of the removed profiles.
+        """
+        marked = self._marked.pop(source_name, None)
+        if not marked:
+            return []
+        return self.remove(source_name, list(marked))
+
+    def clear(self, source_name: str) -> list[str]:
+        """Removes all the profiles of a source.
+        Returns:
+            The names of the removed profiles.
+        """
+        self._marked.pop(source_name, None)
+        return list(self._profiles.pop(source_name, {}))
@@ -1,4 +1,10 @@
-from uuid import uuid4
+from enum import StrEnum
+from uuid import NAMESPACE_DNS, uuid5
+
+from utils import APP_NAME
+
+_PROFILE_NAMESPACE = uuid5(NAMESPACE_DNS, APP_NAME)
+"""The namespace of the profile GUIDs"""
 
 
 class TerminalProfile:
@@ -7,17 +13,62 @@ class TerminalProfile:
     holds the information needed to the terminal configuration in the terminal configurator.
     """
 
-    def __init__(self, name: str, commandline: str):
+    def __init__(self, name: str, commandline: str, source_name: str = ""):
+        """Creates a new instance of the TerminalProfile class.
+        The GUID is derived from the source name, the profile name and the command line,
+        so the same profile gets the same GUID across runs and re-publications, and a
+        changed command line gets a new one.
+        """
         self.name = name
         self.commandline = commandline
-        self.guid = f"{{{uuid4()}}}"
+        self.source_name = source_name
+        key = f"{source_name}\0{name}\0{commandline}"
+        self.guid = f"{{{uuid5(_PROFILE_NAMESPACE, key)}}}"
 
     def __str__(self):
         return f"TerminalProfile(name={self.name}, commandline={self.commandline}, guid={self.guid})"
 
 
+class MutationType(StrEnum):
+    """The type of a change to a terminal configuration."""
+
+    ADD_PROFILES = "ADD_PROFILES"
+    REMOVE_PROFILES = "REMOVE_PROFILES"
+    REMOVE_GROUP = "REMOVE_GROUP"
+
+
+class Mutation:
+    """A change to a terminal configuration.
+    Mutations are applied in order by BaseConfigurator.apply_mutations, which allows
+    several changes to be merged into a single write of the configuration.
+    """
+
+    def __init__(
+        self,
+        mutation_type: MutationType,
+        profiles: list[TerminalProfile] | None = None,
+        profile_names: list[str] | None = None,
+        group_name: str | None = None,
+    ):
+        """Creates a new instance of the Mutation class."""
+        self.mutation_type = mutation_type
+        self.profiles = profiles if profiles is not None else []
+        self.profile_names = profile_names if profile_names is not None else []
+        self.group_name = group_name
+
+    def __str__(self):
+        return (
+            f"Mutation(type={self.mutation_type}, group={self.group_name}, "
+            + f"profiles={len(self.profiles)}, profile_names={len(self.profile_names)})"
+        )
+
+
 class BaseConfigurator:
-    """Base class for terminal configurators. This class should not be used directly."""
+    """Base class for terminal configurators. This class should not be used directly.
+    Configurators implement apply_mutations, which reads the configuration once, applies
+    each mutation with the _add_profiles, _remove_profiles and _remove_group methods and
+    writes the configuration once.
+    """
 
     name = "BaseConfigurator"
 
@@ -38,7 +89,13 @@ class BaseConfigurator:
         self, profiles: list[TerminalProfile], group_name: str | None = None
     ) -> None:
         """Adds profiles to the configuration. If group_name is not None, the profiles will be added to the group."""
-        pass
+        self.apply_mutations(
+            [
+                Mutation(
+                    MutationType.ADD_PROFILES, profiles=profiles, group_name=group_name
+                )
+            ]
+        )
 
     def remove_profile(self, profile_name: str) -> None:
         """Remove a profile from the configuration."""
@@ -46,12 +103,48 @@ class BaseConfigurator:
 
     def remove_profiles(self, profile_names: list[str]) -> None:
         """Remove a list of profiles from the configuration."""
-        pass
+        self.apply_mutations(
+            [Mutation(MutationType.REMOVE_PROFILES, profile_names=profile_names)]
+        )
 
     def remove_group(self, group_name: str) -> None:
         """Remove a group from the configuration."""
-        pass
+        self.apply_mutations(
+            [Mutation(MutationType.REMOVE_GROUP, group_name=group_name)]
+        )
+
+    def apply_mutations(self, mutations: list[Mutation]) -> None:
+        """Applies a list of mutations, in order, with a single write of the configuration."""
+
+    def _apply_mutation(self, settings: dict, mutation: Mutation) -> None:
+        """Applies a single mutation to an in-memory settings document."""
+        if mutation.mutation_type == MutationType.ADD_PROFILES:
+            self._add_profiles(settings, mutation.profiles, mutation.group_name)
+        elif mutation.mutation_type == MutationType.REMOVE_PROFILES:
+            self._remove_profiles(settings, mutation.profile_names, mutation.group_name)
+        elif (
+            mutation.mutation_type == MutationType.REMOVE_GROUP
+            and mutation.group_name is not None
+        ):
+            self._remove_group(settings, mutation.group_name)
+
+    def _add_profiles(
+        self,
+        settings: dict,
+        profiles: list[TerminalProfile],
+        group_name: str | None = None,
+    ) -> None:
+        raise NotImplementedError()
+
+    def _remove_profiles(
+        self, settings: dict, profile_names: list[str], group_name: str | None = None
+    ) -> None:
+        """Removes profiles by name. If group_name is set, only the profiles of that group
+        are removed."""
+        raise NotImplementedError()
+
+    def _remove_group(self, settings: dict, group_name: str) -> None:
+        raise NotImplementedError()
 
     def backup(self) -> None:
         """Backup the configuration."""
-        pass
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+_logger: logging.Logger = logging.getLogger(__name__)
+
+
+class DocumentStats:
+    """Statistics about the reads and writes of a settings document."""
+
+    def __init__(self):
+        """Creates a new instance of the DocumentStats class."""
+        self.hits = 0
+        """The number of loads served from memory without reading the file"""
+        self.misses = 0
+        """The number of loads that had to read the file"""
+        self.parses = 0
+        """The number of times the file content was parsed"""
+        self.writes = 0
+        """The number of saves that wrote the file"""
+        self.writes_skipped = 0
+        """The number of saves skipped because the content on disk was identical"""
+
+    def __str__(self):
+        return (
+            f"DocumentStats(hits={self.hits}, misses={self.misses}, parses={self.parses}, "
+            + f"writes={self.writes}, writes_skipped={self.writes_skipped})"
+        )
+
+
+class SettingsDocument:
+    """A parsed, in-memory copy of a JSON settings file.
+    The file is read again only when its mtime or size changed since the last
+    load or save, which happens when the file is edited outside of podshell.
+    If the content hash is unchanged, the parsed copy is kept.
+    This class is not thread safe; callers should hold their own lock.
+    """
+
+    def __init__(self, file_path: str):
+        """Creates a new instance of the SettingsDocument class."""
+        self._file_path = file_path
+        self._settings: dict | None = None
+        self._signature: tuple[int, int] | None = None
+        self._content_hash: str | None = None
+        self.stats = DocumentStats()
+
+    @property
+    def file_path(self) -> str:
+        """The path of the settings file"""
+        return self._file_path
+
+    def _get_signature(self) -> tuple[int, int]:
+        stat = os.stat(self._file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self) -> dict:
+        """Returns the parsed settings, reading the file only if it changed on disk."""
+        signature = self._get_signature()
+        if self._settings is not None and signature == self._signature:
+            self.stats.hits += 1
+            return self._settings
+
+        self.stats.misses += 1
+        with open(self._file_path, "rb") as settings_file:
+            content = settings_file.read()
+        content_hash = hashlib.sha256(content).hexdigest()
+        if self._settings is None or content_hash != self._content_hash:
+            if self._settings is not None and _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug(f"Settings file {self._file_path} changed on disk")
+            self.stats.parses += 1
+            self._settings = json.loads(content)
+            self._content_hash = content_hash
+        self._signature = signature
+        return self._settings
+
+    def save(self, settings: dict) -> None:
+        """Writes the settings to the file and keeps them as the in-memory copy.
+        The write is skipped if the file already holds the same content.
+        """
+        content = json.dumps(settings, indent=4).encode("utf-8")
+        content_hash = hashlib.sha256(content).hexdigest()
+        self._settings = settings
+        if (
+            content_hash == self._content_hash
+            and self._signature is not None
+            and self._get_signature() == self._signature
+        ):
+            self.stats.writes_skipped += 1
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug(f"Settings file {self._file_path} unchanged, not written")
+            return
+
+        self._write(content)
+        self.stats.writes += 1
+        self._content_hash = content_hash
+        self._signature = self._get_signature()
+
+    def _write(self, content: bytes) -> None:
+        """Writes the content to a temporary file and renames it over the settings file,
+        so a crash in the middle of a write never leaves a truncated file.
+        """
+        # resolve links, so the link itself is not replaced by a regular file
+        file_path = os.path.realpath(self._file_path)
+        fd, temp_file_path = tempfile.mkstemp(
+            dir=os.path.dirname(file_path),
+            prefix=os.path.basename(file_path) + ".",
+            suffix=".tmp",
+        )
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(content)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            if os.path.exists(file_path):
+                shutil.copymode(file_path, temp_file_path)
+            os.replace(temp_file_path, file_path)
+        except Exception:
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            raise
+
+    def invalidate(self) -> None:
+        """Drops the in-memory copy, so the next load reads the file."""
+        self._settings = None
+        self._signature = None
+        self._content_hash = None
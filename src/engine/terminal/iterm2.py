@@ -1,4 +1,3 @@
-import json
 import logging
 import os
 import re
@@ -9,7 +8,8 @@ from sys import platform
 
 from utils import APP_NAME
 
-from .configuration import BaseConfigurator, TerminalProfile
+from .configuration import BaseConfigurator, Mutation, TerminalProfile
+from .document import DocumentStats, SettingsDocument
 
 _logger: logging.Logger = logging.getLogger(__name__)
 
@@ -50,24 +50,41 @@ class ITerm2Configurator(BaseConfigurator):
                 ITerm2Configurator.SETTINGS_DIR, APP_NAME + ".json"
             )
         self._settings_file_path = settings_file_path
+        self._document = SettingsDocument(settings_file_path)
         self._lock = threading.Lock()
         self.name = "iTerm2 Terminal"
 
-    def _profile_exists(self, settings: dict, profile_name: str) -> bool:
-        return (
-            next(
-                (p for p in settings["Profiles"] if p.get("Name") == profile_name),
-                None,
-            )
-            is not None
-        )
+    @property
+    def document_stats(self) -> DocumentStats:
+        """Hit/miss counters of the in-memory settings document"""
+        return self._document.stats
+
+    # region apply mutations
+
+    def apply_mutations(self, mutations: list[Mutation]) -> None:
+        """Applies the specified mutations to the settings file with a single write"""
+        with self._lock:
+            settings = self._get_settings()
+            try:
+                for mutation in mutations:
+                    self._apply_mutation(settings, mutation)
+                self._save(settings)
+            except Exception:
+                # the in-memory copy may be partially modified, read the file next time
+                self._document.invalidate()
+                raise
+
+    # endregion
 
     # region add profiles
 
-    def add_profiles(
-        self, profiles: list[TerminalProfile], group_name: str | None = None
+    def _add_profiles(
+        self,
+        settings: dict,
+        profiles: list[TerminalProfile],
+        group_name: str | None = None,
     ) -> None:
-        """Adds the specified profiles to the settings file
+        """Adds the specified profiles to the settings document
         format of the profile:
         {
             "Tags" : [
@@ -79,63 +96,97 @@ class ITerm2Configurator(BaseConfigurator):
             "Command" : "ssh foo.example.com"
         }
 
-
+        A profile is matched by Guid first, then by name (in the same group,
+        preferably with the same command). A matched profile is updated in place,
+        keeping the settings the user may have changed in iTerm2.
         """
-        with self._lock:
-            settings = self._get_settings()
-            for profile in profiles:
-                # check if profile already exists. if not, add it
-                if not self._profile_exists(settings, profile.name):
-                    # Title Components:544 -> Profile name + job with arguments
-                    settings["Profiles"].append(
-                        {
-                            "Name": profile.name,
-                            "Custom Command": "Yes",
-                            "Command": profile.commandline,
-                            "Guid": profile.guid,
-                            "Tags": [APP_NAME, group_name],
-                            "Title Components": 544,
-                        }
-                    )
-                elif _logger.isEnabledFor(logging.DEBUG):
-                    _logger.debug(f"Profile {profile.name} already exists")
-
-            self._save(settings)
+        # a dictionary (key: guid, value: profile)
+        profiles_by_guid: dict[str, dict] = {}
+        # a dictionary (key: name, value: profiles with that name)
+        profiles_by_name: dict[str, list[dict]] = {}
+        for existing_profile in settings["Profiles"]:
+            if existing_profile.get("Guid"):
+                profiles_by_guid[existing_profile["Guid"]] = existing_profile
+            profiles_by_name.setdefault(existing_profile.get("Name"), []).append(
+                existing_profile
+            )
+
+        for profile in profiles:
+            existing_profile = profiles_by_guid.get(profile.guid)
+            if existing_profile is None:
+                named_profiles = [
+                    p
+                    for p in profiles_by_name.get(profile.name, [])
+                    if group_name is None or group_name in p.get("Tags", [])
+                ]
+                existing_profile = next(
+                    (
+                        p
+                        for p in named_profiles
+                        if p.get("Command") == profile.commandline
+                    ),
+                    named_profiles[0] if named_profiles else None,
+                )
+
+            if existing_profile is None:
+                # Title Components:544 -> Profile name + job with arguments
+                new_profile = {
+                    "Name": profile.name,
+                    "Custom Command": "Yes",
+                    "Command": profile.commandline,
+                    "Guid": profile.guid,
+                    "Tags": [APP_NAME, group_name],
+                    "Title Components": 544,
+                }
+                settings["Profiles"].append(new_profile)
+                profiles_by_guid[profile.guid] = new_profile
+                profiles_by_name.setdefault(profile.name, []).append(new_profile)
+            elif (
+                existing_profile.get("Guid") != profile.guid
+                or existing_profile.get("Command") != profile.commandline
+                or existing_profile.get("Name") != profile.name
+            ):
+                # e.g. a changed command line, or a Guid of an older version
+                if _logger.isEnabledFor(logging.DEBUG):
+                    _logger.debug(f"Profile {profile.name} updated")
+                profiles_by_guid.pop(existing_profile.get("Guid"), None)
+                existing_profile["Name"] = profile.name
+                existing_profile["Command"] = profile.commandline
+                existing_profile["Guid"] = profile.guid
+                existing_profile["Tags"] = [APP_NAME, group_name]
+                profiles_by_guid[profile.guid] = existing_profile
+            elif _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug(f"Profile {profile.name} already exists")
 
     # endregion
 
     # region remove profiles
 
-    def remove_profiles(self, profile_names: list[str]) -> None:
-        """Removes the specified profiles from the settings file"""
-        with self._lock:
-            settings = self._get_settings()
-
-            profiles_to_keep = []
-            for profile in settings["Profile"]:
-                if profile["name"] not in profile_names:
-                    profiles_to_keep.append(profile)
+    def _remove_profiles(
+        self, settings: dict, profile_names: list[str], group_name: str | None = None
+    ) -> None:
+        names = set(profile_names)
+        profiles_to_keep = []
+        for profile in settings["Profiles"]:
+            if profile.get("Name") not in names or (
+                group_name is not None and group_name not in profile.get("Tags", [])
+            ):
+                profiles_to_keep.append(profile)
 
-            settings["Profiles"] = profiles_to_keep
-            self._save(settings)
+        settings["Profiles"] = profiles_to_keep
 
     # endregion
 
     # region remove group
-    def remove_group(self, group_name: str) -> None:
-        """Removes the specified group from the settings.json file"""
-        with self._lock:
-            settings = self._get_settings()
-
-            profiles_to_keep = []
-            for profile in settings["Profiles"]:
-                # let's look to tags and if we find the group name,
-                # this profile should be removed
-                if group_name not in profile["Tags"]:
-                    profiles_to_keep.append(profile)
+    def _remove_group(self, settings: dict, group_name: str) -> None:
+        profiles_to_keep = []
+        for profile in settings["Profiles"]:
+            # let's look to tags and if we find the group name,
+            # this profile should be removed
+            if group_name not in profile["Tags"]:
+                profiles_to_keep.append(profile)
 
-            settings["Profiles"] = profiles_to_keep
-            self._save(settings)
+        settings["Profiles"] = profiles_to_keep
 
     # end region
 
@@ -183,8 +234,7 @@ class ITerm2Configurator(BaseConfigurator):
 
     def _save(self, settings) -> None:
         # Convert the settings object to JSON and write it to the file
-        with open(self._settings_file_path, "w") as settings_file:
-            json.dump(settings, settings_file, indent=4)
+        self._document.save(settings)
 
     def _get_settings(self) -> dict:
         # check if the settings file exists. if not, create it
@@ -195,7 +245,5 @@ class ITerm2Configurator(BaseConfigurator):
             with open(self._settings_file_path, "w") as settings_file:
                 settings_file.write('{"Profiles": []}')
 
-        # Read the current JSON content
-        with open(self._settings_file_path, "r") as settings_file:
-            current_settings = json.load(settings_file)
-        return current_settings
+        # Get the in-memory copy, which is read again only if the file changed on disk
+        return self._document.load()
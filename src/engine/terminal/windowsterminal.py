@@ -1,4 +1,3 @@
-import json
 import logging
 import os
 import re
@@ -8,14 +7,29 @@ import threading
 from datetime import datetime, timedelta
 from sys import platform
 
-from .configuration import BaseConfigurator, TerminalProfile
+from utils import read_cache, write_cache
+
+from .configuration import BaseConfigurator, Mutation, TerminalProfile
+from .document import DocumentStats, SettingsDocument
 
 _logger: logging.Logger = logging.getLogger(__name__)
 
 
+class WindowsTerminalError(Exception):
+    """The Windows Terminal settings file can't be found or used."""
+
+
 class WindowsTerminalConfigurator(BaseConfigurator):
     """Configuration class for Windows Terminal"""
 
+    _CACHE_NAME = "windowsterminal"
+    """The name of the cache entry of the discovered settings file path"""
+
+    # the settings file path is discovered once per process
+    _discovery_lock = threading.Lock()
+    _discovered = False
+    _discovered_settings_file_path: str | None = None
+
     @staticmethod
     def is_available() -> bool:
         """Returns true if this terminal is installed/available."""
@@ -26,7 +40,50 @@ class WindowsTerminalConfigurator(BaseConfigurator):
             )
             return False
         else:
-            return WindowsTerminalConfigurator._get_settings_file_path() is not None
+            return WindowsTerminalConfigurator._find_settings_file_path() is not None
+
+    @staticmethod
+    def _find_settings_file_path() -> str | None:
+        """
+        Returns the path to the settings.json file for Windows Terminal, discovering it
+        only once per process. The discovered path is cached on disk and reused while
+        the file exists, so the discovery (which may run PowerShell) is skipped on the
+        next start.
+        """
+        cls = WindowsTerminalConfigurator
+        with cls._discovery_lock:
+            if not cls._discovered:
+                cls._discovered_settings_file_path = cls._load_settings_file_path()
+                cls._discovered = True
+            return cls._discovered_settings_file_path
+
+    @staticmethod
+    def _load_settings_file_path() -> str | None:
+        local_app_data = os.environ.get("LOCALAPPDATA")
+        cache = read_cache(WindowsTerminalConfigurator._CACHE_NAME)
+        if (
+            cache is not None
+            and cache.get("local_app_data") == local_app_data
+            and isinstance(cache.get("settings_file_path"), str)
+            and os.path.isfile(cache["settings_file_path"])
+        ):
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug(
+                    f"Using cached settings file path {cache['settings_file_path']}"
+                )
+            return cache["settings_file_path"]
+
+        settings_file_path = WindowsTerminalConfigurator._get_settings_file_path()
+        # a missing terminal is not cached, so a later installation is detected
+        if settings_file_path is not None:
+            write_cache(
+                WindowsTerminalConfigurator._CACHE_NAME,
+                {
+                    "local_app_data": local_app_data,
+                    "settings_file_path": settings_file_path,
+                },
+            )
+        return settings_file_path
 
     @staticmethod
     def _get_settings_file_path() -> str | None:
@@ -115,7 +172,7 @@ class WindowsTerminalConfigurator(BaseConfigurator):
                 return settings_file_path
 
         except subprocess.CalledProcessError as e:
-            raise Exception(
+            raise WindowsTerminalError(
                 "Windows Terminal settings file not found"
                 "and package family name could not be determined"
             ) from e
@@ -123,151 +180,144 @@ class WindowsTerminalConfigurator(BaseConfigurator):
         # if we get here, the settings.json file was not found
         return None
 
-    def __init__(self, settings_file_path: str | None = _get_settings_file_path()):
-        """Initializes a new instance of the Configuration class"""
-        self._settings_file_path = settings_file_path
+    def __init__(self, settings_file_path: str | None = None):
+        """Initializes a new instance of the Configuration class.
+        If settings_file_path is None, the settings file is discovered on first use.
+        """
+        self._settings_file_path_arg = settings_file_path
+        self._document: SettingsDocument | None = None
+        self._index: _ProfileIndex | None = None
         self._lock = threading.Lock()
         self.name = "Windows Terminal"
 
-    # region group management
+    @property
+    def _settings_file_path(self) -> str | None:
+        if self._settings_file_path_arg is not None:
+            return self._settings_file_path_arg
+        return WindowsTerminalConfigurator._find_settings_file_path()
 
-    def _is_profile_in_group(self, group: dict, profile_name: str) -> bool:
-        if group["entries"] is not None:
-            for entry in group["entries"]:
-                if entry.get("name") == profile_name:
-                    return True
-        return False
+    def _get_document(self) -> SettingsDocument:
+        if self._document is None:
+            self._document = SettingsDocument(self._settings_file_path or "")
+        return self._document
 
-    def _get_group(self, settings: dict, group_name: str) -> dict | None:
-        for group in settings["newTabMenu"]:
-            if group.get("name") == group_name:
-                return group
-        return None
+    @property
+    def document_stats(self) -> DocumentStats:
+        """Hit/miss counters of the in-memory settings document"""
+        return self._get_document().stats
 
-    def _profile_exists(self, settings: dict, profile_name: str) -> bool:
-        for profile in settings["profiles"]["list"]:
-            if profile["name"] == profile_name:
-                return True
-        return False
-
-    def _upsert_group(
-        self, settings: dict, group_name: str, profiles: list[TerminalProfile]
-    ) -> dict:
-        # check if group exists. if not, create it
-        group = self._get_group(settings, group_name)
-        if group is None:
-            group = {
-                "name": group_name,
-                "allowEmpty": False,
-                "type": "folder",
-                "entries": [],
-            }
-            settings["newTabMenu"].append(group)
-
-        # add profiles to group if not already in group
-        for profile in profiles:
-            if not self._is_profile_in_group(group, profile.name):
-                group["entries"].append({"profile": profile.guid, "type": "profile"})
+    # region apply mutations
 
-        return settings
+    def apply_mutations(self, mutations: list[Mutation]) -> None:
+        """Applies the specified mutations to the settings.json file with a single write"""
+        with self._lock:
+            settings = self._get_settings()
+            try:
+                index = self._get_index(settings)
+                for mutation in mutations:
+                    self._apply_mutation(settings, mutation)
+                # removed profiles and entries are dropped from the lists once per write
+                index.compact()
+                self._save(settings)
+            except Exception:
+                # the in-memory copy may be partially modified, read the file next time
+                self._get_document().invalidate()
+                self._index = None
+                raise
+
+    def _get_index(self, settings: dict) -> "_ProfileIndex":
+        # the index is rebuilt only when the settings document was read again
+        if self._index is None or self._index.settings is not settings:
+            self._index = _ProfileIndex(settings)
+        return self._index
 
-    # end region
+    # endregion
 
     # region add profiles
 
-    def add_profiles(
-        self, profiles: list[TerminalProfile], group_name: str | None = None
+    def _add_profiles(
+        self,
+        settings: dict,
+        profiles: list[TerminalProfile],
+        group_name: str | None = None,
     ) -> None:
-        """Adds the specified profiles to the settings.json file"""
-        with self._lock:
-            settings = self._get_settings()
-            for profile in profiles:
-                # check if profile already exists. if not, add it
-                if not self._profile_exists(settings, profile.name):
-                    settings["profiles"]["list"].append(
-                        {
-                            "name": profile.name,
-                            "commandline": profile.commandline,
-                            "guid": profile.guid,
-                            "suppressApplicationTitle": True,
-                        }
-                    )
-                elif _logger.isEnabledFor(logging.DEBUG):
+        index = self._get_index(settings)
+        profile_guids = []
+        for profile in profiles:
+            # check if profile already exists. if not, add it
+            # an identical profile has the same guid, so re-publishing it is a lookup.
+            # guids are derived from the source, so a profile with the same name from
+            # another source is a different profile; a profile written with another guid
+            # (e.g. by an older version) is only reused if it runs the same command
+            existing_profile = index.by_guid.get(profile.guid)
+            if existing_profile is None:
+                existing_profile = next(
+                    (
+                        named_profile
+                        for named_profile in index.by_name.get(profile.name, [])
+                        if named_profile.get("commandline") == profile.commandline
+                        and named_profile.get("guid") is not None
+                    ),
+                    None,
+                )
+            if existing_profile is None:
+                index.add_profile(
+                    {
+                        "name": profile.name,
+                        "commandline": profile.commandline,
+                        "guid": profile.guid,
+                        "suppressApplicationTitle": True,
+                    }
+                )
+                profile_guids.append(profile.guid)
+            else:
+                if _logger.isEnabledFor(logging.DEBUG):
                     _logger.debug(f"Profile {profile.name} already exists")
+                profile_guids.append(existing_profile["guid"])
 
-            if group_name is not None:
-                self._upsert_group(settings, group_name, profiles)
-            self._save(settings)
+        if group_name is not None:
+            # add profiles to group if not already in group
+            for guid in profile_guids:
+                index.add_entry(group_name, guid)
 
     # endregion
 
     # region remove profiles
 
-    def remove_profiles(self, profile_names: list[str]) -> None:
-        """Removes the specified profiles from the settings.json file"""
-        with self._lock:
-            settings = self._get_settings()
-
-            # remove all profiles from the list, but keep the guid of each profile for later
-            profile_guids = []
-            profiles_to_keep = []
-            for profile in settings["profiles"]["list"]:
-                if profile["name"] in profile_names:
-                    profile_guids.append(profile["guid"])
-                else:
-                    profiles_to_keep.append(profile)
-
-            settings["profiles"]["list"] = profiles_to_keep
-            self._remove_entries_from_group(settings, profile_guids)
-            self._save(settings)
+    def _remove_profiles(
+        self, settings: dict, profile_names: list[str], group_name: str | None = None
+    ) -> None:
+        index = self._get_index(settings)
+        # without a group, every profile with the name is removed (including duplicates
+        # left by older versions). With a group, only the profiles of the group are
+        # removed, so a profile with the same name from another source is kept
+        group_entries = (
+            index.group_entries.get(group_name, {}) if group_name is not None else None
+        )
+        for profile_name in profile_names:
+            for profile in list(index.by_name.get(profile_name, [])):
+                if group_entries is None or profile.get("guid") in group_entries:
+                    index.remove_profile(profile)
 
     # endregion
 
-    def _remove_entries_from_group(
-        self, settings: dict, profile_guids: list[str]
-    ) -> None:
-        for group in settings["newTabMenu"]:
-            if group.get("type") == "folder":
-                group["entries"] = [
-                    e
-                    for e in group["entries"]
-                    if e["type"] == "profile" and e["profile"] not in profile_guids
-                ]
-
     # region remove group
-    def remove_group(self, group_name: str) -> None:
-        """Removes the specified group from the settings.json file"""
-        with self._lock:
-            settings = self._get_settings()
-
-            # keep the guid of each profile for later
-            profile_guids = []
-
-            # remove all entries in the group
-            for group in settings["newTabMenu"]:
-                if group.get("type") == "folder" and group["name"] == group_name:
-                    for entry in group["entries"]:
-                        if entry["type"] == "profile":
-                            profile_guids.append(entry["profile"])
-
-                    group["entries"] = []
-
-            # remove all profiles from the list
-            settings["profiles"]["list"] = [
-                p
-                for p in settings["profiles"]["list"]
-                if p["guid"] not in profile_guids
-            ]
-            # remove all profile entries from all groups
-            self._remove_entries_from_group(settings, profile_guids)
-            self._save(settings)
+    def _remove_group(self, settings: dict, group_name: str) -> None:
+        index = self._get_index(settings)
+        # remove all the profiles of the group, and their entries from all groups
+        for guid in list(index.group_entries.get(group_name, {})):
+            profile = index.by_guid.get(guid)
+            if profile is not None:
+                index.remove_profile(profile)
+            else:
+                index.remove_entries(guid)
 
     # end region
 
     def backup(self) -> None:
         """Backup the settings.json file and deletes backups longer than 7 days"""
         if self._settings_file_path is None:
-            raise Exception("Windows Terminal settings file not found")
+            raise WindowsTerminalError("Windows Terminal settings file not found")
 
         # Generate the backup file name
         backup_file_path = re.sub(
@@ -295,15 +345,129 @@ class WindowsTerminalConfigurator(BaseConfigurator):
 
     def _save(self, settings) -> None:
         if self._settings_file_path is None:
-            raise Exception("Windows Terminal settings file not found")
+            raise WindowsTerminalError("Windows Terminal settings file not found")
         # Convert the settings object to JSON and write it to the file
-        with open(self._settings_file_path, "w") as settings_file:
-            json.dump(settings, settings_file, indent=4)
+        self._get_document().save(settings)
 
     def _get_settings(self) -> dict:
         if self._settings_file_path is None:
-            raise Exception("Windows Terminal settings file not found")
-        # Read the current JSON content
-        with open(self._settings_file_path, "r") as settings_file:
-            current_settings = json.load(settings_file)
-        return current_settings
+            raise WindowsTerminalError("Windows Terminal settings file not found")
+        # Get the in-memory copy, which is read again only if the file changed on disk
+        return self._get_document().load()
+
+
+class _ProfileIndex:
+    """Indexes of the profiles and groups (newTabMenu folders) of a Windows Terminal
+    settings document, so membership checks are O(1) and changes cost O(k) for k
+    changed profiles. Removed profiles and entries are only marked; compact drops them
+    from the document lists with a single pass before the document is written.
+    """
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        # key: profile name, value: profiles with the name
+        self.by_name: dict[str, list[dict]] = {}
+        # key: profile guid, value: profile
+        self.by_guid: dict[str, dict] = {}
+        # key: group name, value: group (folder)
+        self.groups: dict[str, dict] = {}
+        # key: group name, value: dict (key: profile guid, value: entry)
+        self.group_entries: dict[str, dict[str, dict]] = {}
+        # key: profile guid, value: names of the groups with an entry for the profile
+        self.entry_groups: dict[str, set[str]] = {}
+        # key: id of the removed profile, value: removed profile
+        self._removed_profiles: dict[int, dict] = {}
+        self._dirty_groups: set[str] = set()
+
+        for profile in settings["profiles"]["list"]:
+            if profile.get("name") is not None:
+                self.by_name.setdefault(profile["name"], []).append(profile)
+            if profile.get("guid") is not None:
+                self.by_guid.setdefault(profile["guid"], profile)
+
+        for group in settings["newTabMenu"]:
+            if group.get("type") == "folder" and group.get("name") is not None:
+                self.groups.setdefault(group["name"], group)
+        for group_name, group in self.groups.items():
+            entries = self.group_entries[group_name] = {}
+            for entry in group.get("entries") or []:
+                if entry.get("type") == "profile" and entry.get("profile"):
+                    if entry["profile"] in entries:
+                        # duplicated entries are dropped on the next write
+                        self._dirty_groups.add(group_name)
+                        continue
+                    entries[entry["profile"]] = entry
+                    self.entry_groups.setdefault(entry["profile"], set()).add(
+                        group_name
+                    )
+
+    def add_profile(self, profile: dict) -> None:
+        self.settings["profiles"]["list"].append(profile)
+        self.by_name.setdefault(profile["name"], []).append(profile)
+        self.by_guid[profile["guid"]] = profile
+
+    def remove_profile(self, profile: dict) -> None:
+        name = profile.get("name")
+        named_profiles = self.by_name.get(name, []) if name is not None else []
+        for i, named_profile in enumerate(named_profiles):
+            if named_profile is profile:
+                del named_profiles[i]
+                break
+        if name is not None and not named_profiles:
+            self.by_name.pop(name, None)
+        guid = profile.get("guid")
+        if guid is not None and self.by_guid.get(guid) is profile:
+            del self.by_guid[guid]
+        self._removed_profiles[id(profile)] = profile
+        if profile.get("guid") is not None:
+            self.remove_entries(profile["guid"])
+
+    def _get_or_create_group(self, group_name: str) -> dict:
+        group = self.groups.get(group_name)
+        if group is None:
+            group = {
+                "name": group_name,
+                "allowEmpty": False,
+                "type": "folder",
+                "entries": [],
+            }
+            self.settings["newTabMenu"].append(group)
+            self.groups[group_name] = group
+            self.group_entries[group_name] = {}
+        elif group.get("entries") is None:
+            group["entries"] = []
+        return group
+
+    def add_entry(self, group_name: str, guid: str) -> None:
+        group = self._get_or_create_group(group_name)
+        entries = self.group_entries[group_name]
+        if guid not in entries:
+            entry = {"profile": guid, "type": "profile"}
+            group["entries"].append(entry)
+            entries[guid] = entry
+            self.entry_groups.setdefault(guid, set()).add(group_name)
+
+    def remove_entries(self, guid: str) -> None:
+        for group_name in self.entry_groups.pop(guid, set()):
+            del self.group_entries[group_name][guid]
+            self._dirty_groups.add(group_name)
+
+    def compact(self) -> None:
+        """Drops the removed profiles and entries from the settings document"""
+        if self._removed_profiles:
+            self.settings["profiles"]["list"] = [
+                p
+                for p in self.settings["profiles"]["list"]
+                if id(p) not in self._removed_profiles
+            ]
+            self._removed_profiles = {}
+
+        for group_name in self._dirty_groups:
+            group = self.groups[group_name]
+            entries = self.group_entries[group_name]
+            group["entries"] = [
+                e
+                for e in group["entries"]
+                if e.get("type") != "profile" or entries.get(e.get("profile")) is e
+            ]
+        self._dirty_groups = set()
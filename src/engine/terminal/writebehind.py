@@ -0,0 +1,185 @@
+import logging
+import threading
+
+from .configuration import BaseConfigurator, Mutation
+
+_logger: logging.Logger = logging.getLogger(__name__)
+
+_MAX_WRITE_ATTEMPTS = 5
+"""Number of writes attempted for a mutation before it is dropped"""
+
+
+class FlushStats:
+    """Statistics about the flushes of a terminal configurator."""
+
+    def __init__(self):
+        """Creates a new instance of the FlushStats class."""
+        self.flushes = 0
+        """The number of writes performed by the scheduler"""
+        self.mutations = 0
+        """The total number of mutations applied by the scheduler"""
+        self.last_merged = 0
+        """The number of mutations merged into the last write"""
+        self.max_merged = 0
+        """The largest number of mutations merged into a single write"""
+        self.failed_writes = 0
+        """The number of writes that failed and were retried (or dropped)"""
+        self.dropped = 0
+        """The number of mutations dropped after _MAX_WRITE_ATTEMPTS failed writes"""
+
+    def __str__(self):
+        return (
+            f"FlushStats(flushes={self.flushes}, mutations={self.mutations}, "
+            + f"last_merged={self.last_merged}, max_merged={self.max_merged}, "
+            + f"failed_writes={self.failed_writes}, dropped={self.dropped})"
+        )
+
+
+class _PendingMutations:
+    """The mutations waiting to be flushed to a terminal configurator."""
+
+    def __init__(self, configurator: BaseConfigurator):
+        self.configurator = configurator
+        self.mutations: list[Mutation] = []
+        self.timer: threading.Timer | None = None
+        # serializes flushes of the same configurator, so mutations are applied in order
+        self.flush_lock = threading.Lock()
+        # the mutations of the last failed write, retried before the newer ones
+        self.failed_mutations: list[Mutation] = []
+        # the number of consecutive failed writes of failed_mutations
+        self.failed_attempts = 0
+        self.stats = FlushStats()
+
+
+class FlushScheduler:
+    """Write-behind layer for terminal configurators.
+    Mutations submitted for a configurator are queued and applied with a single write,
+    at most max_delay seconds after the first mutation was queued, or as soon as
+    max_pending mutations are waiting.
+    """
+
+    def __init__(self, max_delay: float = 0.25, max_pending: int = 1000):
+        """Creates a new instance of the FlushScheduler class."""
+        self._max_delay = max_delay
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        # a dictionary (key: terminal configurator name, value: pending mutations)
+        self._pending: dict[str, _PendingMutations] = {}
+
+    def _get_pending(self, configurator: BaseConfigurator) -> _PendingMutations:
+        pending = self._pending.get(configurator.name)
+        if pending is None:
+            pending = _PendingMutations(configurator)
+            self._pending[configurator.name] = pending
+        return pending
+
+    def submit(self, configurator: BaseConfigurator, mutation: Mutation) -> None:
+        """Queues a mutation for the configurator and schedules a flush."""
+        with self._lock:
+            pending = self._get_pending(configurator)
+            pending.mutations.append(mutation)
+            # while a failed batch waits for its retry, the timer of the retry is kept
+            flush_now = (
+                len(pending.mutations) >= self._max_pending
+                and not pending.failed_mutations
+            )
+            if not flush_now:
+                self._schedule_flush(pending, self._max_delay)
+
+        if flush_now:
+            self._flush_pending(pending)
+
+    def flush(self, configurator: BaseConfigurator) -> None:
+        """Writes the mutations pending for the configurator."""
+        with self._lock:
+            pending = self._pending.get(configurator.name)
+        if pending is not None:
+            self._flush_pending(pending)
+
+    def flush_all(self) -> None:
+        """Writes the mutations pending for all the configurators."""
+        with self._lock:
+            pending_list = list(self._pending.values())
+        for pending in pending_list:
+            self._flush_pending(pending)
+
+    def stats(self, configurator_name: str) -> FlushStats:
+        """Returns the flush statistics of a configurator."""
+        with self._lock:
+            pending = self._pending.get(configurator_name)
+            return pending.stats if pending is not None else FlushStats()
+
+    def _schedule_flush(self, pending: _PendingMutations, delay: float) -> None:
+        """Starts the timer of the next flush, if none is started. Called with the lock held."""
+        if pending.timer is None:
+            pending.timer = threading.Timer(delay, self._flush_pending, args=(pending,))
+            pending.timer.daemon = True
+            pending.timer.start()
+
+    def _flush_pending(self, pending: _PendingMutations) -> None:
+        with pending.flush_lock:
+            with self._lock:
+                if pending.timer is not None:
+                    pending.timer.cancel()
+                    pending.timer = None
+            # a failed batch is written on its own, ahead of the newer mutations, so
+            # the order is kept and the newer ones don't share its attempts. Once it is
+            # written (or dropped), the newer mutations are written by the same flush
+            while self._write_next_batch(pending):
+                pass
+
+    def _write_next_batch(self, pending: _PendingMutations) -> bool:
+        """Writes the failed batch, or else the queued mutations.
+        Returns true if the failed batch was written or dropped, so the queued
+        mutations should be written next."""
+        with self._lock:
+            retrying = bool(pending.failed_mutations)
+            if retrying:
+                mutations = pending.failed_mutations
+            else:
+                mutations = pending.mutations
+                pending.mutations = []
+
+        if not mutations:
+            return False
+
+        stats = pending.stats
+        try:
+            pending.configurator.apply_mutations(mutations)
+        except Exception as e:
+            stats.failed_writes += 1
+            pending.failed_attempts += 1
+            if pending.failed_attempts >= _MAX_WRITE_ATTEMPTS:
+                pending.failed_attempts = 0
+                pending.failed_mutations = []
+                stats.dropped += len(mutations)
+                _logger.error(
+                    f"Dropped {len(mutations)} mutations of {pending.configurator.name} "
+                    + f"after {_MAX_WRITE_ATTEMPTS} failed writes",
+                    exc_info=e,
+                )
+                return retrying
+            _logger.warning(
+                f"Error writing {len(mutations)} mutations to {pending.configurator.name}, "
+                + f"retrying (attempt {pending.failed_attempts} of {_MAX_WRITE_ATTEMPTS})",
+                exc_info=e,
+            )
+            # the failed mutations are retried later each time
+            with self._lock:
+                pending.failed_mutations = mutations
+                self._schedule_flush(
+                    pending, self._max_delay * 2**pending.failed_attempts
+                )
+            return False
+
+        pending.failed_attempts = 0
+        pending.failed_mutations = []
+        stats.flushes += 1
+        stats.mutations += len(mutations)
+        stats.last_merged = len(mutations)
+        stats.max_merged = max(stats.max_merged, len(mutations))
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug(
+                f"Merged {len(mutations)} mutations into one write of {pending.configurator.name}"
+            )
+        return retrying
@@ -0,0 +1,226 @@
+import datetime
+from typing import Any
+
+from PySide6.QtCore import (
+    QAbstractListModel,
+    QModelIndex,
+    QPersistentModelIndex,
+    QSortFilterProxyModel,
+    Qt,
+)
+from PySide6.QtGui import QIcon
+from PySide6.QtWidgets import (
+    QComboBox,
+    QHBoxLayout,
+    QListView,
+    QVBoxLayout,
+    QWidget,
+)
+
+DEFAULT_MAX_LINES = 10000
+"""The default number of lines kept by the log window"""
+
+
+class LogRecord:
+    """A line of the log window."""
+
+    __slots__ = ("event_type", "message", "source_name", "time")
+
+    def __init__(self, source_name: str, event_type: str, message: str):
+        """Creates a new instance of the LogRecord class."""
+        self.time = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        self.source_name = source_name
+        self.event_type = event_type
+        self.message = message
+
+    def __str__(self):
+        if self.source_name:
+            return f"{self.time} [{self.source_name}] {self.event_type}: {self.message}"
+        return f"{self.time} {self.event_type}: {self.message}"
+
+
+class RingBuffer:
+    """A fixed-capacity buffer with O(1) access by index.
+    When the buffer is full, appending an item drops the oldest one.
+    """
+
+    def __init__(self, capacity: int):
+        """Creates a new instance of the RingBuffer class."""
+        self._items: list[Any] = [None] * capacity
+        self._start = 0
+        self._count = 0
+
+    @property
+    def capacity(self) -> int:
+        """The maximum number of items of the buffer"""
+        return len(self._items)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> Any:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._items[(self._start + index) % len(self._items)]
+
+    def drop_oldest(self, count: int) -> None:
+        """Drops the oldest items."""
+        count = min(count, self._count)
+        self._start = (self._start + count) % len(self._items)
+        self._count -= count
+
+    def append(self, item: Any) -> None:
+        """Appends an item, dropping the oldest item if the buffer is full."""
+        capacity = len(self._items)
+        if self._count < capacity:
+            self._items[(self._start + self._count) % capacity] = item
+            self._count += 1
+        else:
+            self._items[self._start] = item
+            self._start = (self._start + 1) % capacity
+
+
+class LogModel(QAbstractListModel):
+    """A list model of the log records, backed by a ring buffer."""
+
+    def __init__(self, max_lines: int = DEFAULT_MAX_LINES):
+        """Creates a new instance of the LogModel class."""
+        super().__init__()
+        self._records = RingBuffer(max_lines)
+
+    def rowCount(self, parent: QModelIndex | QPersistentModelIndex | None = None):
+        if parent is None:
+            parent = QModelIndex()
+        return 0 if parent.isValid() else len(self._records)
+
+    def data(
+        self,
+        index: QModelIndex | QPersistentModelIndex,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ):
+        if role == Qt.ItemDataRole.DisplayRole and index.isValid():
+            return str(self._records[index.row()])
+        return None
+
+    def record(self, row: int) -> LogRecord:
+        """Returns the record of a row"""
+        return self._records[row]
+
+    def append_records(self, records: list[LogRecord]) -> None:
+        """Appends records, dropping the oldest ones when the buffer is full"""
+        capacity = self._records.capacity
+        records = records[-capacity:]
+        dropped = len(self._records) + len(records) - capacity
+        if dropped > 0:
+            self.beginRemoveRows(QModelIndex(), 0, dropped - 1)
+            self._records.drop_oldest(dropped)
+            self.endRemoveRows()
+        first_row = len(self._records)
+        self.beginInsertRows(QModelIndex(), first_row, first_row + len(records) - 1)
+        for record in records:
+            self._records.append(record)
+        self.endInsertRows()
+
+
+class LogFilterModel(QSortFilterProxyModel):
+    """Filters the log records by source name and event type."""
+
+    def __init__(self):
+        """Creates a new instance of the LogFilterModel class."""
+        super().__init__()
+        self._source_name: str | None = None
+        self._event_type: str | None = None
+
+    def set_filter(self, source_name: str | None, event_type: str | None) -> None:
+        """Shows only the records of the source and event type (None shows all)"""
+        self._source_name = source_name
+        self._event_type = event_type
+        self.invalidateFilter()
+
+    def filterAcceptsRow(
+        self, source_row: int, source_parent: QModelIndex | QPersistentModelIndex
+    ) -> bool:
+        if self._source_name is None and self._event_type is None:
+            return True
+        model = self.sourceModel()
+        if not isinstance(model, LogModel):
+            return True
+        record = model.record(source_row)
+        return (
+            self._source_name is None or record.source_name == self._source_name
+        ) and (self._event_type is None or record.event_type == self._event_type)
+
+
+class LogWindow(QWidget):
+    """A window with the last log records, filtered by source name and event type.
+    Only the visible rows are rendered, whatever the number of records.
+    """
+
+    _ALL_SOURCES = "All sources"
+    _ALL_EVENTS = "All events"
+
+    def __init__(self, max_lines: int = DEFAULT_MAX_LINES):
+        super().__init__()
+        self.setWindowTitle("Log Window")
+        icon = QIcon(":/resources/icon_on.png")
+        self.setWindowIcon(icon)
+        self.setGeometry(100, 100, 400, 300)
+
+        self._model = LogModel(max_lines)
+        self._filter_model = LogFilterModel()
+        self._filter_model.setSourceModel(self._model)
+
+        self._source_filter = QComboBox(self)
+        self._source_filter.addItem(self._ALL_SOURCES)
+        self._event_type_filter = QComboBox(self)
+        self._event_type_filter.addItem(self._ALL_EVENTS)
+        # the values already in the filters (empty values are not filterable)
+        self._source_names = {""}
+        self._event_types = {""}
+        self._source_filter.currentIndexChanged.connect(self._update_filter)
+        self._event_type_filter.currentIndexChanged.connect(self._update_filter)
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self._source_filter)
+        filter_layout.addWidget(self._event_type_filter)
+
+        self.log_view = QListView(self)
+        self.log_view.setModel(self._filter_model)
+        # all the rows have the same height, so the view doesn't measure each of them
+        self.log_view.setUniformItemSizes(True)
+        self.log_view.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+
+        layout = QVBoxLayout()
+        layout.addLayout(filter_layout)
+        layout.addWidget(self.log_view)
+        self.setLayout(layout)
+
+    def append_log(self, message: str, source_name: str = "", event_type: str = ""):
+        self.append_records([LogRecord(source_name, event_type, message)])
+
+    def append_records(self, records: list[LogRecord]):
+        """Appends several records with a single update of the view"""
+        if not records:
+            return
+        scroll_bar = self.log_view.verticalScrollBar()
+        at_bottom = scroll_bar.value() == scroll_bar.maximum()
+
+        for record in records:
+            if record.source_name not in self._source_names:
+                self._source_names.add(record.source_name)
+                self._source_filter.addItem(record.source_name)
+            if record.event_type not in self._event_types:
+                self._event_types.add(record.event_type)
+                self._event_type_filter.addItem(record.event_type)
+        self._model.append_records(records)
+
+        # follow the new records, unless the user scrolled up
+        if at_bottom:
+            self.log_view.scrollToBottom()
+
+    def _update_filter(self):
+        source_name = self._source_filter.currentText()
+        event_type = self._event_type_filter.currentText()
+        self._filter_model.set_filter(
+            None if source_name == self._ALL_SOURCES else source_name,
+            None if event_type == self._ALL_EVENTS else event_type,
+        )
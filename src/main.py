@@ -1,69 +1,120 @@
-import datetime
+import time
+
+# taken before the other imports, so the startup profile includes them
+_STARTED = time.perf_counter()
+
+import argparse
 import logging
+import sys
+import threading
 
+from PySide6.QtCore import QObject, Qt, QTimer, Signal
 from PySide6.QtGui import QAction, QIcon
 from PySide6.QtWidgets import (
     QApplication,
     QMenu,
     QSystemTrayIcon,
-    QTextEdit,
-    QVBoxLayout,
-    QWidget,
 )
 
 import icon_rc  # noqa: F401
 from engine.orchestration import Event, EventType, Orchestrator
+from logwindow import DEFAULT_MAX_LINES, LogRecord, LogWindow
+from utils import StartupProfile
+
+
+class _EventBridge(QObject):
+    """Signals the GUI thread that orchestrator events are waiting to be handled"""
+
+    events_available = Signal()
+    terminals_discovered = Signal(list)
+    orchestrator_started = Signal()
 
 
-class LogWindow(QWidget):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("Log Window")
-        icon = QIcon(":/resources/icon_on.png")
-        self.setWindowIcon(icon)
-        self.setGeometry(100, 100, 400, 300)
-        layout = QVBoxLayout()
-        self.log_text = QTextEdit(self)
-        layout.addWidget(self.log_text)
-        self.setLayout(layout)
+_ICON_WORKING = ":/resources/icon_working.png"
+_ICON_OFF = ":/resources/icon_off.png"
+_ICON_ON = ":/resources/icon_on.png"
 
-    def append_log(self, message):
-        event_date = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        self.log_text.append(f"{event_date} {message}")
+_START_JOIN_TIMEOUT = 10
+"""Seconds to wait for the orchestrator to finish starting when the app quits"""
 
 
 class App:
     """Represents the UI App"""
 
-    _terminal_actions: list[QAction] = []
-    _pod_actions: list[QAction] = []
     _logger = logging.getLogger(__name__)
 
-    def __init__(self):
-        self._qapp = QApplication([])
-        self._qapp.setQuitOnLastWindowClosed(False)
+    _DRAIN_INTERVAL_MS = 100
+    """Milliseconds during which orchestrator events are batched before being handled"""
+
+    def __init__(
+        self,
+        max_log_lines: int = DEFAULT_MAX_LINES,
+        startup_profile: StartupProfile | None = None,
+    ):
+        """Creates a new instance of the App class.
+        Args:
+            max_log_lines: The number of lines kept by the log window.
+            startup_profile: If set, the duration of the startup phases is recorded
+                and printed once the orchestrator is started.
+        """
+        self._startup_profile = startup_profile or StartupProfile()
+        self._print_startup_profile = startup_profile is not None
+        self._orchestrator: Orchestrator | None = None
+        self._orchestrator_start_thread: threading.Thread | None = None
+        self._terminal_actions: list[QAction] = []
+        self._pod_actions: list[QAction] = []
+
+        with self._startup_profile.phase("qt application"):
+            self._qapp = QApplication([])
+            self._qapp.setQuitOnLastWindowClosed(False)
+
+        with self._startup_profile.phase("tray icon"):
+            self._init_tray(max_log_lines)
+
+        # the orchestrator is created and started once the event loop runs,
+        # so the tray icon is shown before terminals and connectors are discovered
+        QTimer.singleShot(0, self._start_orchestrator)
 
-        # Adding an icon
-        icon = QIcon(":/resources/icon_on.png")
+    def _init_tray(self, max_log_lines: int):
+        """Shows the tray icon with a menu of the actions that don't need the orchestrator"""
+        # the icons are created once and reused
+        self._icons = {
+            icon_name: QIcon(icon_name)
+            for icon_name in (_ICON_ON, _ICON_OFF, _ICON_WORKING)
+        }
+        self._tray_icon_name = _ICON_WORKING
+        # a dictionary (key: source name, value: icon name of the last event of the source)
+        self._source_icon_names: dict[str, str] = {}
+
+        # orchestrator events arrive on connector threads. They are queued and the GUI
+        # thread is signaled (queued connection) to handle them in batches on a timer
+        self._pending_events: list[Event] = []
+        self._pending_events_lock = threading.Lock()
+        self._event_bridge = _EventBridge()
+        self._drain_timer = QTimer()
+        self._drain_timer.setSingleShot(True)
+        self._drain_timer.setInterval(self._DRAIN_INTERVAL_MS)
+        self._drain_timer.timeout.connect(self._drain_orchestrator_events)
+        self._event_bridge.events_available.connect(
+            self._drain_timer.start, type=Qt.ConnectionType.QueuedConnection  # type: ignore[arg-type]
+        )
+        self._event_bridge.terminals_discovered.connect(
+            self._add_terminal_configurator_actions, type=Qt.ConnectionType.QueuedConnection  # type: ignore[arg-type]
+        )
+        self._event_bridge.orchestrator_started.connect(
+            self._on_orchestrator_started, type=Qt.ConnectionType.QueuedConnection  # type: ignore[arg-type]
+        )
 
         # Adding item on the menu bar
         self._tray = QSystemTrayIcon()
-        self._tray.setIcon(icon)
+        self._tray.setIcon(self._icons[self._tray_icon_name])
         self._tray.setVisible(True)
         self._menu = QMenu()
-        self._log_window = LogWindow()
-
-        # create the  orchestrator and start it
-        self._orchestrator = Orchestrator(self._handle_orchestrator_event)
-        self._orchestrator.start()
+        self._log_window = LogWindow(max_log_lines)
 
-        # adding terminal configurators and pod connectors to the menu
-        self._add_terminal_configurator_actions()
-        self._menu.addSeparator()
-        self._add_pod_connector_actions()
-        self._menu.addSeparator()
         # Adding a show log action
-        self._show_log_action = QAction("Show Log", triggered=self.show_log)
+        self._show_log_action = QAction("Show Log", self._menu)
+        self._show_log_action.triggered.connect(self.show_log)
         self._menu.addAction(self._show_log_action)
         self._menu.addSeparator()
         # //TODO: add a enable/disable all action
@@ -75,6 +126,72 @@ class App:
         # Adding options to the System Tray
         self._tray.setContextMenu(self._menu)
 
+    def _start_orchestrator(self):
+        """Creates the orchestrator, adds its pod connectors to the menu and starts it
+        on a background thread. The terminal configurators are added to the menu once
+        they are discovered on that thread."""
+        with self._startup_profile.phase("orchestrator"):
+            self._orchestrator = Orchestrator(self._handle_orchestrator_event)
+
+        # adding a placeholder for the terminal configurators and the pod connectors
+        # to the menu, above the show log action
+        self._discovering_terminals_action = QAction(
+            "Discovering terminals...", self._menu
+        )
+        self._discovering_terminals_action.setEnabled(False)
+        self._menu.insertAction(
+            self._show_log_action, self._discovering_terminals_action
+        )
+        self._terminals_separator = self._menu.insertSeparator(self._show_log_action)
+        self._add_pod_connector_actions()
+        self._menu.insertSeparator(self._show_log_action)
+
+        # discovering terminals (e.g. Windows Terminal's settings file), backups and
+        # health checks may be slow, so they don't block the GUI thread.
+        # The menu is updated as the connectors report their state
+        self._orchestrator_start_thread = threading.Thread(
+            target=self._run_orchestrator_start,
+            name="OrchestratorStart",
+            daemon=True,
+        )
+        self._orchestrator_start_thread.start()
+
+    def _run_orchestrator_start(self):
+        orchestrator = self._orchestrator
+        if orchestrator is None:
+            return
+        with self._startup_profile.phase("terminal discovery"):
+            available_terminal_names = [
+                terminal_configurator.name
+                for terminal_configurator in orchestrator.terminal_configurators.values()
+                if terminal_configurator.is_available()
+            ]
+        self._event_bridge.terminals_discovered.emit(available_terminal_names)
+        with self._startup_profile.phase("orchestrator start"):
+            orchestrator.start()
+        for name, seconds in orchestrator.startup_times.items():
+            self._startup_profile.add(f"  {name} ready after", seconds)
+        self._event_bridge.orchestrator_started.emit()
+        if self._print_startup_profile:
+            print(self._startup_profile.report(), file=sys.stderr)
+
+    def _on_orchestrator_started(self):
+        """Checks the actions of the started terminal configurators and pod connectors"""
+        if self._orchestrator is None:
+            return
+        for action in self._terminal_actions:
+            terminal_configurator = self._orchestrator.terminal_configurators.get(
+                action.text()
+            )
+            if terminal_configurator is not None:
+                # setChecked doesn't emit triggered, so the orchestrator isn't called
+                action.setChecked(terminal_configurator.enabled)
+        for action in self._pod_actions:
+            pod_connector = self._orchestrator.pod_connectors.get(action.text())
+            if pod_connector is not None:
+                action.setChecked(pod_connector.is_alive())
+        self._update_tray_icon()
+
     def _add_pod_connector_actions(self):
         """Adds the pod connectors to the menu as checkable actions.
         Checked actions are enabled if the pod connector is alive.
@@ -86,7 +203,11 @@ class App:
 
             def on_trigger(checked, pod_connector_name=pod_connector.name):
                 status = "ENABLED" if checked else "DISABLED"
-                self._log_window.append_log(f"{status}: {pod_connector_name}")
+                self._log_window.append_log(
+                    f"{pod_connector_name} {status.lower()}",
+                    source_name=pod_connector_name,
+                    event_type=status,
+                )
                 self._orchestrator.trigger_pod_connector(pod_connector_name, checked)
 
             # adds the pod connector to the menu (as a checkable action)
@@ -99,13 +220,18 @@ class App:
                 )
             )
 
-        self._menu.addActions(self._pod_actions)
+        self._menu.insertActions(self._show_log_action, self._pod_actions)
 
-    def _add_terminal_configurator_actions(self):
-        """Adds the terminal configurators to the menu as checkable actions.
+    def _add_terminal_configurator_actions(self, available_terminal_names: list[str]):
+        """Adds the available terminal configurators to the menu as checkable actions,
+        in place of the discovering placeholder.
         Checked actions are enabled if the terminal connector is available.
         """
+        if self._orchestrator is None:
+            return
         for terminal_configurator in self._orchestrator.terminal_configurators.values():
+            if terminal_configurator.name not in available_terminal_names:
+                continue
             if self._logger.isEnabledFor(logging.DEBUG):
                 self._logger.debug(f"Adding {terminal_configurator.name} to the menu")
 
@@ -113,26 +239,31 @@ class App:
                 checked, terminal_configurator_name=terminal_configurator.name
             ):
                 status = "ENABLED" if checked else "DISABLED"
-                self._log_window.append_log(f"{status}: {terminal_configurator_name}")
+                self._log_window.append_log(
+                    f"{terminal_configurator_name} {status.lower()}",
+                    source_name=terminal_configurator_name,
+                    event_type=status,
+                )
                 self._orchestrator.trigger_terminal_configurator(
                     terminal_configurator_name, checked
                 )
 
-            if terminal_configurator.is_available():
-                # if the terminal configurator is available, we add it to the menu
-                # as a checkable action
-                self._terminal_actions.append(
-                    QAction(
-                        terminal_configurator.name,
-                        triggered=on_trigger,
-                        checkable=True,
-                        checked=terminal_configurator.enabled,
-                    )
-                )
+            # the available terminal configurators are added to the menu
+            # as checkable actions
+            action = QAction(terminal_configurator.name, self._menu)
+            action.setCheckable(True)
+            action.setChecked(terminal_configurator.enabled)
+            action.triggered.connect(on_trigger)
+            self._terminal_actions.append(action)
+
+        self._menu.removeAction(self._discovering_terminals_action)
         if len(self._terminal_actions) > 0:
-            self._menu.addActions(self._terminal_actions)
+            self._menu.insertActions(self._terminals_separator, self._terminal_actions)
         else:
-            self._menu.addAction("No terminal configurators available")
+            self._menu.insertAction(
+                self._terminals_separator,
+                QAction("No terminal configurators available", self._menu),
+            )
             self._log_window.append_log("No terminal configurators available")
 
     def show_log(self):
@@ -142,31 +273,96 @@ class App:
         self._log_window.showNormal()
 
         self._log_window.activateWindow()
-        self._log_window.log_text.setFocus()
+        self._log_window.log_view.setFocus()
 
     def _handle_orchestrator_event(self, event: Event):
-        self._logger.info(f"Event: {event.event_type}, {event.message}, {event.data}")
-        self._log_window.append_log(f"{event.event_type}: {event.message}")
-
-        # update the icon
-        if (
-            event.event_type == EventType.STARTING
-            or event.event_type == EventType.WARNING
-            or event.event_type == EventType.ADD_PROFILE
-            or event.event_type == EventType.REMOVE_PROFILE
-        ):
-            self._tray.setIcon(QIcon(":/resources/icon_working.png"))
-        elif event.event_type == EventType.STOPPING:
-            self._tray.setIcon(QIcon(":/resources/icon_off.png"))
-        elif event.event_type == EventType.HEALTHY:
-            self._tray.setIcon(QIcon(":/resources/icon_on.png"))
+        """Queues an orchestrator event. Called from any thread."""
+        with self._pending_events_lock:
+            signal_gui = not self._pending_events
+            self._pending_events.append(event)
+        if signal_gui:
+            # only the first event of a batch signals the GUI thread
+            self._event_bridge.events_available.emit()
+
+    def _drain_orchestrator_events(self):
+        """Handles the queued orchestrator events on the GUI thread"""
+        with self._pending_events_lock:
+            events = self._pending_events
+            self._pending_events = []
+        if not events:
+            return
+
+        log_records = []
+        for event in events:
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug(
+                    f"Event: {event.event_type}, {event.message}, {event.data}"
+                )
+            log_records.append(
+                LogRecord(event.source_name, event.event_type, event.message)
+            )
+
+            # keep the state of each source
+            if (
+                event.event_type == EventType.STARTING
+                or event.event_type == EventType.WARNING
+                or event.event_type == EventType.RECONNECTING
+                or event.event_type == EventType.ADD_PROFILE
+                or event.event_type == EventType.REMOVE_PROFILE
+                or event.event_type == EventType.ADD_PROFILES
+                or event.event_type == EventType.REMOVE_PROFILES
+            ):
+                self._source_icon_names[event.source_name] = _ICON_WORKING
+            elif event.event_type == EventType.STOPPING:
+                self._source_icon_names[event.source_name] = _ICON_OFF
+            elif event.event_type == EventType.HEALTHY:
+                self._source_icon_names[event.source_name] = _ICON_ON
+
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(f"Handled {len(events)} orchestrator events")
+        self._log_window.append_records(log_records)
+        self._update_tray_icon()
+
+    def _update_tray_icon(self):
+        # update the icon: working if any source is working,
+        # on if any source is healthy, off otherwise
+        source_icon_names = set(self._source_icon_names.values())
+        if _ICON_WORKING in source_icon_names:
+            tray_icon_name = _ICON_WORKING
+        elif _ICON_ON in source_icon_names:
+            tray_icon_name = _ICON_ON
+        else:
+            tray_icon_name = _ICON_OFF
+        if tray_icon_name != self._tray_icon_name:
+            self._tray_icon_name = tray_icon_name
+            self._tray.setIcon(self._icons[tray_icon_name])
 
     def run(self):
         self._qapp.exec()
-        self._orchestrator.stop()
+        if self._orchestrator_start_thread is not None:
+            self._orchestrator_start_thread.join(_START_JOIN_TIMEOUT)
+        if self._orchestrator is not None:
+            self._orchestrator.stop()
 
 
 if __name__ == "__main__":
     # we'll only log INFO messages when running in windowed mode
     logging.basicConfig(level=logging.INFO)
-    App().run()
+    parser = argparse.ArgumentParser(description="PodShell tray application")
+    parser.add_argument(
+        "--log-lines",
+        type=int,
+        default=DEFAULT_MAX_LINES,
+        help=f"number of lines kept by the log window (default: {DEFAULT_MAX_LINES})",
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="print the duration of each startup phase",
+    )
+    args = parser.parse_args()
+    startup_profile = None
+    if args.startup_profile:
+        startup_profile = StartupProfile(_STARTED)
+        startup_profile.add("imports", time.perf_counter() - _STARTED)
+    App(max_log_lines=args.log_lines, startup_profile=startup_profile).run()
@@ -1,5 +1,12 @@
 # Description: Utility functions for the project.
 
+import contextlib
+import json
+import os
+import threading
+import time
+from sys import platform
+from typing import Iterator
 
 APP_NAME = "podshell"
 """The name of the application."""
@@ -12,7 +19,6 @@ def which(program: str, default: str | None = None) -> str | None:
     Returns:
         The path to the program if it exists, default otherwise.
     """
-    import os
 
     def is_exe(fpath: str) -> bool:
         return os.path.isfile(fpath) and os.access(fpath, os.X_OK)
@@ -28,3 +34,80 @@ def which(program: str, default: str | None = None) -> str | None:
                 return exe_file
 
     return default
+
+
+def get_cache_dir() -> str:
+    """Returns the directory where the application caches data between runs.
+    The directory may not exist yet.
+    """
+    if platform == "win32" and "LOCALAPPDATA" in os.environ:
+        return os.path.join(os.environ["LOCALAPPDATA"], APP_NAME, "cache")
+    elif platform == "darwin":
+        return os.path.join(os.path.expanduser("~"), "Library", "Caches", APP_NAME)
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, APP_NAME)
+
+
+def read_cache(name: str) -> dict | None:
+    """Returns the data of a cache entry, or None if it doesn't exist or can't be read."""
+    try:
+        with open(os.path.join(get_cache_dir(), name + ".json"), "r") as cache_file:
+            data = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def write_cache(name: str, data: dict) -> None:
+    """Writes a cache entry. Errors are ignored, since the cache is only an optimization."""
+    cache_dir = get_cache_dir()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_file_path = os.path.join(cache_dir, name + ".json")
+        temp_file_path = f"{cache_file_path}.{os.getpid()}.tmp"
+        with open(temp_file_path, "w") as cache_file:
+            json.dump(data, cache_file)
+        os.replace(temp_file_path, cache_file_path)
+    except OSError:
+        pass
+
+
+class StartupProfile:
+    """Records the duration of the startup phases of the application."""
+
+    def __init__(self, started: float | None = None):
+        """Creates a new instance of the StartupProfile class.
+        Args:
+            started: The perf_counter value at which the startup began.
+        """
+        self._started = time.perf_counter() if started is None else started
+        self._phases: list[tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, duration: float) -> None:
+        """Records the duration of a phase, in seconds. This method can be called from any thread."""
+        with self._lock:
+            self._phases.append((name, duration))
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Records the duration of the code run in the with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def report(self) -> str:
+        """Returns the duration of each phase and the time elapsed since the startup began"""
+        elapsed = time.perf_counter() - self._started
+        with self._lock:
+            phases = list(self._phases)
+        width = max([len(name) for name, _ in phases] + [len("total")])
+        lines = ["Startup profile:"]
+        for name, duration in phases:
+            lines.append(f"  {name:<{width}} {duration * 1000:9.1f} ms")
+        lines.append(f"  {'total':<{width}} {elapsed * 1000:9.1f} ms")
+        return "\n".join(lines)
@@ -0,0 +1,104 @@
+import json
+import os
+import re
+import socketserver
+import sys
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+# the application modules are imported from src, as when running src/main.py
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+_CONTAINERS = [{"Names": ["/web"], "Image": "nginx", "Labels": {}}]
+
+
+class _FakeDockerDaemon(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """A Docker API server answering pings and container lists, with an event stream
+    that never sends an event, as on a quiet host.
+    The containers are listed as they are, whatever the filters of the request."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _FakeDockerHandler)
+        self.containers: list[dict] = list(_CONTAINERS)
+        # a dictionary (key: path of the request without the API version,
+        # value: filters of the last request)
+        self.filters: dict[str, dict] = {}
+        self.event_streams = 0
+        self.event_streams_changed = threading.Condition()
+
+    def wait_for_event_streams(self, count: int, timeout: float) -> bool:
+        with self.event_streams_changed:
+            return self.event_streams_changed.wait_for(
+                lambda: self.event_streams >= count, timeout
+            )
+
+
+class _FakeDockerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # the headers and body are written separately, which Nagle's algorithm would delay
+    disable_nagle_algorithm = True
+    server: _FakeDockerDaemon
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_body(self, body: bytes):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        filters = urllib.parse.parse_qs(query).get("filters")
+        if filters:
+            self.server.filters[re.sub(r"^/v[0-9.]+", "", path)] = json.loads(
+                filters[0]
+            )
+        if path.endswith("/_ping"):
+            self._send_body(b"OK")
+        elif path.endswith("/version"):
+            self._send_body(b'{"ApiVersion": "1.43"}')
+        elif path.endswith("/containers/json"):
+            self._send_body(json.dumps(self.server.containers).encode())
+        elif path.endswith("/events"):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.flush()
+            with self.server.event_streams_changed:
+                self.server.event_streams += 1
+                self.server.event_streams_changed.notify_all()
+            # the stream stays open until the client closes it
+            try:
+                while self.rfile.read(1):
+                    pass
+            except OSError:
+                pass
+        else:
+            self.send_error(404)
+
+
+@pytest.fixture
+def docker_daemon(monkeypatch):
+    daemon = _FakeDockerDaemon()
+    serve_thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    serve_thread.start()
+    monkeypatch.setenv("DOCKER_HOST", f"tcp://127.0.0.1:{daemon.server_address[1]}")
+    monkeypatch.delenv("DOCKER_TLS_VERIFY", raising=False)
+    monkeypatch.delenv("DOCKER_CERT_PATH", raising=False)
+    try:
+        yield daemon
+    finally:
+        daemon.shutdown()
+        daemon.server_close()
@@ -0,0 +1,96 @@
+import re
+import threading
+import time
+
+from engine.events import Event, EventType
+from engine.pod.connection import BaseConnector, RetryPolicy
+from engine.pod.runtime import AsyncConnector, ConnectorRuntime
+
+_RETRIES = 5
+
+
+def _retry_policy() -> RetryPolicy:
+    return RetryPolicy(initial_delay=0.01, max_delay=1, multiplier=2, jitter=0)
+
+
+class _EventRecorder:
+    """Records the delays announced by the WARNING events of a connector"""
+
+    def __init__(self):
+        self.delays: list[float] = []
+        self.retried = threading.Event()
+
+    def __call__(self, event: Event):
+        if event.event_type == EventType.WARNING:
+            match = re.search(r"waiting ([0-9.]+) seconds", event.message)
+            assert match is not None
+            self.delays.append(float(match.group(1)))
+            if len(self.delays) >= _RETRIES:
+                self.retried.set()
+
+
+class _FailingConnector(BaseConnector):
+    """Healthy, but fails as soon as it runs"""
+
+    def health_check(self) -> bool:
+        return True
+
+    def _run(self):
+        raise ConnectionError("connection reset")
+
+
+class _FailingAsyncConnector(AsyncConnector):
+    """Healthy, but fails as soon as it runs"""
+
+    def health_check(self) -> bool:
+        return True
+
+    async def _run(self):
+        raise ConnectionError("connection reset")
+
+
+def _assert_delays_grow(recorder: _EventRecorder):
+    assert recorder.retried.wait(10)
+    delays = recorder.delays[:_RETRIES]
+    assert delays == sorted(delays)
+    assert delays[-1] > delays[0]
+
+
+def test_delays_grow_when_run_fails_after_health_check():
+    recorder = _EventRecorder()
+    connector = _FailingConnector(
+        recorder, name="Failing", retry_policy=_retry_policy()
+    )
+    connector.start()
+    try:
+        _assert_delays_grow(recorder)
+    finally:
+        connector.stop()
+
+
+def test_delays_grow_when_async_run_fails_after_health_check():
+    recorder = _EventRecorder()
+    runtime = ConnectorRuntime()
+    connector = _FailingAsyncConnector(
+        recorder, name="Failing", retry_policy=_retry_policy(), runtime=runtime
+    )
+    connector.start()
+    try:
+        _assert_delays_grow(recorder)
+    finally:
+        connector.stop()
+        runtime.stop()
+
+
+def test_delay_is_reset_after_min_healthy_time():
+    retry_policy = RetryPolicy(
+        initial_delay=1, max_delay=60, jitter=0, min_healthy_time=0.05
+    )
+    retry_policy.healthy()
+    assert retry_policy.next_delay() == 1
+    retry_policy.healthy()
+    assert retry_policy.next_delay() == 2
+
+    retry_policy.healthy()
+    time.sleep(0.1)
+    assert retry_policy.next_delay() == 1
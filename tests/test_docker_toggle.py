@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("docker")
+
+from engine.pod.docker import DockerConnector  # noqa: E402
+from engine.pod.filters import ContainerFilter  # noqa: E402
+
+_TOGGLES = 1000
+"""Number of times the connector is started and stopped"""
+
+_STREAM_TIMEOUT = 5
+"""Maximum number of seconds to wait for the connector to open its event stream"""
+
+_SETTLE_TIMEOUT = 5
+"""Maximum number of seconds to wait for the threads and file descriptors to be released"""
+
+
+def _connector_threads() -> int:
+    """Returns the number of threads, besides the ones of the fake daemon"""
+    return sum(
+        1
+        for thread in threading.enumerate()
+        if "process_request_thread" not in thread.name
+    )
+
+
+def _open_fds() -> int | None:
+    """Returns the number of open file descriptors, or None if they can't be listed"""
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def _wait_for_baseline(
+    threads: int, fds: int | None, tolerance: int
+) -> tuple[int, int | None]:
+    """Waits for the threads and file descriptors of the closed connections
+    to be released, and returns their number"""
+    deadline = time.monotonic() + _SETTLE_TIMEOUT
+    while True:
+        current_threads, current_fds = _connector_threads(), _open_fds()
+        settled = current_threads <= threads and (
+            fds is None or current_fds is None or current_fds <= fds + tolerance
+        )
+        if settled or time.monotonic() > deadline:
+            return current_threads, current_fds
+        time.sleep(0.05)
+
+
+def test_toggling_leaks_no_threads_or_fds(docker_daemon):
+    baseline_threads, baseline_fds = _connector_threads(), _open_fds()
+
+    for toggle in range(_TOGGLES):
+        connector = DockerConnector(
+            lambda event: None,
+            docker_command="docker",
+            container_filter=ContainerFilter(),
+        )
+        connector.start()
+        assert docker_daemon.wait_for_event_streams(toggle + 1, _STREAM_TIMEOUT)
+        started = time.monotonic()
+        connector.stop()
+
+        # closing the stream unblocks the thread, instead of waiting for an event
+        assert not connector.is_alive()
+        assert time.monotonic() - started < 1
+
+    threads, fds = _wait_for_baseline(baseline_threads, baseline_fds, tolerance=2)
+    assert threads <= baseline_threads
+    if baseline_fds is not None and fds is not None:
+        # a few descriptors may be opened lazily (e.g. by the first import of a module)
+        assert fds <= baseline_fds + 2
@@ -0,0 +1,255 @@
+import threading
+
+import pytest
+
+from engine.events import Event, EventType
+from engine.pod.dockerhosts import DockerEndpoint, DockerHostsConnector
+from engine.pod.filters import (
+    COMPOSE_PROJECT_LABEL,
+    EXCLUDE_ENVIRONMENT_VARIABLE,
+    INCLUDE_ENVIRONMENT_VARIABLE,
+    ContainerFilter,
+    ContainerFilterError,
+)
+
+_STREAM_TIMEOUT = 5
+"""Maximum number of seconds to wait for the connector to list the containers"""
+
+_CONTAINERS = [
+    {"Names": ["/web-1"], "Image": "nginx:1.25", "Labels": {"tier": "front"}},
+    {"Names": ["/web-2"], "Image": "nginx:1.25", "Labels": {"tier": "back"}},
+    {"Names": ["/db"], "Image": "postgres", "Labels": {"tier": "back"}},
+]
+
+
+def _names(container_filter: ContainerFilter) -> list[str]:
+    return [
+        container["Names"][0].lstrip("/")
+        for container in _CONTAINERS
+        if container_filter.matches_container(container)
+    ]
+
+
+# region parsing
+
+
+def test_environment_variables_are_parsed(monkeypatch):
+    monkeypatch.setenv(INCLUDE_ENVIRONMENT_VARIABLE, " image:nginx* ,, name:web-*")
+    monkeypatch.setenv(EXCLUDE_ENVIRONMENT_VARIABLE, "label:tier=back")
+    container_filter = ContainerFilter.from_environment()
+
+    assert [term.strip() for term in container_filter.include] == [
+        "image:nginx*",
+        "name:web-*",
+    ]
+    assert container_filter.exclude == ["label:tier=back"]
+    assert _names(container_filter) == ["web-1"]
+
+
+def test_missing_environment_variables_select_all(monkeypatch):
+    monkeypatch.delenv(INCLUDE_ENVIRONMENT_VARIABLE, raising=False)
+    monkeypatch.delenv(EXCLUDE_ENVIRONMENT_VARIABLE, raising=False)
+    container_filter = ContainerFilter.from_environment()
+
+    assert container_filter.is_empty()
+    assert _names(container_filter) == ["web-1", "web-2", "db"]
+
+
+def test_invalid_environment_variable_is_ignored(monkeypatch):
+    monkeypatch.setenv(INCLUDE_ENVIRONMENT_VARIABLE, "name:web-*")
+    monkeypatch.setenv(EXCLUDE_ENVIRONMENT_VARIABLE, "tier=back")
+
+    assert ContainerFilter.from_environment().is_empty()
+
+
+@pytest.mark.parametrize("term", ["web", "color:red", "name:", "label"])
+def test_invalid_term_raises(term):
+    with pytest.raises(ContainerFilterError):
+        ContainerFilter([term])
+
+
+# endregion
+
+# region matching
+
+
+def test_one_include_term_of_each_kind_is_needed():
+    # terms of the same kind are alternatives, kinds are all required
+    container_filter = ContainerFilter(
+        ["label:tier=front", "label:tier=back", "image:postgres"]
+    )
+    assert _names(container_filter) == ["db"]
+
+
+def test_exclude_term_wins_over_include_terms():
+    container_filter = ContainerFilter(["image:nginx*"], ["name:web-2"])
+    assert _names(container_filter) == ["web-1"]
+
+
+def test_label_key_matches_any_value():
+    assert _names(ContainerFilter(exclude=["label:tier"])) == []
+
+
+def test_compose_project():
+    container_filter = ContainerFilter(["compose:shop"])
+    assert container_filter.matches("web", "nginx", {COMPOSE_PROJECT_LABEL: "shop"})
+    assert not container_filter.matches("web", "nginx", {})
+    assert not ContainerFilter(exclude=["compose:shop"]).matches(
+        "web", "nginx", {COMPOSE_PROJECT_LABEL: "shop"}
+    )
+
+
+@pytest.mark.parametrize(
+    "pattern, name, matches",
+    [
+        ("web-*", "web-1", True),
+        ("web-?", "web-10", False),
+        ("web", "web-1", False),
+        ("*-db", "shop-db", True),
+    ],
+)
+def test_name_glob(pattern, name, matches):
+    assert ContainerFilter([f"name:{pattern}"]).matches(name, "", {}) == matches
+
+
+@pytest.mark.parametrize(
+    "pattern, image, matches",
+    [
+        # a pattern without a tag matches any tag or digest of the image
+        ("nginx", "nginx:1.25", True),
+        ("nginx", "nginx@sha256:0123", True),
+        ("nginx:1.*", "nginx:1.25", True),
+        ("nginx:1.*", "nginx:latest", False),
+        # a registry port is not a tag
+        ("registry:5000/*", "registry:5000/shop/web:2", True),
+        ("registry", "registry:5000/shop/web", False),
+    ],
+)
+def test_image_glob(pattern, image, matches):
+    assert ContainerFilter([f"image:{pattern}"]).matches("", image, {}) == matches
+
+
+def test_event_attributes_are_matched():
+    container_filter = ContainerFilter(["label:tier=front"])
+    event = {
+        "Action": "start",
+        "Actor": {"Attributes": {"name": "web-1", "image": "nginx", "tier": "front"}},
+    }
+    assert container_filter.matches_event(event)
+    event["Actor"]["Attributes"]["tier"] = "back"
+    assert not container_filter.matches_event(event)
+
+
+# endregion
+
+# region daemon filters
+
+
+@pytest.mark.parametrize(
+    "include, list_filters, event_filters",
+    [
+        ([], {}, {}),
+        (
+            ["label:tier=front"],
+            {"label": ["tier=front"]},
+            {"label": ["tier=front"]},
+        ),
+        # Docker requires all the labels, so only the shared key is pushed down
+        (
+            ["label:tier=front", "label:tier=back"],
+            {"label": ["tier"]},
+            {"label": ["tier"]},
+        ),
+        (["label:tier", "label:team=shop"], {}, {}),
+        (
+            ["compose:shop"],
+            {"label": [f"{COMPOSE_PROJECT_LABEL}=shop"]},
+            {"label": [f"{COMPOSE_PROJECT_LABEL}=shop"]},
+        ),
+        # images are only pushed down to the list, without patterns
+        (["image:nginx", "image:redis"], {"ancestor": ["nginx", "redis"]}, {}),
+        (["image:nginx*"], {}, {}),
+        # names are only pushed down without patterns
+        (["name:web-1"], {"name": ["web-1"]}, {"container": ["web-1"]}),
+        (["name:web-*"], {}, {}),
+    ],
+)
+def test_daemon_filters(include, list_filters, event_filters):
+    container_filter = ContainerFilter(include, ["label:ci.job", "name:runner-*"])
+
+    assert container_filter.list_filters() == list_filters
+    assert container_filter.event_filters() == event_filters
+
+
+class _EventRecorder:
+    """Records the names of the profiles added by a connector"""
+
+    def __init__(self):
+        self.profile_names: list[str] = []
+        self.synchronized = threading.Event()
+
+    def __call__(self, event: Event):
+        if event.event_type == EventType.ADD_PROFILES:
+            self.profile_names.extend(profile.name for profile in event.data)
+        elif event.event_type == EventType.SYNCHRONIZED:
+            self.synchronized.set()
+
+
+def _filter_for_daemon() -> ContainerFilter:
+    return ContainerFilter(["image:nginx", "name:web-1", "label:tier"], ["name:db"])
+
+
+def _assert_daemon_filters(docker_daemon, recorder: _EventRecorder, profile_name: str):
+    assert docker_daemon.wait_for_event_streams(1, _STREAM_TIMEOUT)
+    assert recorder.synchronized.wait(_STREAM_TIMEOUT)
+    assert docker_daemon.filters["/containers/json"] == {
+        "label": ["tier"],
+        "ancestor": ["nginx"],
+        "name": ["web-1"],
+    }
+    assert docker_daemon.filters["/events"] == {
+        "type": ["container"],
+        "event": ["start", "stop", "die"],
+        "label": ["tier"],
+        "container": ["web-1"],
+    }
+    # the daemon lists all the containers, the others are dropped by the matcher
+    assert recorder.profile_names == [profile_name]
+
+
+def test_docker_connector_sends_filters_to_daemon(docker_daemon):
+    pytest.importorskip("docker")
+    from engine.pod.docker import DockerConnector
+
+    docker_daemon.containers = _CONTAINERS
+    recorder = _EventRecorder()
+    connector = DockerConnector(
+        recorder, docker_command="docker", container_filter=_filter_for_daemon()
+    )
+    connector.start()
+    try:
+        _assert_daemon_filters(docker_daemon, recorder, "web-1")
+    finally:
+        connector.stop()
+
+
+def test_docker_hosts_connector_sends_filters_to_daemon(docker_daemon):
+    docker_daemon.containers = _CONTAINERS
+    recorder = _EventRecorder()
+    connector = DockerHostsConnector(
+        recorder,
+        endpoints=[
+            DockerEndpoint("fake", f"tcp://127.0.0.1:{docker_daemon.server_address[1]}")
+        ],
+        docker_command="docker",
+        container_filter=_filter_for_daemon(),
+    )
+    connector.start()
+    try:
+        # the profiles of an endpoint are named after it
+        _assert_daemon_filters(docker_daemon, recorder, "fake/web-1")
+    finally:
+        connector.stop()
+
+
+# endregion
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from engine.terminal.configuration import Mutation, MutationType, TerminalProfile
+from engine.terminal.iterm2 import ITerm2Configurator
+
+
+@pytest.fixture
+def settings_file(tmp_path):
+    settings_file_path = tmp_path / "podshell.json"
+    settings_file_path.write_text(json.dumps({"Profiles": []}))
+    return settings_file_path
+
+
+def _profiles(settings_file) -> list[dict]:
+    return json.loads(settings_file.read_text())["Profiles"]
+
+
+def _add(configurator, name: str, commandline: str, source_name: str):
+    configurator.apply_mutations(
+        [
+            Mutation(
+                MutationType.ADD_PROFILES,
+                [TerminalProfile(name, commandline, source_name=source_name)],
+                group_name=source_name,
+            )
+        ]
+    )
+
+
+def test_same_profile_is_added_once(settings_file):
+    configurator = ITerm2Configurator(str(settings_file))
+    _add(configurator, "web", "docker exec -it web /bin/sh", "Docker")
+    _add(configurator, "web", "docker exec -it web /bin/sh", "Docker")
+
+    assert [p["Name"] for p in _profiles(settings_file)] == ["web"]
+
+
+def test_changed_commandline_replaces_the_profile(settings_file):
+    configurator = ITerm2Configurator(str(settings_file))
+    _add(configurator, "web", "docker exec -it web /bin/sh", "Docker")
+    _add(configurator, "web", "docker exec -it web /bin/bash", "Docker")
+
+    profiles = _profiles(settings_file)
+    assert [p["Command"] for p in profiles] == ["docker exec -it web /bin/bash"]
+    assert (
+        profiles[0]["Guid"]
+        == TerminalProfile("web", "docker exec -it web /bin/bash", "Docker").guid
+    )
+
+
+def test_profile_of_older_version_is_updated(settings_file):
+    # a profile written with another guid, and a setting changed by the user
+    settings_file.write_text(
+        json.dumps(
+            {
+                "Profiles": [
+                    {
+                        "Name": "web",
+                        "Command": "ssh web",
+                        "Guid": "old-guid",
+                        "Tags": ["PodShell", "SSH"],
+                        "Badge Text": "prod",
+                    }
+                ]
+            }
+        )
+    )
+    configurator = ITerm2Configurator(str(settings_file))
+    _add(configurator, "web", "ssh web", "SSH")
+
+    profiles = _profiles(settings_file)
+    assert len(profiles) == 1
+    assert profiles[0]["Guid"] == TerminalProfile("web", "ssh web", "SSH").guid
+    assert profiles[0]["Badge Text"] == "prod"
+
+
+def test_same_name_in_another_group_is_added(settings_file):
+    configurator = ITerm2Configurator(str(settings_file))
+    _add(configurator, "db", "ssh db", "SSH")
+    _add(configurator, "db", "docker exec -it db /bin/sh", "Docker")
+
+    configurator.apply_mutations(
+        [Mutation(MutationType.REMOVE_PROFILES, profile_names=["db"], group_name="SSH")]
+    )
+
+    assert [p["Command"] for p in _profiles(settings_file)] == [
+        "docker exec -it db /bin/sh"
+    ]
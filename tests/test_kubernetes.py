@@ -0,0 +1,243 @@
+import json
+import socketserver
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from engine.events import Event, EventType
+from engine.pod.kubernetes import KubernetesConnector
+
+_WAIT_TIMEOUT = 5
+"""Maximum number of seconds to wait for the connector to send a request"""
+
+
+def _pod(name: str, resource_version: str, phase: str = "Running") -> dict:
+    return {
+        "metadata": {
+            "name": name,
+            "namespace": "default",
+            "resourceVersion": resource_version,
+        },
+        "status": {"phase": phase},
+    }
+
+
+class _FakeApiServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """A Kubernetes API server listing pods and answering each watch with the next
+    scripted response. A watch without a script is held open, as on a quiet cluster.
+    A script is a list of watch events, ended by the server (the watch timeout), or
+    "gone" to answer 410 Gone."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, pods: list[dict], watch_scripts: list):
+        super().__init__(("127.0.0.1", 0), _FakeApiHandler)
+        self.pods = pods
+        self.watch_scripts = list(watch_scripts)
+        self.lists = 0
+        # the resourceVersion of each watch request
+        self.watch_resource_versions: list[str] = []
+        self.requests_changed = threading.Condition()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def list_resource_version(self) -> str:
+        """The resource version of the last list, which grows with each list"""
+        return str(self.lists * 100)
+
+    def wait_for_watches(self, count: int) -> bool:
+        with self.requests_changed:
+            return self.requests_changed.wait_for(
+                lambda: len(self.watch_resource_versions) >= count, _WAIT_TIMEOUT
+            )
+
+
+class _FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: _FakeApiServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        if url.path == "/version":
+            self._send_json(200, {"major": "1", "minor": "29"})
+        elif query.get("watch"):
+            self._watch(query.get("resourceVersion", ""))
+        else:
+            with self.server.requests_changed:
+                self.server.lists += 1
+                self.server.requests_changed.notify_all()
+            self._send_json(
+                200,
+                {
+                    "items": self.server.pods,
+                    "metadata": {
+                        "resourceVersion": self.server.list_resource_version()
+                    },
+                },
+            )
+
+    def _watch(self, resource_version: str):
+        with self.server.requests_changed:
+            self.server.watch_resource_versions.append(resource_version)
+            script = (
+                self.server.watch_scripts.pop(0) if self.server.watch_scripts else None
+            )
+            self.server.requests_changed.notify_all()
+        if script == "gone":
+            self._send_json(410, {"kind": "Status", "code": 410, "reason": "Expired"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        if script is None:
+            # the watch stays open until the client closes it
+            try:
+                while self.rfile.read(1):
+                    pass
+            except OSError:
+                pass
+            return
+        for watch_event in script:
+            self._send_chunk((json.dumps(watch_event) + "\n").encode())
+        # the server ends the watch
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+@pytest.fixture
+def start_connector():
+    servers: list[_FakeApiServer] = []
+    connectors: list[KubernetesConnector] = []
+
+    def start(
+        pods: list[dict], watch_scripts: list
+    ) -> tuple[_FakeApiServer, KubernetesConnector, list[Event]]:
+        server = _FakeApiServer(pods, watch_scripts)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        events: list[Event] = []
+        connector = KubernetesConnector(
+            events.append,
+            api_server=server.url,
+            kubectl_command="kubectl",
+        )
+        connectors.append(connector)
+        connector.start()
+        return server, connector, events
+
+    yield start
+
+    for connector in connectors:
+        connector.stop()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _profile_names(events: list[Event], event_type: EventType) -> list[str]:
+    names = []
+    for event in events:
+        if event.event_type != event_type:
+            continue
+        profiles = event.data if isinstance(event.data, list) else [event.data]
+        names += [profile.name for profile in profiles]
+    return names
+
+
+def test_watch_resumes_from_last_resource_version(start_connector):
+    server, connector, events = start_connector(
+        [_pod("web", "90")],
+        [
+            [
+                {"type": "ADDED", "object": _pod("api", "101")},
+                {"type": "DELETED", "object": _pod("web", "102")},
+            ]
+        ],
+    )
+
+    assert server.wait_for_watches(2)
+    # the watch ended by the server is resumed without listing the pods again
+    assert server.watch_resource_versions[:2] == ["100", "102"]
+    assert server.lists == 1
+    assert connector.lists == 1
+    assert _profile_names(events, EventType.ADD_PROFILES) == ["default/web"]
+    assert _profile_names(events, EventType.ADD_PROFILE) == ["default/api"]
+    assert _profile_names(events, EventType.REMOVE_PROFILE) == ["default/web"]
+
+
+def test_bookmark_moves_resource_version(start_connector):
+    server, connector, events = start_connector(
+        [_pod("web", "90")],
+        [
+            [
+                {
+                    "type": "BOOKMARK",
+                    "object": {"kind": "Pod", "metadata": {"resourceVersion": "250"}},
+                }
+            ]
+        ],
+    )
+
+    assert server.wait_for_watches(2)
+    assert server.watch_resource_versions[:2] == ["100", "250"]
+    assert server.lists == 1
+    # a bookmark doesn't publish or remove profiles
+    assert _profile_names(events, EventType.ADD_PROFILE) == []
+    assert _profile_names(events, EventType.REMOVE_PROFILE) == []
+
+
+@pytest.mark.parametrize(
+    "expired_watch",
+    [
+        "gone",
+        [{"type": "ERROR", "object": {"kind": "Status", "code": 410}}],
+    ],
+    ids=["status", "error-event"],
+)
+def test_gone_lists_pods_again(start_connector, expired_watch):
+    server, connector, events = start_connector([_pod("web", "90")], [expired_watch])
+
+    assert server.wait_for_watches(2)
+    # the expired resource version is dropped and the watch resumes from the new list
+    assert server.watch_resource_versions[:2] == ["100", "200"]
+    assert server.lists == 2
+    assert connector.lists == 2
+    # the relist signals a resync, so the profiles published before are reconciled
+    assert [
+        event.event_type
+        for event in events
+        if event.event_type
+        in (EventType.STARTING, EventType.ADD_PROFILES, EventType.SYNCHRONIZED)
+    ] == [
+        EventType.STARTING,
+        EventType.ADD_PROFILES,
+        EventType.SYNCHRONIZED,
+        EventType.STARTING,
+        EventType.ADD_PROFILES,
+        EventType.SYNCHRONIZED,
+    ]
@@ -0,0 +1,99 @@
+import json
+from typing import ClassVar
+
+import pytest
+
+from engine.events import Event, EventType
+from engine.orchestration import Orchestrator
+from engine.terminal.configuration import Mutation, MutationType, TerminalProfile
+from engine.terminal.windowsterminal import WindowsTerminalConfigurator
+
+
+class _Orchestrator(Orchestrator):
+    """An orchestrator without pod connectors and terminal configurators"""
+
+    _pod_connector_types: ClassVar[list] = []
+    _terminal_configurator_types: ClassVar[list] = []
+
+
+@pytest.fixture
+def configurator(tmp_path):
+    settings_file_path = tmp_path / "settings.json"
+    settings_file_path.write_text(
+        json.dumps({"profiles": {"list": []}, "newTabMenu": []})
+    )
+    configurator = WindowsTerminalConfigurator(str(settings_file_path))
+    # profiles left by a run that crashed
+    configurator.apply_mutations(
+        [
+            Mutation(
+                MutationType.ADD_PROFILES,
+                [
+                    TerminalProfile(name, f"docker exec -it {name} sh", "Docker")
+                    for name in ("old-container", "web")
+                ],
+                group_name="Docker",
+            )
+        ]
+    )
+    return configurator
+
+
+@pytest.fixture
+def orchestrator(configurator):
+    orchestrator = _Orchestrator(lambda event: None)
+    orchestrator.pod_connectors = {}
+    orchestrator.terminal_configurators = {configurator.name: configurator}
+    yield orchestrator
+    orchestrator.stop()
+
+
+def _profile_names(configurator) -> list[str]:
+    with open(configurator._settings_file_path) as settings_file:
+        settings = json.load(settings_file)
+    return [profile["name"] for profile in settings["profiles"]["list"]]
+
+
+def _publish(orchestrator, event_type: EventType, data=None):
+    orchestrator._handle_connector_event(
+        Event(
+            source_name="Docker",
+            event_type=event_type,
+            event_message="Docker",
+            event_data=data,
+        )
+    )
+
+
+def _synchronize(orchestrator):
+    _publish(orchestrator, EventType.STARTING)
+    _publish(
+        orchestrator,
+        EventType.ADD_PROFILES,
+        [TerminalProfile("web", "docker exec -it web sh", "Docker")],
+    )
+    _publish(orchestrator, EventType.SYNCHRONIZED)
+
+
+@pytest.mark.parametrize("enabled_first", [True, False])
+def test_cold_start_removes_stale_profiles(orchestrator, configurator, enabled_first):
+    if enabled_first:
+        orchestrator._enable_terminal_configurator(configurator.name)
+        _synchronize(orchestrator)
+    else:
+        # the terminal is enabled once the connector already started
+        _synchronize(orchestrator)
+        orchestrator._enable_terminal_configurator(configurator.name)
+    orchestrator._flush_scheduler.flush_all()
+
+    assert _profile_names(configurator) == ["web"]
+
+
+def test_cold_start_removes_stale_profiles_of_empty_source(orchestrator, configurator):
+    # the source has no profiles anymore, so it never publishes the group again
+    _publish(orchestrator, EventType.STARTING)
+    _publish(orchestrator, EventType.SYNCHRONIZED)
+    orchestrator._enable_terminal_configurator(configurator.name)
+    orchestrator._flush_scheduler.flush_all()
+
+    assert _profile_names(configurator) == []
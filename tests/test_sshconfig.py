@@ -0,0 +1,139 @@
+import os
+
+from engine.pod.sshconfig import SSHConfigParser
+
+
+def _write(path, content: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def _hosts(config) -> dict[str, tuple]:
+    return {host.name: (host.hostname, host.user, host.port) for host in config.hosts}
+
+
+def test_first_value_wins(tmp_path):
+    config_file = tmp_path / "config"
+    _write(
+        config_file,
+        "User top\n"
+        "Host web db\n"
+        "    HostName %h.example.com\n"
+        "Host web\n"
+        "    HostName ignored\n"
+        "    Port 2222\n"
+        "Host *\n"
+        "    User everyone\n"
+        "    Port 22\n",
+    )
+
+    config = SSHConfigParser().load(str(config_file))
+
+    # the options at the top of the file come first, then the blocks in order
+    assert _hosts(config) == {
+        "web": ("web.example.com", "top", "2222"),
+        "db": ("db.example.com", "top", "22"),
+    }
+
+
+def test_wildcard_and_negated_patterns(tmp_path):
+    config_file = tmp_path / "config"
+    _write(
+        config_file,
+        "Host Web1 web2 jump\n"
+        "Host web* !web2\n"
+        "    User deploy\n"
+        "Host jump,web2\n"
+        "    Port=2200\n"
+        "Host *\n"
+        "    User root\n",
+    )
+
+    config = SSHConfigParser().load(str(config_file))
+
+    # patterns are matched case insensitively; a host is never a wildcard pattern
+    assert _hosts(config) == {
+        "Web1": (None, "deploy", None),
+        "web2": (None, "root", "2200"),
+        "jump": (None, "root", "2200"),
+    }
+
+
+def test_match_blocks(tmp_path):
+    config_file = tmp_path / "config"
+    _write(
+        config_file,
+        "Host web db cache\n"
+        "Match host db\n"
+        "    User dba\n"
+        "Match !host web,db\n"
+        "    Port 6379\n"
+        "Match exec true\n"
+        "    User never\n"
+        "Match all\n"
+        "    User everyone\n",
+    )
+
+    config = SSHConfigParser().load(str(config_file))
+
+    # criteria that need a connection (exec) are not applied
+    assert _hosts(config) == {
+        "web": (None, "everyone", None),
+        "db": (None, "dba", None),
+        "cache": (None, "everyone", "6379"),
+    }
+
+
+def test_include(tmp_path):
+    config_file = tmp_path / "config"
+    _write(
+        config_file,
+        "Include config.d/*.conf\n"
+        "Host web\n"
+        "    Include web.conf\n"
+        "Host *\n"
+        "    User root\n",
+    )
+    _write(tmp_path / "config.d" / "b.conf", "Host b\n    Port 2\n")
+    _write(tmp_path / "config.d" / "a.conf", "Host a b\n    Port 1\n")
+    # included inside a Host block, the file only applies to that host (its Host
+    # db block never matches)
+    _write(tmp_path / "web.conf", "User web\nHost db\n    Port 5432\n")
+
+    config = SSHConfigParser().load(str(config_file))
+
+    # wildcard includes are read in sorted order
+    assert _hosts(config) == {
+        "a": (None, "root", "1"),
+        "b": (None, "root", "1"),
+        "web": (None, "web", None),
+        "db": (None, "root", None),
+    }
+    assert config.directories == [str(tmp_path / "config.d")]
+    assert str(tmp_path / "web.conf") in config.files
+
+
+def test_load_is_cached_until_a_file_changes(tmp_path):
+    config_file = tmp_path / "config"
+    _write(config_file, "Include config.d/*\nHost web\n")
+    _write(tmp_path / "config.d" / "a", "Host a\n")
+    parser = SSHConfigParser()
+    config = parser.load(str(config_file))
+
+    assert not parser.has_changed(str(config_file))
+    assert parser.load(str(config_file)) is config
+    assert parser.parses == 2
+
+    # a file saved without changes is not resolved again
+    stat = os.stat(config_file)
+    os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert parser.has_changed(str(config_file))
+    assert parser.load(str(config_file)) is config
+    assert parser.resolves == 1
+
+    # a new file in an included directory is detected
+    _write(tmp_path / "config.d" / "b", "Host b\n")
+    assert parser.has_changed(str(config_file))
+    config = parser.load(str(config_file))
+    assert [host.name for host in config.hosts] == ["a", "b", "web"]
+    assert parser.parses == 3
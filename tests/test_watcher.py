@@ -0,0 +1,105 @@
+import asyncio
+import os
+import threading
+import time
+from sys import platform
+
+import pytest
+
+from engine.pod.watcher import FileWatcher, InotifyWatcher, PollingWatcher
+
+_EDIT_DELAY = 0.2
+"""Seconds between the start of the wait and the edit of the file"""
+
+_MAX_LATENCY = 1.0
+"""Maximum number of seconds between the edit of a file and the end of the wait"""
+
+
+def _create_watcher(kind: str) -> FileWatcher:
+    if kind == "inotify":
+        if not platform.startswith("linux"):
+            pytest.skip("inotify is only available on Linux")
+        return InotifyWatcher()
+    # the poll interval backs off to max_interval, which bounds the latency
+    return PollingWatcher(min_interval=0.05, max_interval=0.2)
+
+
+def _edit_later(file_path: str, edited: list[float]):
+    def edit():
+        time.sleep(_EDIT_DELAY)
+        with open(file_path, "a") as file:
+            file.write("Host edited\n")
+        edited.append(time.monotonic())
+
+    threading.Thread(target=edit, daemon=True).start()
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    file_path = tmp_path / "config"
+    file_path.write_text("Host first\n")
+    return str(file_path)
+
+
+@pytest.mark.parametrize("kind", ["inotify", "polling"])
+def test_edit_is_reported_within_bound(kind, config_file):
+    watcher = _create_watcher(kind)
+    try:
+        watcher.watch([config_file])
+        edited: list[float] = []
+        _edit_later(config_file, edited)
+
+        changed = watcher.wait(timeout=_EDIT_DELAY + 5)
+        latency = time.monotonic() - edited[0]
+
+        assert changed
+        assert latency < _MAX_LATENCY
+    finally:
+        watcher.close()
+
+
+@pytest.mark.parametrize("kind", ["inotify", "polling"])
+def test_edit_is_reported_within_bound_async(kind, config_file):
+    watcher = _create_watcher(kind)
+
+    async def wait() -> bool:
+        return await watcher.wait_async(timeout=_EDIT_DELAY + 5)
+
+    try:
+        watcher.watch([config_file])
+        edited: list[float] = []
+        _edit_later(config_file, edited)
+
+        changed = asyncio.run(wait())
+        latency = time.monotonic() - edited[0]
+
+        assert changed
+        assert latency < _MAX_LATENCY
+    finally:
+        watcher.close()
+
+
+@pytest.mark.parametrize("kind", ["inotify", "polling"])
+def test_replaced_file_is_reported(kind, config_file):
+    watcher = _create_watcher(kind)
+    try:
+        watcher.watch([config_file])
+        # editors that save to a temporary file and rename it
+        temporary_path = config_file + ".tmp"
+        with open(temporary_path, "w") as file:
+            file.write("Host replaced\n")
+        os.replace(temporary_path, config_file)
+
+        assert watcher.wait(timeout=_MAX_LATENCY)
+    finally:
+        watcher.close()
+
+
+@pytest.mark.parametrize("kind", ["inotify", "polling"])
+def test_no_edit_times_out(kind, config_file):
+    watcher = _create_watcher(kind)
+    try:
+        watcher.watch([config_file])
+        assert not watcher.wait(timeout=0.3)
+    finally:
+        watcher.close()
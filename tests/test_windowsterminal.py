@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from engine.terminal.configuration import Mutation, MutationType, TerminalProfile
+from engine.terminal.windowsterminal import WindowsTerminalConfigurator
+
+
+@pytest.fixture
+def settings_file(tmp_path):
+    settings_file_path = tmp_path / "settings.json"
+    settings_file_path.write_text(
+        json.dumps({"profiles": {"list": []}, "newTabMenu": []})
+    )
+    return settings_file_path
+
+
+def _profile_names(settings_file) -> list[str]:
+    settings = json.loads(settings_file.read_text())
+    return [profile["name"] for profile in settings["profiles"]["list"]]
+
+
+def _add(configurator, name: str, commandline: str, source_name: str):
+    configurator.apply_mutations(
+        [
+            Mutation(
+                MutationType.ADD_PROFILES,
+                [TerminalProfile(name, commandline, source_name=source_name)],
+                group_name=source_name,
+            )
+        ]
+    )
+
+
+def test_remove_with_group_keeps_other_sources(settings_file):
+    configurator = WindowsTerminalConfigurator(str(settings_file))
+    _add(configurator, "db", "ssh db", "SSH")
+    _add(configurator, "db", "docker exec -it db /bin/sh", "Docker")
+
+    configurator.apply_mutations(
+        [Mutation(MutationType.REMOVE_PROFILES, profile_names=["db"], group_name="SSH")]
+    )
+
+    settings = json.loads(settings_file.read_text())
+    assert [p["commandline"] for p in settings["profiles"]["list"]] == [
+        "docker exec -it db /bin/sh"
+    ]
+
+
+def test_remove_without_group_removes_every_match(settings_file):
+    # duplicates, as left by older versions, with another guid each
+    settings = json.loads(settings_file.read_text())
+    settings["profiles"]["list"] = [
+        {"name": "web", "commandline": "old", "guid": "{1}"},
+        {"name": "web", "commandline": "older", "guid": "{2}"},
+        {"name": "api", "commandline": "api", "guid": "{3}"},
+    ]
+    settings_file.write_text(json.dumps(settings))
+    configurator = WindowsTerminalConfigurator(str(settings_file))
+
+    configurator.remove_profiles(["web"])
+
+    assert _profile_names(settings_file) == ["api"]
+
+
+def test_changed_commandline_adds_a_new_profile(settings_file):
+    configurator = WindowsTerminalConfigurator(str(settings_file))
+    _add(configurator, "web", "docker exec -it web /bin/sh", "Docker")
+    _add(configurator, "web", "docker exec -it web /bin/sh", "Docker")
+    assert _profile_names(settings_file) == ["web"]
+
+    _add(configurator, "web", "docker exec -it web /bin/bash", "Docker")
+
+    settings = json.loads(settings_file.read_text())
+    assert [p["commandline"] for p in settings["profiles"]["list"]] == [
+        "docker exec -it web /bin/sh",
+        "docker exec -it web /bin/bash",
+    ]
@@ -0,0 +1,64 @@
+from engine.terminal.configuration import BaseConfigurator, Mutation, MutationType
+from engine.terminal.writebehind import _MAX_WRITE_ATTEMPTS, FlushScheduler
+
+
+class _FailingConfigurator(BaseConfigurator):
+    """Records the batches it writes, failing the given number of first writes"""
+
+    name = "Failing"
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.attempts: list[list[str]] = []
+        self.written: list[list[str]] = []
+
+    def apply_mutations(self, mutations: list[Mutation]) -> None:
+        group_names = [str(mutation.group_name) for mutation in mutations]
+        self.attempts.append(group_names)
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("settings file locked")
+        self.written.append(group_names)
+
+
+def _remove_group(group_name: str) -> Mutation:
+    return Mutation(MutationType.REMOVE_GROUP, group_name=group_name)
+
+
+def _scheduler() -> FlushScheduler:
+    # the flushes are triggered by the test, not by the timers
+    return FlushScheduler(max_delay=60)
+
+
+def test_failed_batch_is_retried_before_newer_mutations():
+    configurator = _FailingConfigurator(failures=1)
+    scheduler = _scheduler()
+    scheduler.submit(configurator, _remove_group("old"))
+    scheduler.flush(configurator)
+    scheduler.submit(configurator, _remove_group("new"))
+
+    scheduler.flush(configurator)
+
+    # the failed batch is written alone, then the newer mutations
+    assert configurator.written == [["old"], ["new"]]
+    stats = scheduler.stats(configurator.name)
+    assert stats.failed_writes == 1
+    assert stats.dropped == 0
+
+
+def test_only_failed_batch_is_dropped():
+    configurator = _FailingConfigurator(failures=_MAX_WRITE_ATTEMPTS)
+    scheduler = _scheduler()
+    scheduler.submit(configurator, _remove_group("old"))
+    for _ in range(_MAX_WRITE_ATTEMPTS - 1):
+        scheduler.flush(configurator)
+    scheduler.submit(configurator, _remove_group("new"))
+
+    scheduler.flush(configurator)
+
+    # the newer mutation was never attempted with the failed batch
+    assert all(attempt == ["old"] for attempt in configurator.attempts[:-1])
+    assert configurator.written == [["new"]]
+    stats = scheduler.stats(configurator.name)
+    assert stats.failed_writes == _MAX_WRITE_ATTEMPTS
+    assert stats.dropped == 1